@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Autothrottle simulation
+
+Drives a throttle controller (see src/autothrottle.py) against synthetic servers in virtual
+time, without sockets or sleeps, to compare how quickly each policy converges to a domain's
+capacity and how many errors it causes on the way.
+
+Capacities stay below 1 / DomainLimiter.MIN_DELAY (10 req/s), the fastest any policy may go.
+
+Server model: a single queue with capacity `cap(t)` requests/s. Offered load rho = rate/cap
+gives latency base / (1 - rho) (log-normal noise); above capacity requests fail with 503, or
+429 + Retry-After for rate-limited profiles.
+
+Profiles:
+ - steady        cap 8 req/s
+ - step_down     cap 8 -> 2 req/s at t=60s
+ - step_up       cap 2 -> 8 req/s at t=60s
+ - rate_limited  cap 5 req/s, overload answered with 429 Retry-After: 5
+
+Usage:
+    python benchmarks/autothrottle_sim.py
+    python benchmarks/autothrottle_sim.py --duration 300 --seed 7 --json sim.json
+
+Reported per profile/policy:
+ - converge_s   seconds after the last capacity change until the first 5s window with
+                goodput >= 70% of capacity and <= 5% errors (None = never)
+ - goodput      successful responses / capacity over the whole run
+ - errors       failed responses (5xx / 429)
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from autothrottle import THROTTLES  # noqa: E402
+from limiter import DomainLimiter  # noqa: E402
+
+WORKERS = 10  # crawler threads available when the policy does not cap concurrency
+
+
+class SimLimiter(DomainLimiter):
+    """DomainLimiter without robots.txt; Retry-After is handled by the simulator's clock."""
+
+    def _read_robots(self):
+        return
+
+    def defer(self, seconds):
+        self.deferred = seconds
+
+
+def _profile(name):
+    if name == 'steady':
+        return (lambda t: 8.0), 0.1, False, [0.0]
+    if name == 'step_down':
+        return (lambda t: 8.0 if t < 60 else 2.0), 0.1, False, [60.0]
+    if name == 'step_up':
+        return (lambda t: 2.0 if t < 60 else 8.0), 0.1, False, [60.0]
+    if name == 'rate_limited':
+        return (lambda t: 5.0), 0.1, True, [0.0]
+    raise ValueError(f'Unknown profile: {name}')
+
+
+PROFILES = ('steady', 'step_down', 'step_up', 'rate_limited')
+
+
+def simulate(policy, profile, duration=180.0, seed=1):
+    cap_at, base, rate_limited, changes = _profile(profile)
+    rng = random.Random(seed)
+    clock = {'t': 0.0}
+    throttle = THROTTLES[policy](clock=lambda: clock['t']) if policy == 'aimd' else THROTTLES[policy]()
+    dl = SimLimiter('sim.example', throttle=throttle)
+    dl.deferred = None
+    buckets = {}
+    lat_est = base
+    t = 0.0
+    while t < duration:
+        conc = dl.max_in_flight or WORKERS
+        rate = min(1.0 / dl.crawl_delay, conc / max(lat_est, 1e-3))
+        t += 1.0 / rate
+        clock['t'] = t
+        cap = cap_at(t)
+        rho = rate / cap
+        if rho < 0.95:
+            latency = base / (1.0 - rho)
+        else:
+            latency = base * 20
+        latency *= rng.lognormvariate(0.0, 0.2)
+        retry_after = None
+        status = 200
+        if rho > 1.0 and rng.random() < 1.0 - 1.0 / rho:
+            status = 429 if rate_limited else 503
+            if rate_limited:
+                retry_after = 5.0
+        lat_est = latency
+        dl.record_response(latency, status, retry_after)
+        if dl.deferred:
+            t += dl.deferred
+            dl.deferred = None
+        b = buckets.setdefault(int(t), [0, 0])
+        b[0 if status == 200 else 1] += 1
+
+    last_change = changes[-1]
+    converge = None
+    for s in range(int(last_change), int(duration) - 4):
+        ok = sum(buckets.get(i, [0, 0])[0] for i in range(s, s + 5))
+        err = sum(buckets.get(i, [0, 0])[1] for i in range(s, s + 5))
+        if ok >= 0.7 * sum(cap_at(i) for i in range(s, s + 5)) and err <= 0.05 * (ok + err):
+            converge = s + 5 - last_change
+            break
+    total_ok = sum(b[0] for b in buckets.values())
+    total_cap = sum(cap_at(s) for s in range(int(duration)))
+    return {
+        'policy': policy,
+        'profile': profile,
+        'converge_s': converge,
+        'goodput': round(total_ok / total_cap, 3),
+        'errors': sum(b[1] for b in buckets.values()),
+        'final_delay': round(dl.crawl_delay, 3),
+        'final_concurrency': dl.max_in_flight or WORKERS,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Simulate throttle policies against synthetic latency profiles')
+    parser.add_argument('--duration', type=float, default=180.0, help='Virtual seconds per run')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--policies', nargs='*', default=sorted(THROTTLES), choices=sorted(THROTTLES))
+    parser.add_argument('--profiles', nargs='*', default=list(PROFILES), choices=PROFILES)
+    parser.add_argument('--json', default=None, help='Also write the results to this JSON file')
+    args = parser.parse_args()
+
+    results = [simulate(pol, prof, duration=args.duration, seed=args.seed)
+               for prof in args.profiles for pol in args.policies]
+    print('%-13s %-7s %10s %8s %7s %8s' % ('profile', 'policy', 'converge_s', 'goodput', 'errors', 'delay'))
+    for r in results:
+        print('%-13s %-7s %10s %8.3f %7d %8.3f' % (r['profile'], r['policy'], r['converge_s'], r['goodput'],
+                                                  r['errors'], r['final_delay']))
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
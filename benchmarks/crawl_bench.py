@@ -0,0 +1,308 @@
+#!/usr/bin/env python3
+"""
+End-to-end crawler benchmark against local synthetic sites
+
+Starts benchmarks/mock_site.py in a subprocess, runs each engine in its own worker
+subprocess (so CPU time and peak RSS belong to the crawl alone), and writes one JSON results
+file that can be diffed between commits.
+
+Engines:
+ - threaded                one threaded_crawl_enhanced() call (cold: new session, limiters)
+ - warm                    a crawler.Crawler that already crawled the site once (untimed),
+                           i.e. a long-lived service reusing its connection pool and limiters
+ - replay                  Crawler.replay() of the same crawl archived beforehand (untimed,
+                           archive=True): parsing / dedup / topic pipeline without network
+
+Measured per run:
+ - pages, errors           rows in urls.csv (status 200 / anything else)
+ - pages_per_sec           pages / wall time of the crawl call
+ - latency_p50_ms / p99    per request, measured around requests.Session.get
+ - cpu_user_s / cpu_sys_s  of the worker during the crawl; cpu_pct = (user+sys)/wall
+ - peak_rss_mb             worker's max resident set size
+
+Usage:
+    python benchmarks/crawl_bench.py --preset small
+    python benchmarks/crawl_bench.py --preset medium --repeat 3 --out bench_results.json
+    python benchmarks/crawl_bench.py --pages 400 --sites 8 --latency 0.05 --min-delay 0.01
+
+Presets only set defaults; any mock_site option (--pages, --links, --error-rate, ...) overrides.
+--min-delay lowers DomainLimiter.MIN_DELAY inside the worker to measure the engine rather
+than politeness (default: unchanged, i.e. at most 10 requests/s per site).
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from threading import Lock
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SRC = os.path.join(HERE, '..', 'src')
+sys.path.insert(0, HERE)
+sys.path.insert(0, SRC)
+
+from mock_site import DEFAULTS  # noqa: E402
+
+SUITE_VERSION = 1
+
+PRESETS = {
+    'small': {'sites': 4, 'pages': 50, 'latency': 0.01},
+    'medium': {'sites': 8, 'pages': 250, 'latency': 0.02},
+    'large': {'sites': 16, 'pages': 1000, 'latency': 0.02},
+}
+
+
+# ---------- worker side ----------
+
+def _percentile(sorted_vals, q):
+    if not sorted_vals:
+        return 0.0
+    return sorted_vals[min(len(sorted_vals) - 1, int(q * len(sorted_vals)))]
+
+
+def _run_threaded(start_url, out_dir, run):
+    from crawler import threaded_crawl_enhanced
+    threaded_crawl_enhanced(start_url, out_dir, max_pages=run['max_pages'], max_depth=run['max_depth'],
+                            allow_external=True, max_workers=run['workers'], image_workers=run['image_workers'],
+                            resume=run['resume'])
+
+
+_warm = {}
+
+
+def _prepare_warm(start_url, run):
+    # untimed: a short crawl of the same site fills the connection pool, limiters and robots.txt cache
+    from crawler import Crawler
+    crawler = Crawler(max_depth=run['max_depth'], allow_external=True, max_workers=run['workers'],
+                      image_workers=run['image_workers'], resume=run['resume'])
+    tmp = tempfile.mkdtemp(prefix='crawl-bench-warmup-')
+    try:
+        crawler.run(start_url, tmp, max_pages=min(20, run['max_pages']))
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+    _warm['crawler'] = crawler
+
+
+def _run_warm(start_url, out_dir, run):
+    crawler = _warm.pop('crawler')
+    try:
+        crawler.run(start_url, out_dir, max_pages=run['max_pages'])
+    finally:
+        crawler.close()
+
+
+def _prepare_replay(start_url, run):
+    # untimed: the crawl whose archive is replayed
+    tmp = tempfile.mkdtemp(prefix='crawl-bench-archive-')
+    from crawler import threaded_crawl_enhanced
+    threaded_crawl_enhanced(start_url, tmp, max_pages=run['max_pages'], max_depth=run['max_depth'],
+                            allow_external=True, max_workers=run['workers'], image_workers=run['image_workers'],
+                            resume=run['resume'], archive=True)
+    _warm['archive'] = tmp
+
+
+def _run_replay(start_url, out_dir, run):
+    from crawler import Crawler
+    source = _warm.pop('archive')
+    try:
+        with Crawler(max_workers=run['workers']) as crawler:
+            crawler.replay(source, out_dir)
+    finally:
+        shutil.rmtree(source, ignore_errors=True)
+
+
+# engine name -> callable(start_url, out_dir, run); new engines register here
+ENGINES = {
+    'threaded': _run_threaded,
+    'warm': _run_warm,
+    'replay': _run_replay,
+}
+
+# engine name -> callable(start_url, run) run untimed in the worker before the engine
+PREPARE = {
+    'warm': _prepare_warm,
+    'replay': _prepare_replay,
+}
+
+
+def worker(run):
+    import resource
+
+    import requests
+    from io_helpers import iter_manifest_rows
+    from limiter import DomainLimiter
+
+    if run.get('min_delay') is not None:
+        DomainLimiter.MIN_DELAY = float(run['min_delay'])
+
+    latencies = []
+    lat_lock = Lock()
+
+    class TimedSession(requests.Session):
+        def get(self, *args, **kwargs):
+            t0 = time.perf_counter()
+            try:
+                return super().get(*args, **kwargs)
+            finally:
+                dt = time.perf_counter() - t0
+                with lat_lock:
+                    latencies.append(dt)
+
+    requests.Session = TimedSession
+    import crawler
+    crawler.requests.Session = TimedSession
+
+    prepare = PREPARE.get(run['engine'])
+    if prepare is not None:
+        prepare(run['start_url'], run)
+        latencies.clear()
+
+    out_dir = tempfile.mkdtemp(prefix='crawl-bench-')
+    try:
+        r0 = resource.getrusage(resource.RUSAGE_SELF)
+        t0 = time.perf_counter()
+        ENGINES[run['engine']](run['start_url'], out_dir, run)
+        wall = time.perf_counter() - t0
+        r1 = resource.getrusage(resource.RUSAGE_SELF)
+        pages = errors = 0
+        for row in iter_manifest_rows(os.path.join(out_dir, 'urls', 'urls.csv')):
+            if row.get('status') == '200':
+                pages += 1
+            else:
+                errors += 1
+    finally:
+        if not run.get('keep'):
+            shutil.rmtree(out_dir, ignore_errors=True)
+    lat = sorted(latencies)
+    user = r1.ru_utime - r0.ru_utime
+    sys_t = r1.ru_stime - r0.ru_stime
+    return {
+        'engine': run['engine'],
+        'pages': pages,
+        'errors': errors,
+        'requests': len(lat),
+        'wall_s': round(wall, 3),
+        'pages_per_sec': round(pages / wall, 2) if wall else 0.0,
+        'latency_p50_ms': round(_percentile(lat, 0.50) * 1000, 2),
+        'latency_p99_ms': round(_percentile(lat, 0.99) * 1000, 2),
+        'cpu_user_s': round(user, 3),
+        'cpu_sys_s': round(sys_t, 3),
+        'cpu_pct': round(100.0 * (user + sys_t) / wall, 1) if wall else 0.0,
+        # ru_maxrss is KiB on Linux, bytes on macOS
+        'peak_rss_mb': round(r1.ru_maxrss / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1),
+    }
+
+
+# ---------- driver side ----------
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=HERE, capture_output=True,
+                              text=True, timeout=10).stdout.strip() or None
+    except Exception:
+        return None
+
+
+def _start_server(site_cfg):
+    cmd = [sys.executable, os.path.join(HERE, 'mock_site.py')]
+    for k, v in site_cfg.items():
+        cmd += ['--' + k.replace('_', '-'), str(v)]
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, text=True)
+    line = proc.stdout.readline()
+    if not line:
+        proc.kill()
+        raise RuntimeError('mock site server failed to start')
+    return proc, json.loads(line)
+
+
+def run_suite(site_cfg, engines, repeat=1, workers=10, image_workers=4, max_pages=None, max_depth=50,
+              min_delay=None, verbose=False, keep=False):
+    proc, info = _start_server(site_cfg)
+    results = []
+    try:
+        for engine in engines:
+            for i in range(repeat):
+                run = {
+                    'engine': engine,
+                    'start_url': info['start_url'],
+                    'max_pages': max_pages or site_cfg['sites'] * site_cfg['pages'],
+                    'max_depth': max_depth,
+                    'workers': workers,
+                    'image_workers': image_workers,
+                    'resume': False,
+                    'min_delay': min_delay,
+                    'keep': keep,
+                }
+                cp = subprocess.run([sys.executable, os.path.abspath(__file__), '--worker', json.dumps(run)],
+                                    stdout=subprocess.PIPE, text=True,
+                                    stderr=None if verbose else subprocess.DEVNULL)
+                if cp.returncode != 0 or not cp.stdout.strip():
+                    raise RuntimeError(f'benchmark worker failed for engine {engine} (exit {cp.returncode})')
+                res = json.loads(cp.stdout.strip().splitlines()[-1])
+                res['run'] = i
+                results.append(res)
+                print('%-10s run %d: %5d pages %8.2f pages/s  p50 %7.2fms  p99 %7.2fms  cpu %5.1f%%  rss %6.1fMB' % (
+                    engine, i, res['pages'], res['pages_per_sec'], res['latency_p50_ms'], res['latency_p99_ms'],
+                    res['cpu_pct'], res['peak_rss_mb']), flush=True)
+    finally:
+        proc.terminate()
+        proc.wait(timeout=10)
+    return results
+
+
+def main():
+    if len(sys.argv) >= 3 and sys.argv[1] == '--worker':
+        print(json.dumps(worker(json.loads(sys.argv[2]))))
+        return 0
+
+    parser = argparse.ArgumentParser(description='End-to-end crawler benchmark against local synthetic sites')
+    parser.add_argument('--preset', choices=sorted(PRESETS), default='small')
+    parser.add_argument('--engines', nargs='*', default=['threaded'], choices=sorted(ENGINES))
+    parser.add_argument('--repeat', type=int, default=1)
+    parser.add_argument('--workers', type=int, default=10)
+    parser.add_argument('--image-workers', type=int, default=4)
+    parser.add_argument('--max-pages', type=int, default=None, help='Default: every page of every site')
+    parser.add_argument('--max-depth', type=int, default=50)
+    parser.add_argument('--min-delay', type=float, default=None, help='Override DomainLimiter.MIN_DELAY in the worker')
+    parser.add_argument('--out', default='bench_results.json')
+    parser.add_argument('--keep', action='store_true', help='Keep crawl output directories')
+    parser.add_argument('--verbose', action='store_true', help='Show crawler logs')
+    for key, default in DEFAULTS.items():
+        parser.add_argument('--' + key.replace('_', '-'), type=type(default), default=None)
+    args = parser.parse_args()
+
+    site_cfg = dict(DEFAULTS, **PRESETS[args.preset])
+    for key in DEFAULTS:
+        v = getattr(args, key)
+        if v is not None:
+            site_cfg[key] = v
+
+    results = run_suite(site_cfg, args.engines, repeat=args.repeat, workers=args.workers,
+                        image_workers=args.image_workers, max_pages=args.max_pages, max_depth=args.max_depth,
+                        min_delay=args.min_delay, verbose=args.verbose, keep=args.keep)
+    report = {
+        'suite_version': SUITE_VERSION,
+        'commit': _git_commit(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'preset': args.preset,
+        'site': site_cfg,
+        'crawl': {'workers': args.workers, 'image_workers': args.image_workers, 'max_pages': args.max_pages,
+                  'max_depth': args.max_depth, 'min_delay': args.min_delay},
+        'results': results,
+    }
+    with open(args.out, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print('Wrote', args.out)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
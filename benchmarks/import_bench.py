@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+Import-time benchmark
+
+Measures how long importing each entry module takes in a fresh interpreter, using
+`python -X importtime -c "import <module>"`, and checks that modules kept lazy (HTTP stack,
+HTML parser, SQLite, multiprocessing, ...) are not executed at import.
+
+Per module: best and median cumulative import time over --repeat fresh processes, the
+modules with the largest self time, and the wall time of `main.py --help` (CLI start
+latency, interpreter startup included).
+
+Usage:
+    python benchmarks/import_bench.py
+    python benchmarks/import_bench.py --save-baseline benchmarks/import_baseline.json
+    python benchmarks/import_bench.py --compare benchmarks/import_baseline.json --threshold 0.25
+
+Exits with status 1 when a module in LAZY is executed by importing its entry module, or
+(--compare) when a best time is more than --threshold slower than the baseline. Baselines
+are machine-specific: record one before a change and compare after it, on the same machine.
+"""
+
+import argparse
+import json
+import os
+import platform
+import re
+import statistics
+import subprocess
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SRC = os.path.abspath(os.path.join(HERE, '..', 'src'))
+
+SUITE_VERSION = 1
+
+MODULES = ('crawler', 'main', 'sharding', 'crawl_summary', 'link_graph_exporter', 'graph_analytics',
+           'columnar_export')
+
+# entry module -> modules it must not execute at import time (loaded on first use instead)
+LAZY = {
+    'crawler': ('requests', 'bs4', 'sqlite3', 'logging.handlers', 'cProfile', 'multiprocessing'),
+    'main': ('requests', 'bs4', 'sqlite3', 'logging.handlers', 'multiprocessing'),
+    'crawl_summary': ('requests', 'bs4'),
+    'link_graph_exporter': ('requests', 'bs4'),
+}
+
+_LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)\s*$')
+
+
+def parse_importtime(stderr):
+    """[(module, self_us, cumulative_us, depth)] from -X importtime output, in output order."""
+    rows = []
+    for line in stderr.splitlines():
+        m = _LINE.match(line)
+        if m:
+            rows.append((m.group(4), int(m.group(1)), int(m.group(2)), len(m.group(3)) // 2))
+    return rows
+
+
+def import_profile(module):
+    """Import `module` in a fresh interpreter; returns the parsed -X importtime rows."""
+    env = dict(os.environ, PYTHONPATH=SRC + os.pathsep + os.environ.get('PYTHONPATH', ''))
+    env.pop('PYTHONPROFILEIMPORTTIME', None)
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'], cwd=SRC, env=env,
+                          capture_output=True, text=True, timeout=120)
+    if proc.returncode != 0:
+        raise RuntimeError(f'import {module} failed:\n{proc.stderr[-2000:]}')
+    return parse_importtime(proc.stderr)
+
+
+def lazy_violations(module, rows):
+    """Modules from LAZY[module] that were executed while importing `module`."""
+    loaded = {name for name, _, _, _ in rows}
+    return [m for m in LAZY.get(module, ()) if m in loaded]
+
+
+def bench_module(module, repeat):
+    totals = []
+    rows = []
+    for _ in range(repeat):
+        rows = import_profile(module)
+        # the top-level entry for the module itself (depth 0), which follows its imports
+        totals.append(next(cum for name, _, cum, depth in rows if name == module and depth == 0))
+    ours = [(name, us) for name, us, _, _ in rows]
+    ours.sort(key=lambda r: -r[1])
+    return {
+        'best_ms': round(min(totals) / 1000, 3),
+        'median_ms': round(statistics.median(totals) / 1000, 3),
+        'modules': len(rows),
+        'top_self_ms': [[name, round(us / 1000, 3)] for name, us in ours[:8]],
+        'lazy_violations': lazy_violations(module, rows),
+    }
+
+
+def bench_cli(repeat):
+    """Wall time of `main.py --help` in a fresh interpreter."""
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        subprocess.run([sys.executable, os.path.join(SRC, 'main.py'), '--help'], cwd=SRC, capture_output=True,
+                       timeout=120, check=True)
+        times.append(time.perf_counter() - t0)
+    return {'best_ms': round(min(times) * 1000, 3), 'median_ms': round(statistics.median(times) * 1000, 3)}
+
+
+def run_suite(modules=MODULES, repeat=5, verbose=True):
+    results = {}
+    for module in modules:
+        res = results[f'import {module}'] = bench_module(module, repeat)
+        if verbose:
+            bad = ' LAZY VIOLATION: %s' % ', '.join(res['lazy_violations']) if res['lazy_violations'] else ''
+            print('%-30s %9.2f ms  (median %.2f, %d modules)%s' % (
+                f'import {module}', res['best_ms'], res['median_ms'], res['modules'], bad), flush=True)
+    res = results['main.py --help'] = bench_cli(repeat)
+    if verbose:
+        print('%-30s %9.2f ms  (median %.2f, wall incl. interpreter)' % ('main.py --help', res['best_ms'],
+                                                                      res['median_ms']), flush=True)
+    return results
+
+
+def compare(baseline, results, threshold=0.25):
+    """(rows, regressions): rows are (name, baseline_ms, current_ms, ratio, verdict)."""
+    rows = []
+    regressions = []
+    for name, cur in results.items():
+        base = baseline.get('results', {}).get(name)
+        if base is None:
+            rows.append((name, None, cur['best_ms'], None, 'new'))
+            continue
+        ratio = cur['best_ms'] / base['best_ms'] if base['best_ms'] else float('inf')
+        if ratio > 1 + threshold:
+            verdict = 'REGRESSION'
+            regressions.append(name)
+        elif ratio < 1 - threshold:
+            verdict = 'faster'
+        else:
+            verdict = 'ok'
+        rows.append((name, base['best_ms'], cur['best_ms'], ratio, verdict))
+    return rows, regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Import-time benchmark (-X importtime) with baseline comparison')
+    parser.add_argument('--modules', nargs='*', default=list(MODULES), help='Entry modules to import')
+    parser.add_argument('--repeat', type=int, default=5, help='Fresh interpreters per module')
+    parser.add_argument('--top', action='store_true', help='Print the largest self times per module')
+    parser.add_argument('--save-baseline', default=None, help='Write results JSON as the new baseline')
+    parser.add_argument('--compare', default=None, help='Baseline JSON to compare against')
+    parser.add_argument('--threshold', type=float, default=0.25, help='Allowed slowdown ratio before failing')
+    args = parser.parse_args()
+
+    results = run_suite(args.modules, args.repeat)
+    if args.top:
+        for name, res in results.items():
+            for mod, ms in res.get('top_self_ms', []):
+                print('  %-28s %-34s %8.2f ms' % (name, mod, ms))
+    report = {
+        'suite_version': SUITE_VERSION,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'repeat': args.repeat,
+        'results': results,
+    }
+    status = 0
+    if any(res.get('lazy_violations') for res in results.values()):
+        status = 1
+    if args.save_baseline:
+        with open(args.save_baseline, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print('Saved baseline to %s' % args.save_baseline)
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        rows, regressions = compare(baseline, results, args.threshold)
+        print('\n%-30s %12s %12s %8s' % ('benchmark', 'baseline ms', 'current ms', 'ratio'))
+        for name, base, cur, ratio, verdict in rows:
+            print('%-30s %12s %12.2f %8s  %s' % (name, '-' if base is None else '%.2f' % base, cur,
+                                                '-' if ratio is None else '%.2f' % ratio, verdict))
+        if regressions:
+            print('\n%d regression(s) over %.0f%%: %s' % (len(regressions), args.threshold * 100,
+                                                         ', '.join(regressions)))
+            status = 1
+    sys.exit(status)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,483 @@
+#!/usr/bin/env python3
+"""
+Component microbenchmarks
+
+Times the crawler's hot functions and every public CrawlDB method on fixed input corpora,
+writes a machine-readable result file, and compares it with a saved baseline.
+
+Corpora are generated from a string seed that includes CORPUS_VERSION, so they are identical
+on every machine and Python version; the result file records a digest of them. Change a
+generator -> bump CORPUS_VERSION (results from different corpus versions are not compared).
+
+Benchmarks:
+ - parse_html_for_links_and_text   small / medium / large synthetic pages
+ - normalize_url, domain_of        mixed relative / absolute / noisy links
+ - safe_filename                   URLs
+ - compute_content_hash            page texts
+ - classify_topic                  page texts
+ - parse_sitemap_xml               100 / 5000 URL sitemaps
+ - iter_sitemap                    the same sitemaps, streamed (what the crawler uses)
+ - db.<method>@<rows>              every public CrawlDB method on tables pre-filled to
+                                   <rows> pages / nodes / frontier rows (default 1k, 10k, 100k)
+
+Per benchmark: best and median microseconds per operation over --repeat rounds.
+
+Usage:
+    python benchmarks/micro_bench.py --save-baseline benchmarks/micro_baseline.json
+    python benchmarks/micro_bench.py --compare benchmarks/micro_baseline.json --threshold 0.2
+    python benchmarks/micro_bench.py --only 'db.*@10000' --quick
+
+--compare exits with status 1 when any benchmark's best time is more than --threshold slower
+than the baseline (2 when the corpus version differs). Baselines are machine-specific:
+record one before a change and compare after it, on the same machine.
+"""
+
+import argparse
+import fnmatch
+import hashlib
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from xml.sax.saxutils import escape
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..', 'src'))
+
+from db import CrawlDB  # noqa: E402
+from html_parsing import parse_html_for_links_and_text, parse_sitemap_xml  # noqa: E402
+from sitemaps import iter_sitemap  # noqa: E402
+from topic_detect import classify_topic  # noqa: E402
+from url_utils import domain_of, normalize_url  # noqa: E402
+from utils import compute_content_hash, safe_filename  # noqa: E402
+
+SUITE_VERSION = 1
+CORPUS_VERSION = 1
+
+DB_SIZES = (1000, 10000, 100000)
+QUICK_DB_SIZES = (1000, 10000)
+
+_WORDS = ('the crawler visits pages and follows links across domains while the market report covers '
+          'stock investment bank trends football match team player goal movie music concert film '
+          'hospital doctor health software cloud computer quantum harbor river forest garden').split()
+_HOSTS = ['example.com', 'www.example.org', 'News.Example.NET', 'shop.example.co.uk', 'blog.example.io:8080',
+          'xn--bcher-kva.example', 'static.cdn.example.com', 'docs.example.dev']
+
+
+# ---------- corpora ----------
+
+def _words(rng, n):
+    return ' '.join(rng.choice(_WORDS) for _ in range(n))
+
+
+def _url(rng, host=None):
+    host = host or rng.choice(_HOSTS)
+    scheme = rng.choice(('http', 'https', 'https'))
+    path = '/'.join(rng.choice(_WORDS) for _ in range(rng.randint(0, 4)))
+    url = f'{scheme}://{host}/{path}'
+    if rng.random() < 0.3:
+        url += f'?id={rng.randint(1, 99999)}&utm_source=feed&ref={rng.choice(_WORDS)}'
+    if rng.random() < 0.1:
+        url += '#' + rng.choice(_WORDS)
+    return url
+
+
+def _href(rng):
+    r = rng.random()
+    if r < 0.35:
+        return _url(rng)
+    if r < 0.6:
+        return '/' + '/'.join(rng.choice(_WORDS) for _ in range(rng.randint(1, 3))) + rng.choice(('', '/', '.html'))
+    if r < 0.75:
+        return '../' + rng.choice(_WORDS) + '/index.html?page=' + str(rng.randint(1, 50))
+    if r < 0.85:
+        return '#' + rng.choice(_WORDS)
+    if r < 0.9:
+        return rng.choice(('javascript:void(0)', 'mailto:someone@example.com', 'data:text/plain,hi'))
+    return '  ' + rng.choice(_WORDS) + '.html?q=' + '%20'.join(rng.choice(_WORDS) for _ in range(2)) + '  '
+
+
+def _page(rng, paragraphs, links, images):
+    parts = ['<!DOCTYPE html><html><head><title>', _words(rng, 6), '</title>',
+             '<meta charset="utf-8"><link rel="canonical" href="/canonical.html">',
+             '<style>body{font-family:sans-serif}</style><script>var x = 1;</script></head><body>',
+             '<header><nav>', ''.join(f'<a href="{_href(rng)}">{rng.choice(_WORDS)}</a>' for _ in range(8)),
+             '</nav></header><main>']
+    per_par = max(1, links // max(1, paragraphs))
+    for _ in range(paragraphs):
+        parts.append('<div class="section"><h2>' + _words(rng, 4) + '</h2><p>' + _words(rng, 80))
+        parts.extend(f' <a href="{_href(rng)}">{_words(rng, 2)}</a>' for _ in range(per_par))
+        parts.append('</p></div>')
+    parts.extend(f'<img src="/img/{rng.randint(1, 500)}.jpg" alt="{rng.choice(_WORDS)}">' for _ in range(images))
+    parts.append('</main><footer>' + _words(rng, 20) + '</footer></body></html>')
+    return ''.join(parts)
+
+
+def _sitemap(rng, n):
+    host = rng.choice(_HOSTS)
+    entries = ''.join(f'<url><loc>{escape(_url(rng, host))}</loc><lastmod>2024-01-{rng.randint(1, 28):02d}</lastmod></url>'
+                      for _ in range(n))
+    return ('<?xml version="1.0" encoding="UTF-8"?>'
+            f'<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">{entries}</urlset>')
+
+
+def build_corpus():
+    """Deterministic inputs, identical for a given CORPUS_VERSION on every machine."""
+    rng = random.Random(f'turing-micro-corpus-v{CORPUS_VERSION}')
+    pages = {
+        'small': [_page(rng, 3, 15, 2) for _ in range(40)],
+        'medium': [_page(rng, 20, 120, 10) for _ in range(15)],
+        'large': [_page(rng, 120, 800, 40) for _ in range(4)],
+    }
+    bases = [_url(rng) for _ in range(50)]
+    links = [(rng.choice(bases), _href(rng)) for _ in range(5000)]
+    urls = [_url(rng) for _ in range(5000)]
+    texts = [_words(rng, rng.choice((50, 400, 3000))) for _ in range(300)]
+    sitemaps = {'100': _sitemap(rng, 100), '5000': _sitemap(rng, 5000)}
+    return {'pages': pages, 'links': links, 'urls': urls, 'texts': texts, 'sitemaps': sitemaps}
+
+
+def corpus_digest(corpus):
+    return hashlib.sha256(json.dumps(corpus, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+
+
+# ---------- benchmarks ----------
+#
+# A benchmark is (prepare, fn): prepare(round) runs untimed and returns the list of argument
+# tuples for that round; the timed part is `for args in batch: fn(*args)`. One op = one call.
+
+def function_benchmarks(corpus):
+    benches = {}
+    for size, pages in corpus['pages'].items():
+        batch = [(html, 'https://example.com/dir/page.html') for html in pages]
+        benches[f'parse_html_for_links_and_text[{size}]'] = (lambda r, b=batch: b, parse_html_for_links_and_text)
+    links = corpus['links']
+    urls = [(u,) for u in corpus['urls']]
+    texts = [(t,) for t in corpus['texts']]
+    benches['normalize_url'] = (lambda r: links, normalize_url)
+    benches['domain_of'] = (lambda r: urls, domain_of)
+    benches['safe_filename'] = (lambda r: urls, safe_filename)
+    benches['compute_content_hash'] = (lambda r: texts, compute_content_hash)
+    benches['classify_topic'] = (lambda r: texts, classify_topic)
+    for n, doc in corpus['sitemaps'].items():
+        benches[f'parse_sitemap_xml[{n}]'] = (lambda r, d=doc: [(d,)], parse_sitemap_xml)
+        benches[f'iter_sitemap[{n}]'] = (lambda r, d=doc.encode('utf-8'): [(d,)],
+                                         lambda d: sum(1 for _ in iter_sitemap(io.BytesIO(d))))
+    return benches
+
+
+# every public CrawlDB method except close()
+DB_METHODS = ('add_page', 'mark_visited', 'add_frontier', 'pop_frontier_batch', 'get_unvisited_pages',
+              'add_image_manifest', 'node_id', 'get_node_ids', 'add_links', 'set_page_scores', 'save_domain_states',
+              'load_domain_state', 'count_nodes', 'count_links', 'iter_nodes', 'iter_links', 'has_content_hash',
+              'get_canonical_url_for_hash', 'register_content_hash', 'mark_page_duplicate', 'add_sitemap_urls',
+              'add_image_jobs', 'pop_image_jobs', 'count_image_jobs', 'add_archive_records',
+              'iter_archive_records')
+
+
+def _page_url(i):
+    return f'https://site{i % 97}.example.com/p/{i}.html'
+
+
+def populate_db(db, rows):
+    """Fill pages / nodes / links / frontier / content_map / images / image_jobs / archive_index /
+    domain_state to `rows` entries."""
+    cur = db.conn.cursor()
+    cur.executemany('INSERT OR IGNORE INTO pages(url,status,depth,parent,visited,content_hash) VALUES(?,?,?,?,?,?)',
+                    ((_page_url(i), '200', i % 10, _page_url(i // 2), i % 2, f'{i:064x}') for i in range(rows)))
+    cur.executemany('INSERT OR IGNORE INTO nodes(id,url) VALUES(?,?)', ((i + 1, _page_url(i)) for i in range(rows)))
+    cur.executemany('INSERT OR IGNORE INTO links(src,dst) VALUES(?,?)',
+                    ((i + 1, (i * 7 + k * 13) % rows + 1) for i in range(rows) for k in range(5)))
+    cur.executemany('INSERT OR IGNORE INTO frontier(url,depth,parent) VALUES(?,?,?)',
+                    ((_page_url(rows + i), 3, _page_url(i)) for i in range(rows)))
+    cur.executemany('INSERT OR IGNORE INTO content_map(content_hash,canonical_url) VALUES(?,?)',
+                    ((f'{i:064x}', _page_url(i)) for i in range(rows)))
+    cur.executemany('INSERT OR IGNORE INTO images(image_file,image_url,page_url,size_bytes) VALUES(?,?,?,?)',
+                    ((f'{i}.jpg', f'https://img.example.com/{i}.jpg', _page_url(i), 2048) for i in range(rows)))
+    cur.executemany('INSERT OR IGNORE INTO image_jobs(image_url,page_url,priority) VALUES(?,?,?)',
+                    ((f'https://img.example.com/job/{i}.jpg', _page_url(i), i % 10) for i in range(rows)))
+    cur.executemany('INSERT OR IGNORE INTO archive_index(url,segment,offset,length,status,fetched) '
+                    'VALUES(?,?,?,?,?,?)',
+                    ((_page_url(i), f'crawl-{i // 10000:05d}.warc.gz', i * 4096, 4000, 200, 1.0) for i in range(rows)))
+    db.conn.commit()
+    db.save_domain_states(_domain_state(d) for d in range(min(rows, 1000)))
+
+
+def _domain_state(d, tag=0):
+    return {'domain': f'site{d}.example.com', 'crawl_delay': 0.5, 'robots_delay': None, 'avg_latency': 0.2,
+            'latency_samples': [0.1, 0.2, 0.3] * 3, 'error_count': 1, 'request_count': 100 + tag,
+            'robots_txt': 'User-agent: *\nDisallow: /private/\n', 'robots_fetched': 1.0, 'last_access': 2.0,
+            'throttle_state': {'concurrency': 2.0}}
+
+
+def db_benchmarks(db, rows):
+    """{name: (prepare, fn)} for every public CrawlDB method on a DB holding `rows` rows per table."""
+    ops = 200
+    hot = [_page_url(i) for i in range(0, rows, max(1, rows // ops))][:ops]
+    benches = {}
+
+    def fresh(prefix, r, n=ops):
+        return [f'https://new.example.com/{prefix}/{r}/{i}' for i in range(n)]
+
+    def add_page(r):
+        return [(u, '200', 1, hot[0]) for u in fresh('page', r)]
+
+    def mark_visited(r):
+        return [(u, 200) for u in hot]
+
+    def add_frontier(r):
+        return [(u, 2, hot[0]) for u in fresh('frontier', r)]
+
+    def pop_frontier_batch(r):
+        # refill what the previous round popped so the table size stays at `rows`
+        db.conn.executemany('INSERT OR IGNORE INTO frontier(url,depth,parent) VALUES(?,?,?)',
+                            ((_page_url(rows + i), 3, '') for i in range(rows)))
+        db.conn.commit()
+        return [(100,)] * 20
+
+    def add_image_manifest(r):
+        return [(f'{i}.jpg', u, hot[0], 1024) for i, u in enumerate(fresh('img', r))]
+
+    def node_id(r):
+        return [(u,) for u in hot]
+
+    def get_node_ids(r):
+        # the frontier's lookup of a restored batch's parents: known pages and a few others
+        return [(hot[i:i + 20] + fresh('parent', r, 5),) for i in range(0, len(hot), 20)]
+
+    def add_links(r):
+        outs = fresh('link', r, 500)
+        return [(hot[i], outs[i * 10:(i + 1) * 10] + hot[:10]) for i in range(min(len(hot), 50))]
+
+    def set_page_scores(r):
+        return [([(u, 0.1, 0.2, 0.3) for u in hot],)]
+
+    def save_domain_states(r):
+        return [([_domain_state(d, r) for d in range(50)],)]
+
+    def load_domain_state(r):
+        return [(f'site{d % 50}.example.com',) for d in range(ops)]
+
+    def hashes(r):
+        return [(f'{i:064x}',) for i in range(0, rows, max(1, rows // ops))][:ops]
+
+    def register_content_hash(r):
+        return [(f'{r:08x}{i:056x}', u) for i, u in enumerate(hot)]
+
+    def mark_page_duplicate(r):
+        return [(u, f'{i:064x}', hot[0]) for i, u in enumerate(hot)]
+
+    def add_sitemap_urls(r):
+        # one batch of new URLs plus one of known pages (lastmod update only)
+        return [([(u, '2024-01-01') for u in fresh('sitemap', r)],), ([(u, '2024-02-01') for u in hot],)]
+
+    def add_image_jobs(r):
+        return [([(u, hot[0], 2) for u in fresh('imgjob', r)],)]
+
+    def pop_image_jobs(r):
+        # refill what the previous round popped so the table size stays at `rows`
+        db.conn.executemany('INSERT OR IGNORE INTO image_jobs(image_url,page_url,priority) VALUES(?,?,?)',
+                            ((f'https://img.example.com/job/{i}.jpg', '', i % 10) for i in range(rows)))
+        db.conn.commit()
+        return [(100,)] * 20
+
+    def add_archive_records(r):
+        return [([(u, 'crawl-99999.warc.gz', i * 4096, 4000, 200, 1.0) for i, u in enumerate(fresh('warc', r))],)]
+
+    once = lambda r: [()]  # noqa: E731
+
+    def drain(it):
+        for _ in it:
+            pass
+
+    benches['add_page'] = (add_page, db.add_page)
+    benches['mark_visited'] = (mark_visited, db.mark_visited)
+    benches['add_frontier'] = (add_frontier, db.add_frontier)
+    benches['pop_frontier_batch'] = (pop_frontier_batch, db.pop_frontier_batch)
+    benches['get_unvisited_pages'] = (once, db.get_unvisited_pages)
+    benches['add_image_manifest'] = (add_image_manifest, db.add_image_manifest)
+    benches['node_id'] = (node_id, db.node_id)
+    benches['get_node_ids'] = (get_node_ids, db.get_node_ids)
+    benches['add_links'] = (add_links, db.add_links)
+    benches['set_page_scores'] = (set_page_scores, db.set_page_scores)
+    benches['save_domain_states'] = (save_domain_states, db.save_domain_states)
+    benches['load_domain_state'] = (load_domain_state, db.load_domain_state)
+    benches['count_nodes'] = (once, db.count_nodes)
+    benches['count_links'] = (once, db.count_links)
+    benches['iter_nodes'] = (once, lambda: drain(db.iter_nodes()))
+    benches['iter_links'] = (once, lambda: drain(db.iter_links()))
+    benches['has_content_hash'] = (hashes, db.has_content_hash)
+    benches['get_canonical_url_for_hash'] = (hashes, db.get_canonical_url_for_hash)
+    benches['register_content_hash'] = (register_content_hash, db.register_content_hash)
+    benches['mark_page_duplicate'] = (mark_page_duplicate, db.mark_page_duplicate)
+    benches['add_sitemap_urls'] = (add_sitemap_urls, db.add_sitemap_urls)
+    benches['add_image_jobs'] = (add_image_jobs, db.add_image_jobs)
+    benches['pop_image_jobs'] = (pop_image_jobs, db.pop_image_jobs)
+    benches['count_image_jobs'] = (once, db.count_image_jobs)
+    benches['add_archive_records'] = (add_archive_records, db.add_archive_records)
+    benches['iter_archive_records'] = (once, lambda: drain(db.iter_archive_records()))
+    assert tuple(benches) == DB_METHODS
+    return {f'db.{name}@{rows}': b for name, b in benches.items()}
+
+
+def time_benchmark(prepare, fn, repeat):
+    per_op = []
+    ops = 0
+    for r in range(repeat):
+        batch = prepare(r)
+        ops = len(batch)
+        t0 = time.perf_counter()
+        for args in batch:
+            fn(*args)
+        dt = time.perf_counter() - t0
+        per_op.append(dt / max(1, ops))
+    return {
+        'ops': ops,
+        'repeat': repeat,
+        'best_us': round(min(per_op) * 1e6, 3),
+        'median_us': round(statistics.median(per_op) * 1e6, 3),
+    }
+
+
+def _selected(name, patterns):
+    return not patterns or any(fnmatch.fnmatchcase(name, p) for p in patterns)
+
+
+def run_suite(repeat=5, db_sizes=DB_SIZES, only=None, verbose=True):
+    """Run every selected benchmark; returns {name: result}."""
+    corpus = build_corpus()
+    results = {}
+
+    def run(name, prepare, fn):
+        if not _selected(name, only):
+            return
+        res = results[name] = time_benchmark(prepare, fn, repeat)
+        if verbose:
+            print('%-48s %12.2f us/op  (median %.2f, %d ops)' % (name, res['best_us'], res['median_us'], res['ops']),
+                  flush=True)
+
+    for name, (prepare, fn) in function_benchmarks(corpus).items():
+        run(name, prepare, fn)
+
+    for rows in db_sizes:
+        if not any(_selected(f'db.{m}@{rows}', only) for m in DB_METHODS):
+            continue
+        tmp = tempfile.mkdtemp(prefix='micro-bench-')
+        db = CrawlDB(os.path.join(tmp, 'bench.db'))
+        try:
+            populate_db(db, rows)
+            for name, (prepare, fn) in db_benchmarks(db, rows).items():
+                run(name, prepare, fn)
+        finally:
+            db.close()
+            shutil.rmtree(tmp, ignore_errors=True)
+    return results, corpus_digest(corpus)
+
+
+# ---------- baseline ----------
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=HERE, capture_output=True,
+                              text=True, timeout=10).stdout.strip() or None
+    except Exception:
+        return None
+
+
+def make_report(results, digest, repeat):
+    return {
+        'suite_version': SUITE_VERSION,
+        'corpus_version': CORPUS_VERSION,
+        'corpus_digest': digest,
+        'commit': _git_commit(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'repeat': repeat,
+        'results': results,
+    }
+
+
+def compare(baseline, report, threshold=0.2):
+    """
+    Compare best-of times per benchmark. Returns (rows, regressions) where rows are
+    (name, baseline_us, current_us, ratio, verdict) and regressions the names with
+    ratio > 1 + threshold.
+    """
+    rows = []
+    regressions = []
+    for name, cur in report['results'].items():
+        base = baseline.get('results', {}).get(name)
+        if base is None:
+            rows.append((name, None, cur['best_us'], None, 'new'))
+            continue
+        ratio = cur['best_us'] / base['best_us'] if base['best_us'] else float('inf')
+        if ratio > 1 + threshold:
+            verdict = 'REGRESSION'
+            regressions.append(name)
+        elif ratio < 1 - threshold:
+            verdict = 'faster'
+        else:
+            verdict = 'ok'
+        rows.append((name, base['best_us'], cur['best_us'], ratio, verdict))
+    return rows, regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Component microbenchmarks with baseline comparison')
+    parser.add_argument('--repeat', type=int, default=5, help='Rounds per benchmark (best and median reported)')
+    parser.add_argument('--sizes', type=int, nargs='*', default=None, help='CrawlDB table sizes (rows)')
+    parser.add_argument('--quick', action='store_true', help='3 rounds, DB sizes %s' % (QUICK_DB_SIZES,))
+    parser.add_argument('--only', nargs='*', default=None, help="fnmatch patterns, e.g. 'db.*@1000' normalize_url")
+    parser.add_argument('--out', default=None, help='Write results JSON here')
+    parser.add_argument('--save-baseline', default=None, help='Write results JSON as the new baseline')
+    parser.add_argument('--compare', default=None, help='Baseline JSON to compare against')
+    parser.add_argument('--threshold', type=float, default=0.2, help='Allowed slowdown ratio before failing (0.2 = 20%%)')
+    args = parser.parse_args()
+
+    repeat = 3 if args.quick and args.repeat == 5 else args.repeat
+    sizes = args.sizes or (QUICK_DB_SIZES if args.quick else DB_SIZES)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        if baseline.get('corpus_version') != CORPUS_VERSION:
+            print('Baseline uses corpus version %s, this suite %s: not comparable' % (
+                baseline.get('corpus_version'), CORPUS_VERSION))
+            return 2
+
+    results, digest = run_suite(repeat=repeat, db_sizes=sizes, only=args.only)
+    report = make_report(results, digest, repeat)
+    for path in (args.out, args.save_baseline):
+        if path:
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(report, f, indent=2)
+            print('Wrote', path)
+
+    if baseline is None:
+        return 0
+    if baseline.get('corpus_digest') != digest:
+        print('Warning: corpus digest differs from the baseline (%s vs %s)' % (baseline.get('corpus_digest'), digest))
+    rows, regressions = compare(baseline, report, args.threshold)
+    print()
+    print('%-48s %12s %12s %8s' % ('benchmark', 'baseline us', 'current us', 'ratio'))
+    for name, base_us, cur_us, ratio, verdict in rows:
+        print('%-48s %12s %12.2f %8s  %s' % (name, '-' if base_us is None else '%.2f' % base_us, cur_us,
+                                             '-' if ratio is None else '%.2fx' % ratio, verdict))
+    if regressions:
+        print('\n%d regression(s) beyond %.0f%%: %s' % (len(regressions), args.threshold * 100, ', '.join(regressions)))
+        return 1
+    print('\nNo regressions beyond %.0f%%' % (args.threshold * 100))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""
+Synthetic web sites for offline benchmarks
+
+Serves `sites` deterministic sites on 127.0.0.1, one port per site (the crawler treats
+host:port as the domain, so each site gets its own DomainLimiter). Content depends only on
+the config and the seed, so runs are reproducible across commits.
+
+Per site:
+ - /                    -> page 0
+ - /p/<i>.html          pages 0 .. pages-1, `page_kb` KB of text, `links` outlinks
+                        (`external_ratio` of them to other sites, `private_ratio` to /private/)
+ - /img/<k>.png         `images` per page drawn from a pool of `image_pool`, `image_kb` KB each
+ - /private/...         disallowed by robots.txt (served, but a polite crawler never asks)
+ - /robots.txt          Disallow: /private/ (+ Crawl-delay when crawl_delay >= 0)
+ - /sitemap.xml         the first `sitemap_urls` pages
+
+`error_rate` of the pages answer 500 and `dup_ratio` of them repeat the body of another page
+(exercises content dedup); both are fixed per URL. Every response sleeps `latency` seconds
+(+/- 50% jitter).
+
+Usage:
+    python benchmarks/mock_site.py --sites 4 --pages 500 --latency 0.02
+    # prints {"ports": [...], "start_url": "..."} and serves until interrupted
+
+In-process:
+    sites = start_sites(dict(DEFAULTS, pages=100)); ...; sites.close()
+"""
+
+import argparse
+import json
+import random
+import sys
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread
+
+DEFAULTS = {
+    'sites': 4,
+    'pages': 250,           # per site
+    'links': 10,            # outlinks per page
+    'external_ratio': 0.2,
+    'private_ratio': 0.05,
+    'page_kb': 8,
+    'images': 2,            # per page
+    'image_pool': 50,       # distinct images per site
+    'image_kb': 4,
+    'latency': 0.01,        # seconds per response
+    'error_rate': 0.02,
+    'dup_ratio': 0.1,
+    'crawl_delay': 0,       # robots.txt Crawl-delay (integer seconds); < 0 = omit
+    'sitemap_urls': 0,
+    'seed': 1,
+}
+
+_WORDS = ('crawler frontier latency robots sitemap domain canonical archive python network parser '
+          'harbor river forest quantum market garden signal vector kernel tensor museum recipe '
+          'football election climate genome ').split()
+
+
+def _rng(cfg, *key):
+    # ints (and tuples of ints) hash identically in every process, unlike str
+    return random.Random(hash((cfg['seed'],) + key))
+
+
+class MockSites:
+    def __init__(self, cfg, servers, threads):
+        self.cfg = cfg
+        self._servers = servers
+        self._threads = threads
+        self.ports = [s.server_address[1] for s in servers]
+
+    @property
+    def base_urls(self):
+        return [f'http://127.0.0.1:{p}' for p in self.ports]
+
+    @property
+    def start_url(self):
+        return self.base_urls[0] + '/'
+
+    def close(self):
+        for s in self._servers:
+            s.shutdown()
+            s.server_close()
+
+
+def _page_body(cfg, site, i, ports):
+    rng = _rng(cfg, site, i)
+    content_key = i
+    if i and rng.random() < cfg['dup_ratio']:
+        content_key = rng.randrange(0, i)
+    crng = _rng(cfg, site, content_key, 1)
+    n_words = max(1, cfg['page_kb'] * 1024 // 8)
+    paragraphs = []
+    for _ in range(max(1, n_words // 60)):
+        paragraphs.append('<p>' + ' '.join(crng.choice(_WORDS) for _ in range(60)) + '</p>')
+    links = []
+    for _ in range(cfg['links']):
+        r = rng.random()
+        if r < cfg['private_ratio']:
+            href = f'/private/{rng.randrange(cfg["pages"])}.html'
+        elif r < cfg['private_ratio'] + cfg['external_ratio'] and len(ports) > 1:
+            other = rng.randrange(len(ports))
+            href = f'http://127.0.0.1:{ports[other]}/p/{rng.randrange(cfg["pages"])}.html'
+        else:
+            href = f'/p/{rng.randrange(cfg["pages"])}.html'
+        links.append(f'<a href="{href}">more</a>')
+    imgs = [f'<img src="/img/{rng.randrange(max(1, cfg["image_pool"]))}.png"/>' for _ in range(cfg['images'])]
+    return ('<html><head><title>Synthetic page</title></head><body>' + ''.join(paragraphs) + ''.join(links) +
+            ''.join(imgs) + '</body></html>').encode('utf-8')
+
+
+def _make_handler(cfg, site, ports):
+    image = b'\x89PNG\r\n\x1a\n' + bytes(max(0, cfg['image_kb'] * 1024 - 8))
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def _send(self, status, body, ctype):
+            self.send_response(status)
+            self.send_header('Content-Type', ctype)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if cfg['latency'] > 0:
+                time.sleep(cfg['latency'] * (0.5 + random.random()))
+            path = self.path.split('?', 1)[0]
+            if path == '/robots.txt':
+                body = 'User-agent: *\nDisallow: /private/\n'
+                if cfg['crawl_delay'] >= 0:
+                    body += f'Crawl-delay: {int(cfg["crawl_delay"])}\n'
+                return self._send(200, body.encode(), 'text/plain')
+            if path == '/sitemap.xml':
+                n = min(cfg['sitemap_urls'], cfg['pages'])
+                if not n:
+                    return self._send(404, b'', 'text/plain')
+                locs = ''.join(f'<url><loc>http://127.0.0.1:{ports[site]}/p/{i}.html</loc></url>' for i in range(n))
+                body = f'<?xml version="1.0"?><urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">{locs}</urlset>'
+                return self._send(200, body.encode(), 'application/xml')
+            if path.startswith('/img/'):
+                return self._send(200, image, 'image/png')
+            if path == '/':
+                i = 0
+            elif path.startswith('/p/') and path.endswith('.html') and path[3:-5].isdigit():
+                i = int(path[3:-5])
+            elif path.startswith('/private/'):
+                return self._send(200, b'<html><body>private</body></html>', 'text/html')
+            else:
+                return self._send(404, b'not found', 'text/plain')
+            if i >= cfg['pages']:
+                return self._send(404, b'not found', 'text/plain')
+            if i and _rng(cfg, site, i, 2).random() < cfg['error_rate']:
+                return self._send(500, b'server error', 'text/plain')
+            return self._send(200, _page_body(cfg, site, i, ports), 'text/html; charset=utf-8')
+
+        def log_message(self, format, *args):
+            return
+
+    return Handler
+
+
+def start_sites(cfg=None) -> MockSites:
+    cfg = dict(DEFAULTS, **(cfg or {}))
+    ports = []
+    servers = []
+    for site in range(cfg['sites']):
+        # handlers read `ports` lazily, so it can be filled after every server is bound
+        srv = ThreadingHTTPServer(('127.0.0.1', 0), _make_handler(cfg, site, ports))
+        srv.daemon_threads = True
+        srv.request_queue_size = 128
+        servers.append(srv)
+        ports.append(srv.server_address[1])
+    threads = []
+    for srv in servers:
+        t = Thread(target=srv.serve_forever, name='mock-site', daemon=True)
+        t.start()
+        threads.append(t)
+    return MockSites(cfg, servers, threads)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve synthetic sites for crawler benchmarks')
+    for key, default in DEFAULTS.items():
+        parser.add_argument('--' + key.replace('_', '-'), type=type(default), default=default)
+    args = parser.parse_args()
+    sites = start_sites(vars(args))
+    print(json.dumps({'ports': sites.ports, 'start_url': sites.start_url}), flush=True)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        sites.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,314 @@
+import gzip
+import logging
+import mmap
+import os
+import re
+import time
+import uuid
+import zlib
+from threading import Lock
+
+from configs import ARCHIVE_COMPRESS_LEVEL, ARCHIVE_INDEX_BATCH, ARCHIVE_SEGMENT_BYTES, USER_AGENT
+
+# ---------- Raw response archive ----------
+#
+# <output>/archive/<prefix>-00000.warc.gz, -00001, ...: WARC/1.1-style records, each its own
+# gzip member, so one record can be decompressed on its own from the (segment, offset, length)
+# in CrawlDB.archive_index. Every page fetch appends a request record and a response record
+# (status line, headers, body). requests has already undone transfer and content encodings,
+# so the body stored is the decoded payload: Content-Encoding / Transfer-Encoding are dropped
+# and Content-Length matches it. Crawl depth and parent travel as X-Crawl-* record fields.
+#
+# ArchiveReader replays the responses through memory-mapped segments: the compressed bytes
+# are handed to zlib as memoryview slices of the mapping, never copied.
+
+ARCHIVE_DIR = "archive"
+_SEGMENT_RE = re.compile(r"^(?P<prefix>.+)-(?P<n>\d{5})\.warc\.gz$")
+_DROP_HEADERS = {"content-encoding", "transfer-encoding", "content-length"}
+_CRLF2 = b"\r\n\r\n"
+
+
+def _field(value) -> str:
+    # header values end up on one line
+    return str(value).replace("\r", " ").replace("\n", " ")
+
+
+def _warc_record(warc_type, url, payload, fields=None):
+    head = [
+        "WARC/1.1",
+        f"WARC-Type: {warc_type}",
+        f"WARC-Target-URI: {_field(url)}",
+        "WARC-Date: " + time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+    ]
+    head += [f"{k}: {_field(v)}" for k, v in (fields or {}).items()]
+    head += [f"Content-Type: application/http; msgtype={warc_type}", f"Content-Length: {len(payload)}"]
+    return ("\r\n".join(head) + "\r\n\r\n").encode("utf-8") + payload + _CRLF2
+
+
+def _http_block(first_line, headers, body=b""):
+    lines = [first_line] + [f"{_field(k)}: {_field(v)}" for k, v in headers]
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1", errors="replace") + body
+
+
+def segment_paths(directory, prefix=None):
+    """Archive segments in `directory` (all prefixes, or one), in write order."""
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return []
+    found = []
+    for name in names:
+        m = _SEGMENT_RE.match(name)
+        if m and (prefix is None or m.group("prefix") == prefix):
+            found.append((m.group("prefix"), int(m.group("n")), name))
+    return [os.path.join(directory, name) for _, _, name in sorted(found)]
+
+
+class ResponseArchive:
+    """
+    Appends fetched responses to rolling .warc.gz segments of about `segment_bytes` and their
+    offsets to CrawlDB.archive_index (`db`, batched). Thread-safe: records are compressed by
+    the calling page worker, only the file append is serialized. A new run never appends to
+    an earlier run's segment; it starts the next number.
+    """
+
+    def __init__(self, directory, db=None, segment_bytes=ARCHIVE_SEGMENT_BYTES, level=ARCHIVE_COMPRESS_LEVEL,
+                 index_batch=ARCHIVE_INDEX_BATCH, prefix="crawl"):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.db = db
+        self.segment_bytes = int(segment_bytes)
+        self.level = level
+        self.index_batch = max(1, int(index_batch))
+        self.prefix = prefix
+        existing = segment_paths(directory, prefix)
+        self._next = int(_SEGMENT_RE.match(os.path.basename(existing[-1])).group("n")) + 1 if existing else 0
+        self._lock = Lock()
+        self._f = None
+        self._name = None
+        self._offset = 0
+        self._index = []
+        self.records = 0
+        self.segments = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    def _roll(self):
+        if self._f is not None:
+            self._f.close()
+        self._name = f"{self.prefix}-{self._next:05d}.warc.gz"
+        self._next += 1
+        self._f = open(os.path.join(self.directory, self._name), "xb")
+        self._offset = 0
+        self.segments += 1
+
+    def write(self, url, resp, depth=0, parent=None):
+        """Archive one response (requests-like: status_code, reason, headers, content); returns
+        (segment, offset, length) of its response record."""
+        status = resp.status_code
+        body = resp.content or b""
+        headers = [(k, v) for k, v in (getattr(resp, "headers", None) or {}).items()
+                   if k.lower() not in _DROP_HEADERS]
+        headers.append(("Content-Length", len(body)))
+        reason = getattr(resp, "reason", "") or ""
+        request_id = f"<urn:uuid:{uuid.uuid4()}>"
+        request = _warc_record("request", url, _http_block(f"GET {url} HTTP/1.1", [("User-Agent", USER_AGENT)]),
+                               {"WARC-Record-ID": request_id})
+        response = _warc_record("response", url, _http_block(f"HTTP/1.1 {status} {reason}".rstrip(), headers, body),
+                                {"WARC-Record-ID": f"<urn:uuid:{uuid.uuid4()}>", "WARC-Concurrent-To": request_id,
+                                 "X-Crawl-Depth": depth, "X-Crawl-Parent": parent or ""})
+        request = gzip.compress(request, self.level, mtime=0)
+        response = gzip.compress(response, self.level, mtime=0)
+        rows = None
+        with self._lock:
+            if self._f is None or self._offset >= self.segment_bytes:
+                self._roll()
+            self._f.write(request)
+            self._f.write(response)
+            segment, offset = self._name, self._offset + len(request)
+            self._offset = offset + len(response)
+            self.records += 1
+            self.bytes_in += len(body)
+            self.bytes_out += len(request) + len(response)
+            if self.db is not None:
+                self._index.append((url, segment, offset, len(response), status, time.time()))
+                if len(self._index) >= self.index_batch:
+                    rows, self._index = self._index, []
+        if rows:
+            self.db.add_archive_records(rows)
+        return segment, offset, len(response)
+
+    def close(self):
+        with self._lock:
+            rows, self._index = self._index, []
+            if self._f is not None:
+                self._f.close()
+                self._f = None
+        if rows and self.db is not None:
+            self.db.add_archive_records(rows)
+
+    def get_stats(self) -> dict:
+        return {
+            "records": self.records,
+            "segments": self.segments,
+            "body_bytes": self.bytes_in,
+            "archive_bytes": self.bytes_out,
+        }
+
+
+class ArchiveRecord:
+    """One archived response."""
+
+    __slots__ = ("url", "status", "headers", "body", "depth", "parent")
+
+    def __init__(self, url, status, headers, body, depth, parent):
+        self.url = url
+        self.status = status
+        self.headers = headers  # {lower-case name: value}
+        self.body = body
+        self.depth = depth
+        self.parent = parent
+
+    @property
+    def text(self) -> str:
+        """Body decoded with the Content-Type charset (UTF-8 when none is declared)."""
+        charset = "utf-8"
+        for part in self.headers.get("content-type", "").split(";")[1:]:
+            k, _, v = part.partition("=")
+            if k.strip().lower() == "charset" and v.strip():
+                charset = v.strip().strip('"\'')
+        try:
+            return str(self.body, charset, "replace")
+        except LookupError:
+            return str(self.body, "utf-8", "replace")
+
+
+def _headers(block: bytes, start: int, end: int):
+    out = {}
+    for line in block[start:end].split(b"\r\n"):
+        k, sep, v = line.partition(b":")
+        if sep:
+            out[k.strip().decode("latin-1").lower()] = v.strip().decode("latin-1")
+    return out
+
+
+def parse_record(data: bytes):
+    """ArchiveRecord from one decompressed record; None for records other than responses."""
+    head_end = data.find(_CRLF2)
+    if head_end < 0 or not data.startswith(b"WARC/"):
+        raise ValueError("not a WARC record")
+    warc = _headers(data, data.find(b"\r\n") + 2, head_end)
+    if warc.get("warc-type") != "response":
+        return None
+    start = head_end + 4
+    end = start + int(warc.get("content-length", len(data) - start))
+    http_end = data.find(_CRLF2, start, end)
+    if http_end < 0:
+        raise ValueError("response record without an HTTP header block")
+    status_line = data[start:data.find(b"\r\n", start, http_end + 2)].split(b" ", 2)
+    try:
+        depth = int(warc.get("x-crawl-depth") or 0)
+    except ValueError:
+        depth = 0
+    return ArchiveRecord(url=warc.get("warc-target-uri", ""), status=int(status_line[1]),
+                         headers=_headers(data, data.find(b"\r\n", start) + 2, http_end),
+                         body=memoryview(data)[http_end + 4:end], depth=depth,
+                         parent=warc.get("x-crawl-parent") or None)
+
+
+def _scan(view, chunk=1 << 16):
+    # (offset, length, data) for each gzip member of a segment, without an index
+    pos, n = 0, len(view)
+    while pos < n:
+        d = zlib.decompressobj(wbits=31)
+        start, parts = pos, []
+        while not d.eof and pos < n:
+            piece = view[pos:pos + chunk]
+            parts.append(d.decompress(piece))
+            pos += len(piece)
+        piece = None  # no slice of the mapping may outlive the scan (mmap.close() refuses)
+        if not d.eof:
+            logging.warning("Truncated archive record at offset %d; skipping the rest of the segment", start)
+            return
+        pos -= len(d.unused_data)
+        yield start, pos - start, b"".join(parts)
+
+
+class ArchiveReader:
+    """
+    Iterates the responses archived in `directory`. With the crawl's CrawlDB (`db`) it reads
+    the records listed in archive_index (the latest fetch of each URL), segment by segment in
+    file order; without one it scans every segment. Segments are memory-mapped.
+    """
+
+    def __init__(self, directory, db=None):
+        self.directory = directory
+        self.db = db
+        self.records = 0
+        self.errors = 0
+
+    def _mapped(self, path):
+        with open(path, "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return None
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def _decode(self, data):
+        try:
+            rec = parse_record(data)
+        except Exception:
+            self.errors += 1
+            logging.debug("Unreadable archive record", exc_info=True)
+            return None
+        if rec is not None:
+            self.records += 1
+        return rec
+
+    def __iter__(self):
+        if self.db is not None:
+            yield from self._indexed()
+        else:
+            yield from self._scanned()
+
+    def _indexed(self):
+        mm = view = None
+        current = None
+        try:
+            for segment, offset, length in self.db.iter_archive_records():
+                if segment != current:
+                    if view is not None:
+                        view.release()
+                        mm.close()
+                    current = segment
+                    mm = self._mapped(os.path.join(self.directory, segment))
+                    view = memoryview(mm) if mm is not None else None
+                if view is None or offset + length > len(view):
+                    self.errors += 1
+                    continue
+                try:
+                    data = zlib.decompress(view[offset:offset + length], wbits=31)
+                except zlib.error:
+                    self.errors += 1
+                    continue
+                rec = self._decode(data)
+                if rec is not None:
+                    yield rec
+        finally:
+            if view is not None:
+                view.release()
+                mm.close()
+
+    def _scanned(self):
+        for path in segment_paths(self.directory):
+            mm = self._mapped(path)
+            if mm is None:
+                continue
+            view = memoryview(mm)
+            try:
+                for _, _, data in _scan(view):
+                    rec = self._decode(data)
+                    if rec is not None:
+                        yield rec
+            finally:
+                view.release()
+                mm.close()
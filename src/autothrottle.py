@@ -0,0 +1,193 @@
+import math
+import time
+from collections import deque
+
+from configs import AUTOTHROTTLE_MAX_CONCURRENCY, AUTOTHROTTLE_TARGET_LATENCY, AUTOTHROTTLE_WINDOW
+
+# ---------- Throttle controllers for DomainLimiter ----------
+#
+# A controller decides how fast the crawler talks to one domain. DomainLimiter calls
+# controller.on_response(limiter, latency, status_code, retry_after) under its lock after
+# every response; the controller adjusts limiter.crawl_delay and, optionally, the
+# limiter's in-flight cap via limiter.set_max_in_flight(). Each limiter needs its own
+# controller instance, so the crawler takes a factory (e.g. the class itself).
+# Optional export_state() / restore_state(limiter, state) let learned state survive runs
+# (stored in CrawlDB.domain_state).
+
+
+def is_error_status(status_code) -> bool:
+    return status_code is None or status_code >= 500 or status_code == 429
+
+
+def parse_retry_after(value, now: float = None):
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP-date); None if unparsable."""
+    if value is None:
+        return None
+    value = str(value).strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    from email.utils import parsedate_to_datetime  # HTTP-date form only; rare
+    try:
+        when = parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError, IndexError, OverflowError):
+        return None
+    return max(0.0, when - (time.time() if now is None else now))
+
+
+class LegacyThrottle:
+    """
+    The original DomainLimiter policy: multiply crawl_delay by 1.8 when the mean of the recent
+    latency samples exceeds twice the delay or the lifetime error ratio is above 20%, and by
+    0.85 when latency is well below the delay. Does not touch concurrency.
+    """
+
+    name = "legacy"
+
+    def on_response(self, limiter, latency, status_code, retry_after=None):
+        avg_latency = sum(limiter.latency_samples) / len(limiter.latency_samples)
+        if avg_latency > (limiter.crawl_delay * 2) or limiter.error_rate() > 0.2:
+            new_delay = min(limiter.crawl_delay * 1.8, limiter.MAX_DELAY)
+            if new_delay > limiter.crawl_delay:
+                limiter.crawl_delay = new_delay
+        else:
+            if avg_latency > 0 and avg_latency < (limiter.crawl_delay * 0.6):
+                new_delay = max(limiter.crawl_delay * 0.85, limiter.MIN_DELAY)
+                if new_delay < limiter.crawl_delay:
+                    limiter.crawl_delay = new_delay
+
+    def get_stats(self) -> dict:
+        return {"throttle": self.name}
+
+
+class AutoThrottle:
+    """
+    AIMD controller driven by a latency target.
+
+    Signals are computed over a sliding window of the last `window` responses (not the
+    lifetime of the domain): the error rate, an EWMA of latency and the p95 latency.
+    A response is congestion when it is 429 / 5xx / a failure, when the windowed error rate is
+    above `error_threshold`, or when the EWMA or p95 latency exceeds `target_latency`. Then:
+
+    - multiplicative decrease: request rate (1 / crawl_delay) and concurrency are scaled by
+      `beta`, at most once per `cooldown` seconds, and the window is cleared so the next
+      decision only sees responses at the new rate;
+    - additive increase otherwise: rate grows by about `increase` requests/s per second and
+      concurrency by about one per round of `concurrency` responses, up to `max_concurrency`.
+
+    crawl_delay never drops below the robots.txt delay (limiter.robots_delay) or MIN_DELAY.
+    Retry-After itself is applied by the limiter (it pushes the next slot back); here it
+    counts as congestion.
+    """
+
+    name = "aimd"
+
+    def __init__(self, target_latency: float = AUTOTHROTTLE_TARGET_LATENCY, window: int = AUTOTHROTTLE_WINDOW,
+                 error_threshold: float = 0.1, beta: float = 0.5, increase: float = 0.5, ewma_alpha: float = 0.3,
+                 start_concurrency: int = 2, max_concurrency: int = AUTOTHROTTLE_MAX_CONCURRENCY,
+                 cooldown: float = 1.0, clock=time.monotonic):
+        self.target_latency = float(target_latency)
+        self.window = max(2, int(window))
+        self.error_threshold = error_threshold
+        self.beta = beta
+        self.increase = increase
+        self.ewma_alpha = ewma_alpha
+        self.max_concurrency = max(1, int(max_concurrency))
+        self.concurrency = float(min(max(1, start_concurrency), self.max_concurrency))
+        self.cooldown = cooldown
+        self.clock = clock
+        self.latencies = deque(maxlen=self.window)
+        self.errors = deque(maxlen=self.window)
+        self.ewma = None
+        self._last_decrease = None
+        self.decreases = 0
+        self.retry_after_count = 0
+        self._applied_concurrency = None
+
+    def error_rate(self) -> float:
+        return sum(self.errors) / len(self.errors) if self.errors else 0.0
+
+    def p95(self) -> float:
+        if not self.latencies:
+            return 0.0
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(math.ceil(0.95 * len(ordered))) - 1)]
+
+    def _floor(self, limiter) -> float:
+        return max(limiter.MIN_DELAY, getattr(limiter, "robots_delay", None) or 0.0)
+
+    def _congested(self, status_code, retry_after) -> bool:
+        if retry_after is not None or is_error_status(status_code):
+            return True
+        # windowed signals need a few samples before they mean anything
+        if len(self.latencies) < min(self.window, 5):
+            return False
+        return (self.error_rate() > self.error_threshold or self.p95() > self.target_latency
+                or self.ewma > self.target_latency)
+
+    def on_response(self, limiter, latency, status_code, retry_after=None):
+        latency = float(latency)
+        self.latencies.append(latency)
+        self.errors.append(1 if is_error_status(status_code) else 0)
+        self.ewma = latency if self.ewma is None else self.ewma + self.ewma_alpha * (latency - self.ewma)
+        if retry_after is not None:
+            self.retry_after_count += 1
+
+        floor = self._floor(limiter)
+        rate = 1.0 / max(limiter.crawl_delay, floor)
+        now = self.clock()
+        if self._congested(status_code, retry_after):
+            if self._last_decrease is not None and now - self._last_decrease < self.cooldown:
+                return
+            self._last_decrease = now
+            self.decreases += 1
+            rate *= self.beta
+            self.concurrency = max(1.0, self.concurrency * self.beta)
+            self.latencies.clear()
+            self.errors.clear()
+        else:
+            rate += self.increase / rate
+            self.concurrency = min(float(self.max_concurrency), self.concurrency + 1.0 / self.concurrency)
+        limiter.crawl_delay = min(limiter.MAX_DELAY, max(floor, 1.0 / rate))
+        conc = int(self.concurrency)
+        if conc != self._applied_concurrency:
+            self._applied_concurrency = conc
+            self._apply_concurrency(limiter, conc)
+
+    def _apply_concurrency(self, limiter, conc):
+        # stays within the configured per-domain cap (0 = none)
+        cap = getattr(limiter, "configured_max_in_flight", 0)
+        limiter.set_max_in_flight(min(cap, conc) if cap > 0 else conc)
+
+    def export_state(self) -> dict:
+        return {
+            "concurrency": self.concurrency,
+            "ewma": self.ewma,
+            "latencies": list(self.latencies),
+            "errors": list(self.errors),
+        }
+
+    def restore_state(self, limiter, state: dict):
+        conc = state.get("concurrency")
+        if conc:
+            self.concurrency = min(float(self.max_concurrency), max(1.0, float(conc)))
+            self._applied_concurrency = int(self.concurrency)
+            self._apply_concurrency(limiter, self._applied_concurrency)
+        self.ewma = state.get("ewma")
+        self.latencies.extend(float(x) for x in state.get("latencies") or [])
+        self.errors.extend(int(x) for x in state.get("errors") or [])
+
+    def get_stats(self) -> dict:
+        return {
+            "throttle": self.name,
+            "concurrency": int(self.concurrency),
+            "ewma_latency": float(self.ewma or 0.0),
+            "p95_latency": float(self.p95()),
+            "window_error_rate": float(self.error_rate()),
+            "decreases": int(self.decreases),
+            "retry_after": int(self.retry_after_count),
+        }
+
+
+THROTTLES = {"legacy": LegacyThrottle, "aimd": AutoThrottle}
@@ -0,0 +1,216 @@
+import json
+import logging
+import os
+import signal
+import time
+from threading import Lock
+
+from configs import BUDGET_IMAGE_WEIGHT, BUDGET_PAGE_WEIGHT
+
+# ---------- Crawl-wide request / bandwidth budget ----------
+
+KINDS = ("page", "image")
+
+
+class TokenBucket:
+    """
+    Token bucket that allows debt: reserve() always takes its tokens and returns how long the
+    caller must wait for the balance to become non-negative, so each caller gets its own turn.
+    A rate <= 0 means unlimited. Not thread-safe on its own (GlobalBudget holds the lock).
+    """
+
+    def __init__(self, rate: float, capacity: float = None):
+        self.tokens = 0.0
+        self.stamp = time.monotonic()
+        self.set_rate(rate, capacity)
+        self.tokens = self.capacity
+
+    def set_rate(self, rate: float, capacity: float = None):
+        self.rate = float(rate or 0.0)
+        # one second worth of tokens by default, at least one request
+        self.capacity = float(capacity) if capacity else max(1.0, self.rate)
+        self.tokens = min(self.tokens, self.capacity)
+
+    def _refill(self, now: float):
+        if now > self.stamp:
+            self.tokens = min(self.capacity, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+
+    def reserve(self, n: float, now: float) -> float:
+        if self.rate <= 0:
+            return 0.0
+        self._refill(now)
+        self.tokens -= n
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def debit(self, n: float, now: float):
+        if self.rate <= 0:
+            return
+        self._refill(now)
+        # a negative n (an over-reservation given back) never lifts the balance over capacity
+        self.tokens = min(self.capacity, self.tokens - n)
+
+    def wait_time(self, now: float) -> float:
+        if self.rate <= 0:
+            return 0.0
+        self._refill(now)
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+
+class GlobalBudget:
+    """
+    Crawl-wide requests/sec and bytes/sec limits shared by every page and image worker.
+
+    Each limit applies to the total and is split between pages and images by weight
+    (page share = page_weight / (page_weight + image_weight)). A kind waits only on its own
+    share, so a flood of image downloads never delays page fetches. A weight of 0 gives that
+    kind no share: it waits on the total, which every request is charged to, and so only
+    uses what the other kind leaves. A value of 0 disables a limit.
+
+    Bytes are only known after a response: acquire() reserves the kind's average response
+    size (so waiting workers are spaced out rather than released together), and
+    record_bytes() charges the difference once the size is known.
+
+    Settings can change at runtime via update(), a JSON control file (re-read when its mtime
+    changes, checked at most every `poll_interval` seconds) or SIGHUP when
+    install_reload_signal() has been called.
+
+    `share` scales every limit for a process that owns part of a crawl (one shard of
+    sharding.sharded_crawl gets 1/N), so configured and reloaded values stay crawl-wide.
+    """
+
+    def __init__(self, max_rps: float = 0, max_bps: float = 0, page_weight: float = BUDGET_PAGE_WEIGHT,
+                 image_weight: float = BUDGET_IMAGE_WEIGHT, control_file: str = None, poll_interval: float = 2.0,
+                 share: float = 1.0):
+        self.lock = Lock()
+        self.share = float(share)
+        self.control_file = control_file
+        self.poll_interval = poll_interval
+        self._control_mtime = None
+        self._next_poll = 0.0
+        self._reload_requested = False
+        self.requests = {k: 0 for k in KINDS}
+        self.bytes = {k: 0 for k in KINDS}
+        self.waited = {k: 0.0 for k in KINDS}
+        self._total_req = TokenBucket(0)
+        self._total_bytes = TokenBucket(0)
+        self._req = {k: TokenBucket(0) for k in KINDS}
+        self._bytes = {k: TokenBucket(0) for k in KINDS}
+        self._shares = {k: 0.0 for k in KINDS}
+        self._avg_bytes = {k: 0.0 for k in KINDS}
+        self.update(max_rps=max_rps, max_bps=max_bps, page_weight=page_weight, image_weight=image_weight)
+        if control_file:
+            self._poll_control_file(force=True)
+
+    def update(self, max_rps=None, max_bps=None, page_weight=None, image_weight=None):
+        with self.lock:
+            if max_rps is not None:
+                self.max_rps = float(max_rps)
+            if max_bps is not None:
+                self.max_bps = float(max_bps)
+            if page_weight is not None:
+                self.page_weight = float(page_weight)
+            if image_weight is not None:
+                self.image_weight = float(image_weight)
+            total_w = (self.page_weight + self.image_weight) or 1.0
+            shares = self._shares = {"page": self.page_weight / total_w, "image": self.image_weight / total_w}
+            rps, bps = self.max_rps * self.share, self.max_bps * self.share
+            self._total_req.set_rate(rps)
+            self._total_bytes.set_rate(bps)
+            for k in KINDS:
+                self._req[k].set_rate(rps * shares[k])
+                self._bytes[k].set_rate(bps * shares[k])
+        logging.info("Global budget: %.2f req/s, %.0f bytes/s, page:image weights %.2f:%.2f",
+                     self.max_rps, self.max_bps, self.page_weight, self.image_weight)
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_rps > 0 or self.max_bps > 0
+
+    def _reserve(self, own, total, kind, n, now) -> float:
+        # a kind with a share takes its turn on its own bucket and is only charged to the
+        # total; a kind without one takes its turn on the total
+        if self._shares[kind]:
+            total.debit(n, now)
+            return own.reserve(n, now)
+        return total.reserve(n, now)
+
+    def _charge(self, own, total, kind, n, now):
+        if self._shares[kind]:
+            own.debit(n, now)
+        total.debit(n, now)
+
+    def acquire(self, kind: str = "page") -> float:
+        """
+        Block until a request of `kind` ('page' or 'image') fits in the budget. Returns the
+        bytes reserved for its response, to pass to record_bytes().
+        """
+        self._poll_control_file()
+        with self.lock:
+            now = time.monotonic()
+            reserved = self._avg_bytes[kind] if self.max_bps > 0 else 0.0
+            wait = max(self._reserve(self._req[kind], self._total_req, kind, 1, now),
+                       self._reserve(self._bytes[kind], self._total_bytes, kind, reserved, now))
+            self.requests[kind] += 1
+            self.waited[kind] += wait
+        if wait > 0:
+            time.sleep(wait)
+        return reserved
+
+    def record_bytes(self, kind: str, n: int, reserved: float = 0.0):
+        """Charge a response's size, less what acquire() reserved for it."""
+        if not n and not reserved:
+            return
+        with self.lock:
+            now = time.monotonic()
+            if n:
+                avg = self._avg_bytes[kind]
+                self._avg_bytes[kind] = float(n) if not avg else 0.8 * avg + 0.2 * n
+            self._charge(self._bytes[kind], self._total_bytes, kind, n - reserved, now)
+            self.bytes[kind] += int(n)
+
+    # ---- runtime control ----
+
+    def request_reload(self):
+        self._reload_requested = True
+
+    def install_reload_signal(self):
+        """Re-read the control file on SIGHUP (main thread, POSIX only)."""
+        if self.control_file and hasattr(signal, "SIGHUP"):
+            signal.signal(signal.SIGHUP, lambda signum, frame: self.request_reload())
+
+    def _poll_control_file(self, force=False):
+        if not self.control_file:
+            return
+        now = time.monotonic()
+        if not (force or self._reload_requested or now >= self._next_poll):
+            return
+        self._next_poll = now + self.poll_interval
+        reload_requested, self._reload_requested = self._reload_requested, False
+        try:
+            mtime = os.stat(self.control_file).st_mtime_ns
+        except OSError:
+            return
+        if mtime == self._control_mtime and not reload_requested:
+            return
+        self._control_mtime = mtime
+        try:
+            with open(self.control_file, "r", encoding="utf-8") as f:
+                cfg = json.load(f)
+            self.update(max_rps=cfg.get("max_rps"), max_bps=cfg.get("max_bps"),
+                        page_weight=cfg.get("page_weight"), image_weight=cfg.get("image_weight"))
+        except Exception:
+            logging.exception("Failed to load budget control file: %s", self.control_file)
+
+    def get_stats(self) -> dict:
+        with self.lock:
+            return {
+                "max_rps": self.max_rps,
+                "max_bps": self.max_bps,
+                "share": self.share,
+                "page_weight": self.page_weight,
+                "image_weight": self.image_weight,
+                "requests": dict(self.requests),
+                "bytes": dict(self.bytes),
+                "wait_seconds": dict(self.waited),
+            }
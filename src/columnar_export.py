@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+"""
+Columnar export of crawl manifests
+
+Converts the crawler's CSV manifests and the CrawlDB tables into a typed, column-per-file
+layout so downstream jobs can scan only the columns they need instead of materializing
+every row as a dict.
+
+Layout (default `data/columnar/`), one directory per table:
+ - <table>/_schema.json         {"rows": N, "byteorder": "little", "columns": [{"name", "type"}, ...]}
+ - <col>.i64                    int64 column (missing values stored as -1)
+ - <col>.codes + <col>.dict.json   dictionary-encoded string column (uint32 codes)
+ - <col>.offsets + <col>.utf8   plain string column (uint64 end offsets into a UTF-8 blob)
+
+Tables:
+ - urls, image_manifest   from urls/urls.csv and images/manifest.csv
+ - pages, images, content_map   from crawl_state.db (when present)
+
+Usage:
+    python src/columnar_export.py --output data
+
+Columns are written incrementally, so conversion runs in constant memory apart from the
+dictionaries of the dictionary-encoded columns (domain, status, topic).
+"""
+
+import argparse
+import json
+import mmap
+import os
+import sqlite3
+import sys
+from array import array
+
+from configs import DB_NAME
+from io_helpers import iter_manifest_rows
+from url_utils import domain_of
+
+INT64 = 'int64'
+DICT = 'dict'
+STRING = 'string'
+
+CHUNK_ROWS = 65536
+
+# table -> [(column, type)]; "domain" is derived from the url-like column named in DERIVED_DOMAIN
+SCHEMAS = {
+    'urls': [('url', STRING), ('status', DICT), ('depth', INT64), ('parent', STRING), ('topic', DICT),
+             ('is_duplicate', INT64), ('domain', DICT)],
+    'image_manifest': [('image_file', STRING), ('image_url', STRING), ('page_url', STRING),
+                       ('size_bytes', INT64), ('domain', DICT)],
+    'pages': [('url', STRING), ('status', DICT), ('depth', INT64), ('parent', STRING), ('visited', INT64),
+              ('content_hash', STRING), ('is_duplicate', INT64), ('duplicate_of', STRING), ('domain', DICT)],
+    'images': [('image_file', STRING), ('image_url', STRING), ('page_url', STRING), ('size_bytes', INT64),
+               ('domain', DICT)],
+    'content_map': [('content_hash', STRING), ('canonical_url', STRING), ('domain', DICT)],
+}
+DERIVED_DOMAIN = {
+    'urls': 'url', 'image_manifest': 'image_url', 'pages': 'url', 'images': 'image_url',
+    'content_map': 'canonical_url',
+}
+
+
+def _to_int(v):
+    try:
+        return int(v)
+    except (TypeError, ValueError):
+        try:
+            return int(float(v))
+        except (TypeError, ValueError):
+            return -1
+
+
+class ColumnarTableWriter:
+    def __init__(self, table_dir, schema):
+        self.table_dir = table_dir
+        self.schema = list(schema)
+        self.rows = 0
+        os.makedirs(table_dir, exist_ok=True)
+        self._files = {}
+        self._bufs = {}
+        self._dicts = {}
+        self._blob_pos = {}
+        for name, typ in self.schema:
+            if typ == INT64:
+                self._files[name] = open(os.path.join(table_dir, name + '.i64'), 'wb')
+                self._bufs[name] = array('q')
+            elif typ == DICT:
+                self._files[name] = open(os.path.join(table_dir, name + '.codes'), 'wb')
+                self._bufs[name] = array('I')
+                self._dicts[name] = {}
+            elif typ == STRING:
+                self._files[name] = (open(os.path.join(table_dir, name + '.offsets'), 'wb'),
+                                     open(os.path.join(table_dir, name + '.utf8'), 'wb'))
+                self._bufs[name] = (array('Q'), [])
+                self._blob_pos[name] = 0
+            else:
+                raise ValueError(f'Unknown column type: {typ}')
+
+    def append(self, row):
+        """Append one row given as a dict keyed by column name."""
+        for name, typ in self.schema:
+            v = row.get(name)
+            if typ == INT64:
+                self._bufs[name].append(_to_int(v))
+            elif typ == DICT:
+                d = self._dicts[name]
+                key = '' if v is None else str(v)
+                code = d.get(key)
+                if code is None:
+                    code = d[key] = len(d)
+                self._bufs[name].append(code)
+            else:
+                data = ('' if v is None else str(v)).encode('utf-8')
+                self._blob_pos[name] += len(data)
+                offsets, parts = self._bufs[name]
+                offsets.append(self._blob_pos[name])
+                parts.append(data)
+        self.rows += 1
+        if self.rows % CHUNK_ROWS == 0:
+            self._flush()
+
+    def _flush(self):
+        for name, typ in self.schema:
+            if typ == STRING:
+                offsets, parts = self._bufs[name]
+                fo, fb = self._files[name]
+                offsets.tofile(fo)
+                fb.write(b''.join(parts))
+                self._bufs[name] = (array('Q'), [])
+            else:
+                self._bufs[name].tofile(self._files[name])
+                self._bufs[name] = array(self._bufs[name].typecode)
+
+    def close(self):
+        self._flush()
+        for f in self._files.values():
+            for fh in (f if isinstance(f, tuple) else (f,)):
+                fh.close()
+        for name, d in self._dicts.items():
+            with open(os.path.join(self.table_dir, name + '.dict.json'), 'w', encoding='utf-8') as f:
+                json.dump(list(d), f, ensure_ascii=False)
+        meta = {
+            'rows': self.rows,
+            'byteorder': sys.byteorder,
+            'columns': [{'name': n, 'type': t} for n, t in self.schema],
+        }
+        with open(os.path.join(self.table_dir, '_schema.json'), 'w', encoding='utf-8') as f:
+            json.dump(meta, f, indent=2)
+
+
+class ColumnarTable:
+    """Reader for one exported table. Only the columns that are asked for are read from disk."""
+
+    def __init__(self, table_dir):
+        self.table_dir = table_dir
+        with open(os.path.join(table_dir, '_schema.json'), 'r', encoding='utf-8') as f:
+            self.meta = json.load(f)
+        self.num_rows = self.meta['rows']
+        self.types = {c['name']: c['type'] for c in self.meta['columns']}
+        self._swap = self.meta.get('byteorder', sys.byteorder) != sys.byteorder
+
+    @property
+    def column_names(self):
+        return [c['name'] for c in self.meta['columns']]
+
+    def _load_array(self, fname, typecode):
+        arr = array(typecode)
+        path = os.path.join(self.table_dir, fname)
+        with open(path, 'rb') as f:
+            arr.frombytes(f.read())
+        if self._swap:
+            arr.byteswap()
+        return arr
+
+    def dictionary(self, name):
+        """(values, codes) of a dictionary-encoded column; count with codes, decode via values."""
+        if self.types.get(name) != DICT:
+            raise KeyError(f'{name} is not a dictionary-encoded column')
+        with open(os.path.join(self.table_dir, name + '.dict.json'), 'r', encoding='utf-8') as f:
+            values = json.load(f)
+        return values, self._load_array(name + '.codes', 'I')
+
+    def value_counts(self, name):
+        """{value: count} for a dictionary-encoded column without decoding any row."""
+        values, codes = self.dictionary(name)
+        counts = [0] * len(values)
+        for c in codes:
+            counts[c] += 1
+        return {values[i]: n for i, n in enumerate(counts) if n}
+
+    def column(self, name):
+        """Iterable over the decoded values of one column."""
+        typ = self.types.get(name)
+        if typ is None:
+            raise KeyError(name)
+        if typ == INT64:
+            return self._load_array(name + '.i64', 'q')
+        if typ == DICT:
+            values, codes = self.dictionary(name)
+            return (values[c] for c in codes)
+        return self._iter_strings(name)
+
+    def _iter_strings(self, name):
+        offsets = self._load_array(name + '.offsets', 'Q')
+        path = os.path.join(self.table_dir, name + '.utf8')
+        if not offsets or os.path.getsize(path) == 0:
+            for _ in offsets:
+                yield ''
+            return
+        with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            start = 0
+            for end in offsets:
+                yield mm[start:end].decode('utf-8')
+                start = end
+
+    def iter_rows(self, columns):
+        """Yield dicts holding only `columns` (missing columns come back as '')."""
+        present = [c for c in columns if c in self.types]
+        iters = [iter(self.column(c)) for c in present]
+        missing = {c: '' for c in columns if c not in self.types}
+        for values in (zip(*iters) if iters else ()):
+            row = dict(missing)
+            row.update(zip(present, values))
+            yield row
+
+
+def columnar_dir(output_dir):
+    return os.path.join(output_dir, 'columnar')
+
+
+def open_table(output_dir, table):
+    """ColumnarTable for `table` under `output_dir/columnar`, or None if it was not exported."""
+    tdir = os.path.join(columnar_dir(output_dir), table)
+    if not os.path.exists(os.path.join(tdir, '_schema.json')):
+        return None
+    return ColumnarTable(tdir)
+
+
+def _export_rows(out_dir, table, rows):
+    schema = SCHEMAS[table]
+    src = DERIVED_DOMAIN[table]
+    w = ColumnarTableWriter(os.path.join(out_dir, table), schema)
+    try:
+        for r in rows:
+            r = dict(r)
+            r['domain'] = domain_of(r.get(src) or '')
+            w.append(r)
+    finally:
+        w.close()
+    return w.rows
+
+
+def _iter_csv(path):
+    try:
+        for row in iter_manifest_rows(path):
+            yield row
+    except FileNotFoundError:
+        return
+
+
+def _iter_db(conn, table):
+    cols = [n for n, _ in SCHEMAS[table] if n != 'domain']
+    cur = conn.cursor()
+    cur.execute(f"SELECT {','.join(cols)} FROM {table} ORDER BY rowid")
+    while True:
+        batch = cur.fetchmany(CHUNK_ROWS)
+        if not batch:
+            break
+        for r in batch:
+            yield dict(zip(cols, r))
+
+
+def export_output(output_dir, tables=None):
+    """Export CSV manifests and (if present) CrawlDB tables; returns {table: rows}."""
+    out_dir = columnar_dir(output_dir)
+    tables = set(tables or SCHEMAS)
+    counts = {}
+    if 'urls' in tables:
+        counts['urls'] = _export_rows(out_dir, 'urls', _iter_csv(os.path.join(output_dir, 'urls', 'urls.csv')))
+    if 'image_manifest' in tables:
+        counts['image_manifest'] = _export_rows(out_dir, 'image_manifest',
+                                                _iter_csv(os.path.join(output_dir, 'images', 'manifest.csv')))
+    db_path = os.path.join(output_dir, DB_NAME)
+    db_tables = [t for t in ('pages', 'images', 'content_map') if t in tables]
+    if db_tables and os.path.exists(db_path):
+        conn = sqlite3.connect(db_path)
+        try:
+            for t in db_tables:
+                counts[t] = _export_rows(out_dir, t, _iter_db(conn, t))
+        finally:
+            conn.close()
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Export crawl manifests and CrawlDB tables to a columnar layout')
+    parser.add_argument('--output', default='data', help='Crawler output dir (contains urls/, images/, crawl_state.db)')
+    parser.add_argument('--tables', nargs='*', choices=sorted(SCHEMAS), help='Subset of tables to export')
+    args = parser.parse_args()
+    counts = export_output(args.output, args.tables)
+    for t, n in sorted(counts.items()):
+        print('Exported %s: %d rows' % (t, n))
+    print('Columnar data in', columnar_dir(args.output))
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -3,4 +3,33 @@ DEFAULT_PER_DOMAIN_DELAY = 1.0
 REQUEST_TIMEOUT = 20
 IMAGE_TIMEOUT = 30
 DB_NAME = "crawl_state.db"
-GRACEFUL_SHUTDOWN_WAIT = 10.0  # seconds to wait for graceful shutdown
\ No newline at end of file
+TEXT_LOG_NAME = "index.csv"  # append-only log of the texts saved in <output>/texts (file, chars, replaced_chars)
+GRACEFUL_SHUTDOWN_WAIT = 10.0  # seconds to wait for graceful shutdown
+DEFAULT_DOMAIN_BURST = 1  # requests a domain may send back-to-back before crawl_delay spacing applies
+DEFAULT_DOMAIN_MAX_IN_FLIGHT = 0  # concurrent requests per domain (0 = unlimited)
+BUDGET_PAGE_WEIGHT = 3.0  # share of the global req/s and bytes/s budget for page fetches ...
+BUDGET_IMAGE_WEIGHT = 1.0  # ... and for image downloads
+AUTOTHROTTLE_TARGET_LATENCY = 2.0  # p95 latency (seconds) the AIMD throttle keeps a domain under
+AUTOTHROTTLE_WINDOW = 20  # responses in the sliding window for error rate / p95
+AUTOTHROTTLE_MAX_CONCURRENCY = 8  # upper bound for concurrent requests per domain under AIMD
+MAX_RETRY_AFTER = 300.0  # cap (seconds) on a server's Retry-After
+ROBOTS_CACHE_TTL = 24 * 3600  # seconds a robots.txt stored in CrawlDB.domain_state is reused without refetching
+IMAGE_QUEUE_SIZE = 1000  # image jobs waiting in memory for the image workers
+IMAGE_QUEUE_POLICY = "block"  # when that queue is full: block (backpressure), drop or spill (to CrawlDB)
+IMAGE_SPILL_BATCH = 200  # image jobs per CrawlDB write when spilling
+ARCHIVE_SEGMENT_BYTES = 1024 * 1024 * 1024  # raw response archive: start a new .warc.gz segment past this size
+ARCHIVE_COMPRESS_LEVEL = 6  # gzip level of archived records
+ARCHIVE_INDEX_BATCH = 200  # archive_index rows per CrawlDB transaction
+SITEMAP_MAX_DEPTH = 3  # levels of nested sitemap indexes followed
+SITEMAP_BATCH = 1000  # sitemap URLs per CrawlDB transaction / frontier hand-off
+SITEMAP_MAX_URLS = 5_000_000  # URLs ingested from sitemaps per crawl
+SITEMAP_MAX_BYTES = 200 * 1024 * 1024  # uncompressed bytes read from one sitemap file (the spec allows 50MB)
+SITEMAP_TIMEOUT = 30  # seconds per sitemap request (connect / between reads)
+
+# URL canonicalization (see url_utils.UrlCanonicalizer)
+CANONICAL_RULES = ["lowercase_host", "normalize_percent", "strip_tracking", "sort_query", "strip_index",
+                   "strip_trailing_slash"]
+CANONICAL_TRACKING_PARAMS = ["utm_*", "gclid", "fbclid", "msclkid", "yclid", "mc_cid", "mc_eid", "_ga", "_gl",
+                             "sessionid", "sid", "phpsessid", "jsessionid", "aspsessionid", "ref_src"]
+CANONICAL_INDEX_PAGES = ["index.html", "index.htm", "index.php", "default.htm", "default.html", "default.aspx"]
+CANONICAL_SEEN_LIMIT = 1_000_000  # raw URLs remembered for the rewrite / avoided-fetch counters
@@ -0,0 +1,245 @@
+"""
+Read-only access to the stored page texts (<output>/texts/*.txt, *.txt.gz) for analytics.
+
+Counting builds no Python strings: a .txt file is memory-mapped (read as bytes below
+MMAP_MIN_BYTES) and scanned in WINDOW-sized slices, whose bytes, newlines and UTF-8
+characters are counted by C loops (bytes.count, isascii, translate); a .txt.gz is streamed
+through the same windows. TextDoc.text() decodes
+only when a caller asks for text. TextCorpus.map() / stats() hand chunks of files to a
+process pool, so a full-corpus scan is bound by I/O rather than by one interpreter.
+"""
+import gzip
+import mmap
+import os
+import struct
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+TEXT_SUFFIXES = (".txt", ".txt.gz")
+WINDOW = 1 << 20
+MMAP_MIN_BYTES = 1 << 16  # smaller texts are read, not mapped
+# UTF-8 continuation bytes: characters = bytes - continuation bytes
+_CONTINUATION = bytes(range(0x80, 0xC0))
+
+
+def iter_text_paths(texts_dir):
+    """Paths of the stored texts in texts_dir (scandir order)."""
+    try:
+        with os.scandir(texts_dir) as it:
+            for e in it:
+                if e.name.endswith(TEXT_SUFFIXES):
+                    yield e.path
+    except FileNotFoundError:
+        return
+
+
+def count_window(buf):
+    """(newlines, UTF-8 characters) in a bytes window."""
+    if buf.isascii():
+        return buf.count(b"\n"), len(buf)
+    return buf.count(b"\n"), len(buf.translate(None, _CONTINUATION))
+
+
+class TextDoc:
+    """One stored text; opened on first use, closed by close() / the with block."""
+
+    __slots__ = ("path", "_f", "_mm")
+
+    def __init__(self, path):
+        self.path = path
+        self._f = None
+        self._mm = None
+
+    @property
+    def name(self) -> str:
+        return os.path.basename(self.path)
+
+    @property
+    def compressed(self) -> bool:
+        return self.path.endswith(".gz")
+
+    def _mapping(self):
+        if self._mm is None:
+            self._f = open(self.path, "rb")
+            # mapping costs syscalls and page faults: small files are cheaper to read whole
+            # (as bytes, still undecoded); mmap cannot map an empty file anyway
+            if os.fstat(self._f.fileno()).st_size >= MMAP_MIN_BYTES:
+                self._mm = mmap.mmap(self._f.fileno(), 0, access=mmap.ACCESS_READ)
+            else:
+                self._mm = self._f.read()
+        return self._mm
+
+    def view(self) -> memoryview:
+        """Zero-copy view of a plain .txt file's bytes (valid until close())."""
+        if self.compressed:
+            raise ValueError(f"{self.name} is compressed; use windows() or text()")
+        return memoryview(self._mapping())
+
+    def byte_size(self) -> int:
+        """Size of the text in bytes, from metadata: file size, or the gzip ISIZE trailer (mod 2**32)."""
+        if self.compressed:
+            with open(self.path, "rb") as f:
+                f.seek(-4, os.SEEK_END)
+                return struct.unpack("<I", f.read(4))[0]
+        return os.stat(self.path).st_size
+
+    def windows(self, size=WINDOW):
+        """The text's bytes as consecutive bytes objects of at most `size`."""
+        if self.compressed:
+            with gzip.open(self.path, "rb") as f:
+                while True:
+                    buf = f.read(size)
+                    if not buf:
+                        return
+                    yield buf
+        mm = self._mapping()
+        for pos in range(0, len(mm), size):
+            yield mm[pos:pos + size]
+
+    def counts(self, window=WINDOW):
+        """(bytes, lines, characters) of the text; a last line without a newline counts."""
+        nbytes = lines = chars = 0
+        last = b"\n"
+        for buf in self.windows(window):
+            n, c = count_window(buf)
+            nbytes += len(buf)
+            lines += n
+            chars += c
+            last = buf[-1:]
+        return nbytes, lines + (last != b"\n"), chars
+
+    def text(self, errors="replace") -> str:
+        if self.compressed:
+            with gzip.open(self.path, "rb") as f:
+                return f.read().decode("utf-8", errors)
+        return str(self._mapping(), "utf-8", errors)
+
+    def close(self):
+        if isinstance(self._mm, mmap.mmap):
+            self._mm.close()
+        self._mm = None
+        if self._f is not None:
+            self._f.close()
+            self._f = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def text_chars(path) -> int:
+    """UTF-8 characters of one stored text."""
+    with TextDoc(path) as doc:
+        return doc.counts()[2]
+
+
+def _doc_counts(doc):
+    return doc.counts()
+
+
+def _map_chunk(fn, paths):
+    out = []
+    for p in paths:
+        with TextDoc(p) as doc:
+            try:
+                out.append(fn(doc))
+            except (OSError, EOFError):
+                # unreadable / truncated file
+                continue
+    return out
+
+
+def _stats_chunk(paths):
+    # partial (files, bytes, lines, chars, min_chars, max_chars)
+    files, nbytes, lines, chars, mn, mx = 0, 0, 0, 0, None, None
+    for b, n, c in _map_chunk(_doc_counts, paths):
+        files += 1
+        nbytes += b
+        lines += n
+        chars += c
+        mn = c if mn is None or c < mn else mn
+        mx = c if mx is None or c > mx else mx
+    return files, nbytes, lines, chars, mn, mx
+
+
+class TextCorpus:
+    """
+    The texts of one crawl output. Iterating yields TextDoc objects (each closed when the
+    next is taken); map() and stats() process files in chunks of `chunk_size`, on `workers`
+    processes (threads with processes=False), with at most 2*workers chunks in flight.
+    """
+
+    def __init__(self, texts_dir, chunk_size=256):
+        self.texts_dir = texts_dir
+        self.chunk_size = max(1, int(chunk_size))
+
+    def paths(self):
+        return iter_text_paths(self.texts_dir)
+
+    def __iter__(self):
+        for p in self.paths():
+            with TextDoc(p) as doc:
+                yield doc
+
+    def _chunks(self):
+        chunk = []
+        for p in self.paths():
+            chunk.append(p)
+            if len(chunk) >= self.chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    def map_chunks(self, job, workers=1, processes=True):
+        """
+        job(paths) for each chunk of paths; yields the results in chunk order. For reducers
+        that fold a chunk into a small partial result, so little is sent between processes.
+        """
+        if not workers or workers <= 1:
+            for chunk in self._chunks():
+                yield job(chunk)
+            return
+        if processes:
+            # loaded only for process pools; spawn is safe when the caller runs threads
+            import multiprocessing
+            from concurrent.futures import ProcessPoolExecutor
+            ex = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+        else:
+            ex = ThreadPoolExecutor(max_workers=workers)
+        with ex:
+            pending = deque()
+            for chunk in self._chunks():
+                pending.append(ex.submit(job, chunk))
+                if len(pending) >= workers * 2:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+
+    def map(self, fn, workers=1, processes=True):
+        """
+        Yield fn(doc) for every text, in path order. With processes, fn must be picklable
+        (a module-level function) and its results are sent back from the worker processes.
+        """
+        for results in self.map_chunks(partial(_map_chunk, fn), workers, processes):
+            yield from results
+
+    def stats(self, workers=1, processes=True) -> dict:
+        """Totals over the corpus: files, bytes, lines, chars and min / max / avg chars per text."""
+        out = {"files": 0, "bytes": 0, "lines": 0, "chars": 0, "min_chars": None, "max_chars": None}
+        for files, nbytes, lines, chars, mn, mx in self.map_chunks(_stats_chunk, workers, processes):
+            if not files:
+                continue
+            out["files"] += files
+            out["bytes"] += nbytes
+            out["lines"] += lines
+            out["chars"] += chars
+            if out["min_chars"] is None or mn < out["min_chars"]:
+                out["min_chars"] = mn
+            if out["max_chars"] is None or mx > out["max_chars"]:
+                out["max_chars"] = mx
+        out["avg_chars"] = out["chars"] / out["files"] if out["files"] else 0
+        return out
@@ -12,22 +12,37 @@ Outputs (placed inside the same `output_dir`):
 
 Usage:
     python scripts_generate_crawl_summary.py --output data
+    python scripts_generate_crawl_summary.py --output data --streaming --workers 8   # large crawls
 
 """
 import argparse
 import csv
+import gzip
+import hashlib
 import json
 import os
+import struct
 from collections import Counter, defaultdict
+from functools import partial
+
+from configs import TEXT_LOG_NAME
+from corpus import TextCorpus, text_chars
+from io_helpers import iter_manifest_rows, manifest_segments
+
+STATE_FILE = 'crawl_summary.state.json'
+STATE_VERSION = 4
+# bytes at the start of a manifest segment, and just before its stored offset, fingerprinted
+# to detect a rewritten file
+_HEAD_BYTES = 4096
+_TAIL_BYTES = 4096
 
 
 def read_urls_csv(path):
+    # reads every segment (rotated / gzip) of the manifest
     rows = []
     try:
-        with open(path, newline='', encoding='utf-8') as f:
-            r = csv.DictReader(f)
-            for row in r:
-                rows.append(row)
+        for row in iter_manifest_rows(path):
+            rows.append(row)
     except FileNotFoundError:
         return rows
     return rows
@@ -36,16 +51,61 @@ def read_urls_csv(path):
 def read_images_manifest(path):
     rows = []
     try:
-        with open(path, newline='', encoding='utf-8') as f:
-            r = csv.DictReader(f)
-            for row in r:
-                rows.append(row)
+        for row in iter_manifest_rows(path):
+            rows.append(row)
     except FileNotFoundError:
         return rows
     return rows
 
 
-def collect_text_stats(texts_dir):
+def iter_manifest(path):
+    # streaming counterpart of read_urls_csv / read_images_manifest: one row at a time
+    try:
+        for row in iter_manifest_rows(path):
+            yield row
+    except FileNotFoundError:
+        return
+
+
+def _text_length(path, use_size=False):
+    """
+    Length of one stored text. With `use_size` the length comes from metadata only: the file
+    size for .txt, the gzip ISIZE trailer (uncompressed size mod 2**32) for .txt.gz. Those are
+    byte counts, equal to the character count for ASCII text. Otherwise characters are
+    counted over the memory-mapped bytes (corpus.TextDoc), without decoding the text.
+    """
+    if use_size:
+        if path.endswith('.gz'):
+            with open(path, 'rb') as f:
+                f.seek(-4, os.SEEK_END)
+                return struct.unpack('<I', f.read(4))[0]
+        return os.stat(path).st_size
+    return text_chars(path)
+
+
+def _text_stats_chunk(paths, use_size=False):
+    count, total, mn, mx = 0, 0, None, None
+    for p in paths:
+        try:
+            ln = _text_length(p, use_size)
+        except Exception:
+            continue
+        count += 1
+        total += ln
+        if mn is None or ln < mn:
+            mn = ln
+        if mx is None or ln > mx:
+            mx = ln
+    return count, total, mn, mx
+
+
+def collect_text_stats(texts_dir, workers=1, use_size=False, chunk_size=1024, processes=False):
+    """
+    Text length statistics over texts_dir. Files are listed with scandir and processed in
+    chunks; with workers > 1 the chunks run on a thread pool, or a process pool with
+    `processes` (at most 2*workers chunks in flight, so memory stays bounded). See
+    _text_length for `use_size`.
+    """
     stats = {
         'page_text_count': 0,
         'total_text_chars': 0,
@@ -55,25 +115,22 @@ def collect_text_stats(texts_dir):
     }
     if not os.path.isdir(texts_dir):
         return stats
-    files = [os.path.join(texts_dir, p) for p in os.listdir(texts_dir) if p.endswith('.txt') or p.endswith('.txt.gz')]
-    for p in files:
-        try:
-            if p.endswith('.gz'):
-                import gzip
-                with gzip.open(p, 'rt', encoding='utf-8', errors='ignore') as f:
-                    t = f.read()
-            else:
-                with open(p, 'r', encoding='utf-8', errors='ignore') as f:
-                    t = f.read()
-            ln = len(t)
-            stats['page_text_count'] += 1
-            stats['total_text_chars'] += ln
-            if stats['min_text_len'] is None or ln < stats['min_text_len']:
-                stats['min_text_len'] = ln
-            if stats['max_text_len'] is None or ln > stats['max_text_len']:
-                stats['max_text_len'] = ln
-        except Exception:
-            continue
+
+    def merge(part):
+        count, total, mn, mx = part
+        if not count:
+            return
+        stats['page_text_count'] += count
+        stats['total_text_chars'] += total
+        if stats['min_text_len'] is None or mn < stats['min_text_len']:
+            stats['min_text_len'] = mn
+        if stats['max_text_len'] is None or mx > stats['max_text_len']:
+            stats['max_text_len'] = mx
+
+    corpus = TextCorpus(texts_dir, chunk_size=chunk_size)
+    for part in corpus.map_chunks(partial(_text_stats_chunk, use_size=use_size), workers, processes):
+        merge(part)
+
     if stats['page_text_count']:
         stats['avg_text_len'] = stats['total_text_chars'] / stats['page_text_count']
     else:
@@ -89,18 +146,316 @@ def make_domain_from_url(url):
         return ''
 
 
-def generate_summary(output_dir: str):
+def summarize_columnar(output_dir):
+    """
+    Counters from the columnar export (see columnar_export.py): only the status, topic,
+    domain and is_duplicate columns are read, and the dictionary-encoded ones are counted
+    on their codes. Returns None if the urls table has not been exported.
+    """
+    from columnar_export import open_table
+    urls = open_table(output_dir, 'urls')
+    if urls is None:
+        return None
+    images = open_table(output_dir, 'image_manifest')
+    topic_counter = Counter(urls.value_counts('topic'))
+    status_counter = Counter(urls.value_counts('status'))
+    domain_counter = Counter(urls.value_counts('domain'))
+    for c in (topic_counter, status_counter, domain_counter):
+        c.pop('', None)
+    dup_count = sum(1 for v in urls.column('is_duplicate') if v > 0)
+    return {
+        'pages_total': urls.num_rows,
+        'images_total': images.num_rows if images is not None else 0,
+        'topic_counter': topic_counter,
+        'status_counter': status_counter,
+        'domain_counter': domain_counter,
+        'dup_count': dup_count,
+    }
+
+
+# ---------- incremental mode ----------
+
+class _ManifestRewritten(Exception):
+    pass
+
+
+def _empty_state():
+    return {
+        'version': STATE_VERSION,
+        'counts': {'pages_total': 0, 'images_total': 0, 'dup_count': 0,
+                   'topic_counter': {}, 'status_counter': {}, 'domain_counter': {}},
+        # running aggregates of the text lengths; 'log' holds the marks of the text log
+        'text': {'count': 0, 'total': 0, 'min': None, 'max': None, 'seeded': False, 'log': {}},
+        'manifests': {'urls': {}, 'images': {}},
+    }
+
+
+def load_state(output_dir):
+    try:
+        with open(os.path.join(output_dir, STATE_FILE), 'r', encoding='utf-8') as f:
+            state = json.load(f)
+        if state.get('version') == STATE_VERSION:
+            return state
+    except (FileNotFoundError, ValueError):
+        pass
+    return _empty_state()
+
+
+def save_state(output_dir, state):
+    path = os.path.join(output_dir, STATE_FILE)
+    tmp = path + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(state, f, ensure_ascii=False)
+    os.replace(tmp, path)
+
+
+def _gzip_complete(path) -> bool:
+    # a segment the writer has closed ends with the gzip trailer; an open one does not (yet)
+    try:
+        with gzip.open(path, 'rb') as f:
+            while f.read(1 << 20):
+                pass
+    except (EOFError, OSError):
+        return False
+    return True
+
+
+def _iter_csv_lines(f, header, offset):
+    # (offset after the line, row) for each complete line; a partial last line is left out
+    while True:
+        line = f.readline()
+        if not line.endswith(b'\n'):
+            return
+        offset += len(line)
+        values = next(csv.reader([line.decode('utf-8', errors='replace')]), None)
+        if values:
+            yield offset, dict(zip(header, values))
+
+
+def _fingerprint(f, offset):
+    # sha1 of the first _HEAD_BYTES and of the _TAIL_BYTES before `offset`
+    f.seek(0)
+    head = hashlib.sha1(f.read(min(offset, _HEAD_BYTES))).hexdigest()
+    start = max(0, offset - _TAIL_BYTES)
+    f.seek(start)
+    tail = hashlib.sha1(f.read(offset - start)).hexdigest()
+    return head, tail
+
+
+def iter_new_manifest_rows(path, marks):
+    """
+    Yield dict rows appended to each segment of manifest `path` since the last run, and
+    advance `marks` ({segment name: mark}) once a segment is consumed.
+
+    A plain segment is read from its stored byte offset; a trailing partial row (no newline
+    yet) is left for the next run. A .gz segment is read once, when it is complete (closed
+    by the writer), and then marked done and skipped by size / mtime; one still being
+    written is left for a later run. Raises _ManifestRewritten if a plain segment is now
+    shorter than its offset or its first / last-read bytes differ from those seen last
+    time, or a finished .gz segment changed (e.g. a new crawl rewrote the manifest).
+    """
+    for seg in manifest_segments(path):
+        name = os.path.basename(seg)
+        mark = marks.get(name)
+        if seg.endswith('.gz'):
+            if mark is None and not _gzip_complete(seg):
+                continue
+            st = os.stat(seg)
+            if mark is not None:
+                if not mark.get('done') or (mark['size'], mark['mtime_ns']) != (st.st_size, st.st_mtime_ns):
+                    raise _ManifestRewritten(seg)
+                continue
+            with gzip.open(seg, 'rb') as f:
+                header_line = f.readline()
+                header = next(csv.reader([header_line.decode('utf-8')]))
+                for _, row in _iter_csv_lines(f, header, 0):
+                    yield row
+            marks[name] = {'done': True, 'size': st.st_size, 'mtime_ns': st.st_mtime_ns}
+            continue
+        with open(seg, 'rb') as f:
+            header_line = f.readline()
+            if not header_line.endswith(b'\n'):
+                continue
+            offset = len(header_line)
+            if mark:
+                if os.fstat(f.fileno()).st_size < mark['offset'] or _fingerprint(f, mark['offset']) != \
+                        (mark['head'], mark['tail']):
+                    raise _ManifestRewritten(seg)
+                offset = mark['offset']
+            f.seek(offset)
+            header = next(csv.reader([header_line.decode('utf-8')]))
+            for offset, row in _iter_csv_lines(f, header, offset):
+                yield row
+            head, tail = _fingerprint(f, offset)
+        marks[name] = {'offset': offset, 'head': head, 'tail': tail}
+
+
+def _rescan_texts(texts_dir, text):
+    stats = collect_text_stats(texts_dir)
+    text['count'] = stats['page_text_count']
+    text['total'] = stats['total_text_chars']
+    text['min'] = stats['min_text_len']
+    text['max'] = stats['max_text_len']
+
+
+def _update_text_state(texts_dir, text):
+    """
+    Fold the rows appended to the crawler's text log (texts/index.csv: file, chars,
+    replaced_chars) since the last run into the running count / total / min / max in `text`.
+    A row with replaced_chars is a refetched page that overwrote its text: the total is
+    corrected and the count kept. If the replaced length was the min or max, the true
+    bound is unknown and is rebuilt by a full scan of texts_dir (only then).
+
+    Without a log yet, the first run seeds the aggregates with a full scan (texts saved
+    before the crawler kept a log); texts saved before a log existed are not counted later.
+    """
+    log = os.path.join(texts_dir, TEXT_LOG_NAME)
+    if not text['seeded']:
+        if not manifest_segments(log):
+            _rescan_texts(texts_dir, text)
+        text['seeded'] = True
+    stale = False
+    for row in iter_new_manifest_rows(log, text['log']):
+        try:
+            chars = int(row['chars'])
+            replaced = int(row['replaced_chars']) if row.get('replaced_chars') else None
+        except (KeyError, TypeError, ValueError):
+            # a row cut short by an interrupted crawler
+            continue
+        if replaced is None:
+            text['count'] += 1
+            text['total'] += chars
+        else:
+            text['total'] += chars - replaced
+            stale = stale or (replaced == text['min'] and chars > replaced) or \
+                (replaced == text['max'] and chars < replaced)
+        if text['min'] is None or chars < text['min']:
+            text['min'] = chars
+        if text['max'] is None or chars > text['max']:
+            text['max'] = chars
+    if stale:
+        _rescan_texts(texts_dir, text)
+
+
+def _apply_increment(output_dir, state):
+    new = summarize_rows(iter_new_manifest_rows(os.path.join(output_dir, 'urls', 'urls.csv'),
+                                                state['manifests']['urls']),
+                         iter_new_manifest_rows(os.path.join(output_dir, 'images', 'manifest.csv'),
+                                                state['manifests']['images']))
+    c = state['counts']
+    for k in ('pages_total', 'images_total', 'dup_count'):
+        c[k] += new[k]
+    for k in ('topic_counter', 'status_counter', 'domain_counter'):
+        c[k] = dict(Counter(c[k]) + new[k])
+
+
+def incremental_counts(output_dir):
+    """
+    Bring the checkpoint in STATE_FILE up to date with records added since the last run and
+    return (counts, text_stats, state). Counters are rebuilt if a manifest was rewritten (a new
+    crawl), text aggregates only if the text log was; the log outlives crawls.
+    """
+    state = load_state(output_dir)
+    try:
+        _apply_increment(output_dir, state)
+    except _ManifestRewritten:
+        fresh = _empty_state()
+        state['counts'], state['manifests'] = fresh['counts'], fresh['manifests']
+        _apply_increment(output_dir, state)
+    texts_dir = os.path.join(output_dir, 'texts')
+    try:
+        _update_text_state(texts_dir, state['text'])
+    except _ManifestRewritten:
+        state['text'] = _empty_state()['text']
+        _update_text_state(texts_dir, state['text'])
+    c = state['counts']
+    counts = dict(c)
+    for k in ('topic_counter', 'status_counter', 'domain_counter'):
+        counts[k] = Counter(c[k])
+    t = state['text']
+    text_stats = {
+        'page_text_count': t['count'],
+        'total_text_chars': t['total'],
+        'avg_text_len': (t['total'] / t['count']) if t['count'] else 0,
+        'min_text_len': t['min'],
+        'max_text_len': t['max'],
+    }
+    return counts, text_stats, state
+
+
+def generate_summary(output_dir: str, source: str = 'csv', streaming: bool = False, workers: int = 1,
+                     incremental: bool = False, processes: bool = False):
+    """
+    Write crawl_summary.json and domain_report.csv for output_dir.
+
+    streaming=True folds manifest rows into the counters one at a time instead of loading
+    them into lists, and takes text lengths from file metadata (byte counts, see
+    _text_length) instead of reading every file. `workers` parallelizes the text stats
+    (threads, or processes with `processes`).
+
+    incremental=True keeps the aggregated counters, running text-length aggregates and
+    high-water marks (byte offsets into the manifests and the crawler's text log) in
+    crawl_summary.state.json and only folds in records added since the previous run; text
+    lengths come from the log, in characters as in the default mode (see
+    _update_text_state). It reads the CSV manifests and cannot be combined with
+    source='columnar' or streaming (ValueError).
+    """
+    if incremental and (source != 'csv' or streaming):
+        raise ValueError('incremental mode reads the CSV manifests; it cannot be combined with '
+                         'source=columnar or streaming')
     urls_csv = os.path.join(output_dir, 'urls', 'urls.csv')
     images_csv = os.path.join(output_dir, 'images', 'manifest.csv')
     texts_dir = os.path.join(output_dir, 'texts')
 
-    urls = read_urls_csv(urls_csv)
-    images = read_images_manifest(images_csv)
-    text_stats = collect_text_stats(texts_dir)
+    state = None
+    if incremental:
+        counts, text_stats, state = incremental_counts(output_dir)
+    else:
+        text_stats = collect_text_stats(texts_dir, workers=workers, use_size=streaming, processes=processes)
+        counts = summarize_columnar(output_dir) if source == 'columnar' else None
+    if counts is None:
+        if streaming:
+            counts = summarize_rows(iter_manifest(urls_csv), iter_manifest(images_csv))
+        else:
+            counts = summarize_rows(read_urls_csv(urls_csv), read_images_manifest(images_csv))
+    domain_counter = counts['domain_counter']
 
     summary = {}
-    summary['pages_total'] = len(urls)
+    summary['pages_total'] = counts['pages_total']
+    summary['duplicates_skipped'] = counts['dup_count']
+    summary['status_counts'] = dict(counts['status_counter'])
+    summary['topics'] = dict(counts['topic_counter'])
+    # summary['languages'] = dict(lang_counter)
+    summary.update(text_stats)
+    summary['images_total'] = counts['images_total']
+    # top domains
+    top_domains = domain_counter.most_common(20)
+    summary['top_domains'] = top_domains
+
+    # write outputs
+    json_out = os.path.join(output_dir, 'crawl_summary.json')
+    with open(json_out, 'w', encoding='utf-8') as f:
+        json.dump(summary, f, ensure_ascii=False, indent=2)
+
+    # domain CSV
+    domain_csv = os.path.join(output_dir, 'domain_report.csv')
+    with open(domain_csv, 'w', newline='', encoding='utf-8') as f:
+        w = csv.writer(f)
+        w.writerow(['domain', 'count'])
+        for dom, cnt in domain_counter.most_common():
+            w.writerow([dom, cnt])
 
+    # checkpoint only after the outputs it describes are written
+    if state is not None:
+        save_state(output_dir, state)
+
+    return summary
+
+
+def summarize_rows(urls, images):
+    # urls / images may be lists or row iterators; each row is folded in and dropped
+    pages_total = 0
+    images_total = 0
     # topics and languages if available as columns
     topic_counter = Counter()
     # lang_counter = Counter()
@@ -109,6 +464,7 @@ def generate_summary(output_dir: str):
     domain_counter = Counter()
 
     for r in urls:
+        pages_total += 1
         # handle possible header variations robustly
         topic = r.get('topic') or r.get('label') or r.get('category') or ''
         # lang = r.get('language') or r.get('lang') or ''
@@ -137,37 +493,37 @@ def generate_summary(output_dir: str):
             if domain:
                 domain_counter[domain] += 1
 
-    summary['duplicates_skipped'] = dup_count
-    summary['status_counts'] = dict(status_counter)
-    summary['topics'] = dict(topic_counter)
-    # summary['languages'] = dict(lang_counter)
-    summary.update(text_stats)
-    summary['images_total'] = len(images)
-    # top domains
-    top_domains = domain_counter.most_common(20)
-    summary['top_domains'] = top_domains
-
-    # write outputs
-    json_out = os.path.join(output_dir, 'crawl_summary.json')
-    with open(json_out, 'w', encoding='utf-8') as f:
-        json.dump(summary, f, ensure_ascii=False, indent=2)
-
-    # domain CSV
-    domain_csv = os.path.join(output_dir, 'domain_report.csv')
-    with open(domain_csv, 'w', newline='', encoding='utf-8') as f:
-        w = csv.writer(f)
-        w.writerow(['domain', 'count'])
-        for dom, cnt in domain_counter.most_common():
-            w.writerow([dom, cnt])
+    for _ in images:
+        images_total += 1
 
-    return summary
+    return {
+        'pages_total': pages_total,
+        'images_total': images_total,
+        'topic_counter': topic_counter,
+        'status_counter': status_counter,
+        'domain_counter': domain_counter,
+        'dup_count': dup_count,
+    }
 
 
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument('--output', default='data', help='Output directory that contains urls/, texts/, images/')
+    parser.add_argument('--source', choices=['csv', 'columnar'], default='csv',
+                        help='Read CSV manifests or the columnar export (columnar_export.py); falls back to csv')
+    parser.add_argument('--streaming', action='store_true',
+                        help='Constant-memory mode: fold rows one at a time, text lengths from file sizes')
+    parser.add_argument('--workers', type=int, default=1, help='Threads for per-file text stats')
+    parser.add_argument('--processes', action='store_true',
+                        help='Run the --workers text stats in a process pool (full-corpus scans of large crawls)')
+    parser.add_argument('--incremental', action='store_true',
+                        help='Only process records added since the last run (state in %s); '
+                             'CSV manifests only, not with --source columnar or --streaming' % STATE_FILE)
     args = parser.parse_args()
-    summary = generate_summary(args.output)
+    if args.incremental and (args.source != 'csv' or args.streaming):
+        parser.error('--incremental cannot be combined with --source columnar or --streaming')
+    summary = generate_summary(args.output, source=args.source, streaming=args.streaming, workers=args.workers,
+                               incremental=args.incremental, processes=args.processes)
     print('Summary written. pages_total=%d, images=%d' % (summary['pages_total'], summary['images_total']))
 
 
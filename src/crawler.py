@@ -1,24 +1,32 @@
 import os
 import time
 import hashlib
+import json
 import logging
-from logging.handlers import RotatingFileHandler
-from collections import deque
 from urllib.parse import urlparse
-from threading import Event
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from threading import Event, Lock, Thread, current_thread
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
+import queue
 import signal
-import requests
 
-from configs import DB_NAME, GRACEFUL_SHUTDOWN_WAIT, USER_AGENT
-from db import CrawlDB
+from archive import ARCHIVE_DIR, ArchiveReader, ResponseArchive
+from configs import DB_NAME, GRACEFUL_SHUTDOWN_WAIT, IMAGE_QUEUE_POLICY, IMAGE_QUEUE_SIZE, TEXT_LOG_NAME, USER_AGENT
+from corpus import text_chars
 from download_utils import download_image, fetch_page
-from html_parsing import parse_html_for_links_and_text, parse_sitemap_xml
+from frontier import LocalFrontier
+from html_parsing import parse_html_page
+from image_queue import ImageQueue
 from io_helpers import make_csv_writer, save_binary, save_text
 from limiter import DomainLimiter
+from metrics import DB_WRITE_METHODS, CrawlMetrics, MetricsServer, SnapshotWriter, instrument_methods
+from profiling import PageProfiler, write_stage_report
+from sitemaps import SitemapLoader
 from topic_detect import classify_topic
-from url_utils import domain_of
-from utils import safe_filename, ensure_dirs, compute_content_hash
+from url_utils import UrlCanonicalizer, domain_of
+from utils import safe_filename, ensure_dirs, compute_content_hash, lazy_import
+
+# the HTTP stack (~80ms to import) loads when the first crawl creates its session
+requests = lazy_import("requests")
 
 
 # Global shutdown event set by signal handler
@@ -30,108 +38,501 @@ def _signal_handler(signum, frame):
     shutdown_event.set()
 
 
-# Register signal handlers for graceful shutdown
-signal.signal(signal.SIGINT, _signal_handler)
-signal.signal(signal.SIGTERM, _signal_handler)
+def install_signal_handlers():
+    """
+    Make SIGINT/SIGTERM request a graceful shutdown (shutdown_event) instead of killing the
+    process. Called by the CLI and by shard worker processes; importing this module has no
+    such side effect. Must run in the main thread.
+    """
+    signal.signal(signal.SIGINT, _signal_handler)
+    signal.signal(signal.SIGTERM, _signal_handler)
 
 
-def threaded_crawl_enhanced(start_url, output_base, max_pages=200, max_depth=2, allow_external=False,
-                            max_workers=10, image_workers=4, resume=False, logfile=None, verbose=False):
-    # logging setup
+# handlers setup_logging() added to the root logger: "console" and ("file", path)
+_log_handlers = {}
+_log_lock = Lock()
+_LOG_FORMAT = "%(asctime)s [%(levelname)s] %(message)s"
+
+
+def setup_logging(verbose=False, logfile=None):
+    """
+    Console (+ optional rotating file) logging on the root logger. Idempotent: repeated calls,
+    e.g. several crawls in one process, adjust the levels and swap the logfile instead of
+    stacking duplicate handlers. Handlers installed by others are left alone.
+    """
+    level = logging.DEBUG if verbose else logging.INFO
     root_logger = logging.getLogger()
-    root_logger.setLevel(logging.DEBUG if verbose else logging.INFO)
-    formatter = logging.Formatter("%(asctime)s [%(levelname)s] %(message)s")
-    # console handler
-    ch = logging.StreamHandler()
-    ch.setFormatter(formatter)
-    ch.setLevel(logging.DEBUG if verbose else logging.INFO)
-    root_logger.addHandler(ch)
-    # file handler
-    if logfile:
-        fh = RotatingFileHandler(logfile, maxBytes=5_000_000, backupCount=3, encoding="utf-8")
-        fh.setFormatter(formatter)
-        fh.setLevel(logging.DEBUG)
-        root_logger.addHandler(fh)
-
-    dirs = ensure_dirs(output_base)
-    urls_csv = os.path.join(dirs["urls"], "urls.csv")
-    images_csv = os.path.join(dirs["images"], "manifest.csv")
-    write_url_row, close_urls = make_csv_writer(urls_csv, ['url', 'status', 'depth', 'parent', 'topic'])
-    write_image_row, close_images = make_csv_writer(images_csv, ["image_file", "image_url", "page_url", "size_bytes"])    
-
-    session = requests.Session()
-    session.headers.update({"User-Agent": USER_AGENT})
-
-    domain_cache = {}
-    def get_domain_limiter_for(u):
-        d = domain_of(u)
-        if d not in domain_cache:
-            domain_cache[d] = DomainLimiter(d)
-        return domain_cache[d]
-
-    # SQLite DB for resume
-    db_path = os.path.join(output_base, DB_NAME)
-    db = None
-    if resume:
+    with _log_lock:
+        root_logger.setLevel(level)
+        ch = _log_handlers.get("console")
+        if ch is None:
+            ch = _log_handlers["console"] = logging.StreamHandler()
+            ch.setFormatter(logging.Formatter(_LOG_FORMAT))
+            root_logger.addHandler(ch)
+        ch.setLevel(level)
+        path = os.path.abspath(logfile) if logfile else None
+        for key in [k for k in _log_handlers if k != "console" and k[1] != path]:
+            fh = _log_handlers.pop(key)
+            root_logger.removeHandler(fh)
+            fh.close()
+        if path and ("file", path) not in _log_handlers:
+            from logging.handlers import RotatingFileHandler
+            fh = _log_handlers["file", path] = RotatingFileHandler(path, maxBytes=5_000_000, backupCount=3,
+                                                                   encoding="utf-8")
+            fh.setFormatter(logging.Formatter(_LOG_FORMAT))
+            fh.setLevel(logging.DEBUG)
+            root_logger.addHandler(fh)
+
+
+# per-crawl settings: Crawler(...) sets the defaults, run()/start() may override them for one crawl
+CRAWL_OPTIONS = {
+    "max_pages": 200,
+    "max_depth": 2,
+    "allow_external": False,
+    "max_workers": 10,
+    "image_workers": 4,
+    "image_queue_size": IMAGE_QUEUE_SIZE,
+    "image_queue_policy": IMAGE_QUEUE_POLICY,
+    "resume": False,
+    "manifest_rotate_rows": 0,
+    "manifest_compress": False,
+    "metrics_interval": 0,
+    "profile_pages": 0,
+    "profile_mode": "cprofile",
+    "archive": False,
+}
+
+
+class _CrawlRun:
+    """State of one crawl. Jobs get it passed in, so a late job never touches the next crawl."""
+
+    def __init__(self, start_url, output_base, opts, link_router):
+        self.start_url = start_url
+        self.output_base = output_base
+        self.opts = opts
+        self.link_router = link_router
+        self.dirs = None
+        self.write_url_row = self.close_urls = None
+        self.write_image_row = self.close_images = None
+        self.write_text_row = self.close_texts = None
+        self.db = None
+        self.frontier = None
+        self.visited = set()
+        # URLs whose content was already obtained through a page declaring them as rel=canonical
+        self.canonical_covered = set()
+        self.domains = set()
+        self.page_executor = None
+        self.images = None
+        self.archive = None
+        self.archive_db = None  # CrawlDB opened only for the archive index (crawl without resume)
+        self.futures_to_item = {}
+        # URLs of submitted pages; a URL queued twice must not be fetched twice while the first is in flight
+        self.inflight_urls = set()
+        self.sitemap_queue = queue.Queue()
+        self.sitemap_loader = None
+        self.profiler = None
+        self.snapshots = None
+        self.started = time.time()
+        self.finished = None
+
+
+class Crawler:
+    """
+    Embeddable, reusable crawler; threaded_crawl_enhanced() is a one-shot wrapper around it.
+
+    run(start_url, output_base, **options) crawls in the calling thread; start(...) does the
+    same in a background thread, controlled with pause() / resume() / stop() / wait().
+    stats() may be called at any time. An instance runs one crawl at a time; any number of
+    instances can run side by side in one process. Between crawls it keeps its HTTP session
+    (connection pool), per-domain limiters (learned delays, robots.txt), canonicalizer, metrics
+    registry and metrics endpoint; close() releases them.
+
+    Options (CRAWL_OPTIONS) given to the constructor are defaults for every crawl; run() and
+    start() accept the same keywords for one crawl, plus link_router and frontier_backend.
+
+    Pluggable components (default):
+      session            requests-compatible session (requests.Session())
+      limiter_factory    (domain, saved_state) -> DomainLimiter-like
+                         (DomainLimiter with domain_burst / domain_max_in_flight / throttle_factory)
+      frontier_factory   (db) -> frontier backend, see frontier.py (LocalFrontier)
+      page_parser        (html, url) -> (text, links, images, canonical) (parse_html_page)
+      classifier         text -> topic (classify_topic)
+
+    A crawl stops at max_pages, when its frontier is exhausted, on stop(), or when the
+    process-wide shutdown_event is set (SIGINT/SIGTERM after install_signal_handlers()); it
+    then saves its frontier, limiter state and reports as the CLI always has.
+    """
+
+    def __init__(self, logfile=None, verbose=False, canonicalize=True, canonicalizer=None, domain_burst=None,
+                 domain_max_in_flight=None, budget=None, throttle_factory=None, metrics=None, metrics_port=None,
+                 stage_timing=False, session=None, limiter_factory=None, frontier_factory=None, page_parser=None,
+                 classifier=None, **options):
+        unknown = set(options) - set(CRAWL_OPTIONS)
+        if unknown:
+            raise TypeError("Unknown crawl option(s): %s" % ", ".join(sorted(unknown)))
+        self.options = {**CRAWL_OPTIONS, **options}
+        self.logfile = logfile
+        self.verbose = verbose
+        setup_logging(verbose, logfile)
+
+        self._own_session = session is None
+        if session is None:
+            session = requests.Session()
+            session.headers.update({"User-Agent": USER_AGENT})
+        self.session = session
+
+        # URL canonicalization applied before anything is enqueued
+        if canonicalize and canonicalizer is None:
+            canonicalizer = UrlCanonicalizer()
+        self.canonicalizer = canonicalizer if canonicalize else None
+
+        self.budget = budget
+        self.domain_burst = domain_burst
+        self.domain_max_in_flight = domain_max_in_flight
+        self.throttle_factory = throttle_factory
+        self.limiter_factory = limiter_factory or self._default_limiter
+        self.frontier_factory = frontier_factory or LocalFrontier
+        self.page_parser = page_parser or parse_html_page
+        self.classifier = classifier or classify_topic
+
+        # live metrics: always collected, exported on demand (HTTP endpoint) and as metrics.json snapshots
+        if metrics is None:
+            metrics = CrawlMetrics(stage_timing=stage_timing)
+        elif stage_timing:
+            metrics.enable_stage_timing()
+        self.metrics = metrics
+        self.metrics_port = metrics_port
+        self.metrics_server = None
+
+        self.limiters = {}
+        # guards limiter creation and the idle -> running transition
+        self._lock = Lock()
+        self._stop = Event()
+        self._unpaused = Event()
+        self._unpaused.set()
+        self._thread = None
+        self._run = None
+        self.state = "idle"
+        self.crawls = 0
+        self._register_gauges()
+
+    # ---- lifecycle ----
+
+    def run(self, start_url, output_base, link_router=None, frontier_backend=None, **options) -> dict:
+        """
+        Crawl start_url into output_base and return stats() when done.
+
+        link_router: set by sharding.sharded_crawl when this process is one shard of a crawl.
+        Pages and images on domains owned by other shards are handed to it instead of being
+        fetched here, and URLs routed to this shard arrive through it.
+
+        frontier_backend: where URLs wait to be fetched (see frontier.py). Default:
+        frontier_factory(db), a LocalFrontier (in-memory deque saved to CrawlDB for resume);
+        a RemoteFrontier lets several crawler processes, on any number of machines, share one crawl.
+        """
+        run = self._begin(start_url, output_base, link_router, options)
+        return self._crawl(run, frontier_backend)
+
+    def start(self, start_url, output_base, link_router=None, frontier_backend=None, **options):
+        """run() in a background thread; returns self."""
+        run = self._begin(start_url, output_base, link_router, options)
+        self._thread = Thread(target=self._crawl, args=(run, frontier_backend), name="crawler", daemon=True)
+        self._thread.start()
+        return self
+
+    def _begin(self, start_url, output_base, link_router, options):
+        unknown = set(options) - set(CRAWL_OPTIONS)
+        if unknown:
+            raise TypeError("Unknown crawl option(s): %s" % ", ".join(sorted(unknown)))
+        with self._lock:
+            if self.state != "idle":
+                raise RuntimeError("Crawler is already running a crawl")
+            self.state = "running"
+        self._stop.clear()
+        self._unpaused.set()
+        self.crawls += 1
+        setup_logging(self.verbose, self.logfile)
+        run = self._run = _CrawlRun(start_url, output_base, {**self.options, **options}, link_router)
+        return run
+
+    def _crawl(self, run, frontier_backend, replay_source=None):
         try:
-            db = CrawlDB(db_path)
-            logging.info("Using DB for resume: %s", db_path)
+            if replay_source is None:
+                self._open(run, frontier_backend)
+                self._loop(run)
+            else:
+                self._replay_loop(run, self._open_replay(run, replay_source))
+        except KeyboardInterrupt:
+            logging.info("Interrupted by user, initiating graceful shutdown...")
+            self._stop.set()
         except Exception:
-            logging.exception("Failed to open DB for resume; proceeding without resume")
-            db = None
-
-    # frontier
-    frontier = deque()
-
-    # if resume and DB has frontier, load it
-    if db:
-        rows = db.pop_frontier_batch(limit=1000)
-        if rows:
-            for u, depth, parent in rows:
-                frontier.append((u, depth, parent))
-            logging.info("Resumed frontier from DB: %d items", len(rows))
-        else:
-            db.add_page(start_url, status=None, depth=0, parent=None, visited=0)
-            db.add_frontier(start_url, 0, None)
-            frontier.append((start_url, 0, None))
-    else:
-        frontier.append((start_url, 0, None))
-
-    # try sitemap to seed more URLs (only when not resuming or frontier small)
-    try:
-        parsed = urlparse(start_url)
-        sitemap_url = f"{parsed.scheme}://{parsed.netloc}/sitemap.xml"
-        r = session.get(sitemap_url, headers={"User-Agent": USER_AGENT}, timeout=5)
-        if r.status_code == 200 and r.text:
-            sitemap_urls = parse_sitemap_xml(r.text)
-            for u in sitemap_urls:
-                frontier.append((u, 0, "sitemap"))
-                if db:
-                    db.add_page(u, status=None, depth=0, parent='sitemap', visited=0)
-                    db.add_frontier(u, 0, 'sitemap')
-            logging.info("Seeded %d URLs from sitemap", len(sitemap_urls))
-    except Exception:
-        logging.debug("Sitemap unavailable or failed")
-
-    visited = set()
+            logging.exception("Top-level crawler exception")
+        finally:
+            self.state = "stopping"
+            self._finish(run, frontier_backend is not None)
+            run.finished = time.time()
+            self.state = "idle"
+        return self.stats()
+
+    def replay(self, source, output_base, **options) -> dict:
+        """
+        Run the page pipeline (parse, dedup, link graph, topic) over the responses archived by
+        an earlier crawl with archive=True into `source`, writing a new output to output_base;
+        returns stats(). Nothing is fetched: images are not downloaded and links are not
+        followed, so every archived page is processed (max_pages / max_depth do not apply) at
+        CPU speed on max_workers threads. Records are read through memory-mapped segments in
+        the order CrawlDB.archive_index lists them (by scanning the segments without a DB).
+        """
+        if os.path.abspath(source) == os.path.abspath(output_base):
+            raise ValueError("Replay into a different output directory than the archived crawl")
+        run = self._begin(source, output_base, None, options)
+        return self._crawl(run, None, replay_source=source)
+
+    def wait(self, timeout=None) -> bool:
+        """Wait for a start()ed crawl to finish; True when it has."""
+        if self._thread is not None and self._thread is not current_thread():
+            self._thread.join(timeout)
+        return self.state == "idle"
+
+    def pause(self):
+        """Stop submitting pages; fetches in flight complete, the frontier is kept."""
+        if self.state == "running":
+            self._unpaused.clear()
+            self.state = "paused"
+
+    def resume(self):
+        if self.state == "paused":
+            self.state = "running"
+            self._unpaused.set()
+
+    def stop(self, wait=True, timeout=None) -> bool:
+        """Stop the current crawl gracefully (frontier saved); with wait, block until finished."""
+        self._stop.set()
+        self._unpaused.set()
+        if self.state in ("running", "paused"):
+            self.state = "stopping"
+        return self.wait(timeout) if wait else False
+
+    def stopping(self) -> bool:
+        return self._stop.is_set() or shutdown_event.is_set()
+
+    def close(self):
+        """Stop any crawl and release the warm components (session, metrics endpoint)."""
+        self.stop(timeout=GRACEFUL_SHUTDOWN_WAIT + 10)
+        if self.metrics_server is not None:
+            self.metrics_server.close()
+            self.metrics_server = None
+        if self._own_session:
+            try:
+                self.session.close()
+            except Exception:
+                pass
+        self.limiters.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def stats(self) -> dict:
+        run = self._run
+        out = {"state": self.state, "crawls": self.crawls, "domains_cached": len(self.limiters)}
+        if run is not None:
+            out.update({
+                "start_url": run.start_url,
+                "output": run.output_base,
+                "pages": len(run.visited),
+                "frontier": len(run.frontier) if run.frontier is not None else 0,
+                "in_flight": len(run.futures_to_item),
+                "domains": len(run.domains),
+                "elapsed_s": round((run.finished or time.time()) - run.started, 3),
+            })
+        return out
+
+    # ---- components ----
+
+    def _default_limiter(self, domain, state):
+        return DomainLimiter(domain, burst=self.domain_burst, max_in_flight=self.domain_max_in_flight,
+                             throttle=self.throttle_factory() if self.throttle_factory else None, state=state,
+                             should_stop=self.stopping)
+
+    def limiter_for(self, run, u):
+        d = domain_of(u)
+        run.domains.add(d)
+        dl = self.limiters.get(d)
+        if dl is not None:
+            return dl
+        with self._lock:
+            if d not in self.limiters:
+                # warm start from the previous run's learned delay, latency stats and robots.txt
+                state = None
+                if run.db:
+                    try:
+                        state = run.db.load_domain_state(d)
+                    except Exception:
+                        logging.exception("Failed to load domain state: %s", d)
+                self.limiters[d] = self.limiter_factory(d, state)
+                if state:
+                    logging.info("Warm-started limiter for %s (crawl_delay=%.2fs)", d, self.limiters[d].crawl_delay)
+            return self.limiters[d]
+
+    def canonical(self, u):
+        if self.canonicalizer is None:
+            return u
+        c = self.canonicalizer.canonicalize(u)
+        self.canonicalizer.observe(u, c)
+        return c
+
+    def _register_gauges(self):
+        reg = self.metrics.registry
+        reg.gauge_callback("crawler_frontier_size", "URLs waiting in the in-memory frontier",
+                           lambda: len(self._run.frontier) if self._run and self._run.frontier is not None else 0)
+        reg.gauge_callback("crawler_inflight_pages", "Page futures submitted and not yet collected",
+                           lambda: len(self._run.futures_to_item) if self._run else 0)
+        reg.gauge_callback("crawler_image_queue_depth", "Image jobs queued in memory behind the image workers",
+                           lambda: self._run.images.qsize() if self._run and self._run.images else 0)
+        reg.gauge_callback("crawler_image_queue_backlog", "Image jobs spilled to / saved in CrawlDB",
+                           lambda: self._run.images.backlog() if self._run and self._run.images else 0)
+        reg.gauge_callback("crawler_domain_delay_seconds", "Current crawl_delay per domain",
+                           lambda: {d: dl.crawl_delay for d, dl in list(self.limiters.items())}, ("domain",))
+        reg.gauge_callback("crawler_domain_in_flight", "Requests in flight per domain",
+                           lambda: {d: dl.in_flight for d, dl in list(self.limiters.items())}, ("domain",))
+
+    # ---- one crawl ----
+
+    def _open_output(self, run, db=False):
+        # manifests, CrawlDB (with resume, or db=True), profiler and metrics of one crawl or replay
+        opts = run.opts
+        run.dirs = ensure_dirs(run.output_base)
+        # canonical_stats.json is per crawl, and the Crawler's canonicalizer outlives it
+        if self.canonicalizer is not None:
+            self.canonicalizer.reset()
+        urls_csv = os.path.join(run.dirs["urls"], "urls.csv")
+        images_csv = os.path.join(run.dirs["images"], "manifest.csv")
+        # buffered, lock-protected manifests shared by all page and image threads
+        run.write_url_row, run.close_urls = make_csv_writer(
+            urls_csv, ['url', 'status', 'depth', 'parent', 'topic'],
+            rotate_rows=opts["manifest_rotate_rows"], compress=opts["manifest_compress"])
+        run.write_image_row, run.close_images = make_csv_writer(
+            images_csv, ["image_file", "image_url", "page_url", "size_bytes"],
+            rotate_rows=opts["manifest_rotate_rows"], compress=opts["manifest_compress"])
+        # kept across crawls, like the texts it describes; crawl_summary --incremental reads it
+        run.write_text_row, run.close_texts = make_csv_writer(
+            os.path.join(run.dirs["texts"], TEXT_LOG_NAME), ["file", "chars", "replaced_chars"], append=True)
+
+        # SQLite DB for resume
+        if opts["resume"] or db:
+            db_path = os.path.join(run.output_base, DB_NAME)
+            try:
+                from db import CrawlDB
+                run.db = CrawlDB(db_path)
+                logging.info("Using DB for resume: %s", db_path)
+            except Exception:
+                logging.exception("Failed to open DB for resume; proceeding without resume")
+                run.db = None
 
-    # image executor (background)
-    image_executor = ThreadPoolExecutor(max_workers=image_workers)
+        # optional cProfile / stack sampling of the first profile_pages pages
+        if opts["profile_pages"]:
+            run.profiler = PageProfiler(opts["profile_pages"], mode=opts["profile_mode"])
+        if run.db:
+            instrument_methods(run.db, DB_WRITE_METHODS, self.metrics.db_write_seconds)
 
-    def submit_image_download(img_url, page_url):
-        # returns future
-        if shutdown_event.is_set():
+        if self.metrics_port is not None and self.metrics_server is None:
+            try:
+                self.metrics_server = MetricsServer(self.metrics.registry, port=self.metrics_port)
+                logging.info("Serving metrics on http://127.0.0.1:%d/metrics", self.metrics_server.port)
+            except Exception:
+                logging.exception("Failed to start metrics endpoint on port %s", self.metrics_port)
+        run.snapshots = SnapshotWriter(self.metrics.registry, os.path.join(run.output_base, "metrics.json"),
+                                       interval=opts["metrics_interval"])
+
+    def _open(self, run, frontier_backend):
+        opts = run.opts
+        self._open_output(run)
+        run.start_url = self.canonical(run.start_url)
+
+        # frontier
+        frontier = run.frontier = frontier_backend if frontier_backend is not None else self.frontier_factory(run.db)
+        run.visited = frontier.visited
+        link_router = run.link_router
+        # in a sharded crawl only the shard owning the start URL seeds it (and its sitemap)
+        seed = link_router is None or link_router.owns(run.start_url)
+
+        # if resume and DB has frontier, load it
+        restored = frontier.restore(limit=1000)
+        if restored:
+            logging.info("Resumed frontier from DB: %d items", restored)
+        elif seed:
+            if run.db:
+                run.db.add_page(run.start_url, status=None, depth=0, parent=None, visited=0)
+                run.db.add_frontier(run.start_url, 0, None)
+            frontier.push(run.start_url, 0, None)
+
+        # sitemaps (robots.txt Sitemap: lines, /sitemap.xml, nested indexes) stream in from a background
+        # thread; the first max_pages URLs reach this frontier, the rest wait in the DB for --resume.
+        # Shards keep no sitemap backlog: part of it belongs to other shards' domains.
+        if seed:
+            canonicalize = self.canonicalizer.canonicalize if self.canonicalizer is not None else None
+            run.sitemap_loader = SitemapLoader(self.session, lambda u: self.limiter_for(run, u), run.sitemap_queue,
+                                               db=run.db if link_router is None else None, canonicalize=canonicalize,
+                                               forward_limit=opts["max_pages"], stop_event=self._stop,
+                                               budget=self.budget, metrics=self.metrics).start(run.start_url)
+
+        # bounded image pipeline; with a DB, jobs left by the previous run are downloaded first
+        run.images = ImageQueue(lambda img_url, page_url: self._process_image_job(run, img_url, page_url),
+                                workers=opts["image_workers"], maxsize=opts["image_queue_size"],
+                                policy=opts["image_queue_policy"], db=run.db, should_stop=self.stopping)
+        saved_images = run.images.load()
+        if saved_images:
+            logging.info("Resumed %d image jobs from DB", saved_images)
+
+        # raw responses for replay(); the offset index goes to CrawlDB even without resume
+        if opts["archive"]:
+            index_db = run.db
+            if index_db is None:
+                try:
+                    from db import CrawlDB
+                    index_db = run.archive_db = CrawlDB(os.path.join(run.output_base, DB_NAME))
+                except Exception:
+                    logging.exception("Failed to open DB for the archive index; replay will scan the segments")
+            run.archive = ResponseArchive(os.path.join(run.output_base, ARCHIVE_DIR), db=index_db)
+            logging.info("Archiving raw responses to %s", run.archive.directory)
+
+        run.page_executor = ThreadPoolExecutor(max_workers=opts["max_workers"])
+
+    def _open_replay(self, run, source):
+        # the dedup pipeline keeps its content hashes in CrawlDB: always open one for the output
+        self._open_output(run, db=True)
+        run.page_executor = ThreadPoolExecutor(max_workers=run.opts["max_workers"])
+        src_db = None
+        src_db_path = os.path.join(source, DB_NAME)
+        if os.path.exists(src_db_path):
+            from db import CrawlDB
+            src_db = run.archive_db = CrawlDB(src_db_path)
+        logging.info("Replaying archived responses from %s (%s)", source,
+                     "indexed" if src_db is not None else "scanning segments")
+        return ArchiveReader(os.path.join(source, ARCHIVE_DIR), db=src_db)
+
+    def submit_image_download(self, run, img_url, page_url, depth=0):
+        # True when queued; images of shallower pages are downloaded first. May block (policy "block").
+        if self.stopping():
             logging.debug("Shutdown requested: skipping image submission: %s", img_url)
-            return None
-        return image_executor.submit(process_image_job, img_url, page_url, get_domain_limiter_for(img_url), dirs, write_image_row, db)
-
-    # helper image job (runs in background executor)
-    def process_image_job(img_url, page_url, domain_limiter, dirs, write_image_row_func, db_obj):
+            return False
+        if run.images is None:
+            # replay: no downloads
+            return False
+        if run.link_router is not None and not run.link_router.owns(img_url):
+            # the owning shard's limiter keeps politeness for that domain
+            run.link_router.send_image(img_url, page_url, depth)
+            return False
+        return run.images.submit(img_url, page_url, depth)
+
+    # helper image job (runs on an image queue worker)
+    def _process_image_job(self, run, img_url, page_url):
         try:
-            if shutdown_event.is_set():
-                logging.debug("Shutdown requested: aborting image job: %s", img_url)
-                return
-            status, data = download_image(session, img_url, domain_limiter)
+            status, data = download_image(self.session, img_url, self.limiter_for(run, img_url), self.budget,
+                                          self.metrics)
             if status == 200 and data:
                 p = urlparse(img_url).path
                 ext = 'jpg'
@@ -141,121 +542,237 @@ def threaded_crawl_enhanced(start_url, output_base, max_pages=200, max_depth=2,
                         ext = ext_candidate
                 name = hashlib.sha1(img_url.encode('utf-8')).hexdigest()[:16]
                 fname = f"{name}.{ext}"
-                path = os.path.join(dirs['images'], fname)
+                path = os.path.join(run.dirs['images'], fname)
                 save_binary(path, data)
                 size = os.path.getsize(path) if os.path.exists(path) else 0
-                write_image_row_func([fname, img_url, page_url, size])
-                if db_obj:
-                    db_obj.add_image_manifest(fname, img_url, page_url, size)
+                run.write_image_row([fname, img_url, page_url, size])
+                if run.db:
+                    run.db.add_image_manifest(fname, img_url, page_url, size)
             else:
                 logging.debug("Image download failed: %s status=%s", img_url, status)
         except Exception:
             logging.exception("Image job failed for: %s", img_url)
 
     # main page processing function executed by page worker pool
-    def process_url(url, depth, parent):
-        if shutdown_event.is_set():
+    def _process_page(self, run, url, depth, parent, record=None):
+        with self.metrics.stages.stage("page"):
+            if run.profiler is None:
+                return self._process_url(run, url, depth, parent, record)
+            with run.profiler.page():
+                return self._process_url(run, url, depth, parent, record)
+
+    def _process_url(self, run, url, depth, parent, record=None):
+        stages = self.metrics.stages
+        db = run.db
+        visited = run.visited
+        canonical_covered = run.canonical_covered
+        canonicalizer = self.canonicalizer
+        if self.stopping():
             logging.debug("Shutdown requested: skipping page processing: %s", url)
             return []
-        if url in visited:
+        if url in visited or url in canonical_covered:
             return []
-        if depth > max_depth:
+        if record is None and depth > run.opts["max_depth"]:
             return []
         logging.info("Processing (depth=%d): %s", depth, url)
         try:
-            dl = get_domain_limiter_for(url)
-            status, ctype, text = fetch_page(session, url, dl)
+            if record is None:
+                archive = run.archive
+                status, ctype, text = fetch_page(
+                    self.session, url, self.limiter_for(run, url), self.budget, self.metrics,
+                    archive=(lambda resp: archive.write(url, resp, depth, parent)) if archive else None)
+                if status is None:
+                    # stopped while waiting for the domain's slot: left for a resumed crawl
+                    return []
+            else:
+                # replay: the archived response stands in for the network
+                status = record.status
+                with stages.stage("decode"):
+                    text = record.text if status == 200 else None
             visited.add(url)
-            topic = classify_topic(text)
-
-
-            write_url_row([url, status, depth, parent or "", topic])
+            self.metrics.pages.inc()
+            if run.link_router is not None:
+                run.link_router.page_done()
+            with stages.stage("classify"):
+                topic = self.classifier(text)
+
+            with stages.stage("manifest"):
+                run.write_url_row([url, status, depth, parent or "", topic])
             if db:
-                db.add_page(url, status=status, depth=depth, parent=parent or '', visited=1)
-                db.mark_visited(url, status)
+                with stages.stage("db"):
+                    db.add_page(url, status=status, depth=depth, parent=parent or '', visited=1)
+                    db.mark_visited(url, status)
 
             new_links = []
             if text:
-                visible_text, links, images = parse_html_for_links_and_text(text, url)
-                content_hash = compute_content_hash(visible_text)
+                t0 = time.perf_counter()
+                with stages.stage("parse"):
+                    visible_text, links, images, declared = self.page_parser(text, url)
+                self.metrics.parse_seconds.observe(time.perf_counter() - t0)
+                with stages.stage("hash"):
+                    content_hash = compute_content_hash(visible_text)
                 is_dup = False
                 canonical_url = ''
 
-                if db and content_hash:
-                    if db.has_content_hash(content_hash):
-                        canonical_url = db.get_canonical_url_for_hash(content_hash)
-                        logging.info("Duplicate content detected for %s (same as %s) - skipping save", url, canonical_url)
-                        db.mark_page_duplicate(url, content_hash, canonical_url)
-                        is_dup = True
-                    else:
-                        db.register_content_hash(content_hash, url)
+                # <link rel=canonical>: this response is the declared page's content
+                if canonicalizer is not None and declared:
+                    declared = self.canonical(declared)
+                    if declared != url and domain_of(declared) == domain_of(url):
+                        if declared in visited:
+                            canonical_url = declared
+                            logging.info("Page %s declares already-fetched canonical %s - skipping save", url, declared)
+                            if db:
+                                db.mark_page_duplicate(url, content_hash, declared)
+                            is_dup = True
+                        elif declared not in canonical_covered:
+                            canonical_covered.add(declared)
+                            canonicalizer.record_avoided()
+
+                if db and content_hash and not is_dup:
+                    with stages.stage("db"):
+                        if db.has_content_hash(content_hash):
+                            canonical_url = db.get_canonical_url_for_hash(content_hash)
+                            logging.info("Duplicate content detected for %s (same as %s) - skipping save", url, canonical_url)
+                            db.mark_page_duplicate(url, content_hash, canonical_url)
+                            is_dup = True
+                        else:
+                            db.register_content_hash(content_hash, url)
 
                 # If not duplicate, save and process images
                 if not is_dup:
                     fname = safe_filename(url)
-                    textpath = os.path.join(dirs['texts'], fname)
-                    save_text(textpath, visible_text)
-
-                    for img in images:
-                        if shutdown_event.is_set():
-                            break
-                        if not img:
-                            continue
-                        if (not allow_external) and domain_of(img) != domain_of(url):
-                            continue
-                        if db:
-                            db.add_image_manifest('', img, url, 0)
-                        try:
-                            submit_image_download(img, url)
-                        except Exception:
-                            logging.exception("Failed to submit image job: %s", img)
+                    textpath = os.path.join(run.dirs['texts'], fname)
+                    with stages.stage("save_text"):
+                        # a refetched page overwrites its text: log the length it replaces
+                        replaced = text_chars(textpath) if os.path.exists(textpath) else ""
+                        if save_text(textpath, visible_text):
+                            run.write_text_row([fname, len(visible_text or ""), replaced])
+
+                    with stages.stage("images"):
+                        for img in images:
+                            if self.stopping():
+                                break
+                            if not img:
+                                continue
+                            if (not run.opts["allow_external"]) and domain_of(img) != domain_of(url):
+                                continue
+                            if db:
+                                db.add_image_manifest('', img, url, 0)
+                            try:
+                                self.submit_image_download(run, img, url, depth)
+                            except Exception:
+                                logging.exception("Failed to submit image job: %s", img)
                 else:
                     # Optional: mark duplicates differently in logs
                     logging.debug("Skipped saving duplicate page %s", url)
 
+                # every outlink (canonical form) is an edge of the link graph
+                outlinks = [self.canonical(link) for link in links if link]
+                if db and outlinks:
+                    with stages.stage("db"):
+                        db.add_links(url, outlinks)
+
                 # collect new links
-                for link in links:
-                    if shutdown_event.is_set():
-                        break
-                    if not link:
-                        continue
-                    if (not allow_external) and domain_of(link) != domain_of(start_url):
-                        continue
-                    if link not in visited:
-                        new_links.append((link, depth + 1, url))
-                        if db:
-                            db.add_page(link, status=None, depth=depth+1, parent=url, visited=0)
-                            db.add_frontier(link, depth+1, url)
+                with stages.stage("links"):
+                    for link in outlinks:
+                        if self.stopping():
+                            break
+                        if (not run.opts["allow_external"]) and domain_of(link) != domain_of(run.start_url):
+                            continue
+                        if link not in visited and link not in canonical_covered:
+                            new_links.append((link, depth + 1, url))
+                            if db:
+                                db.add_page(link, status=None, depth=depth+1, parent=url, visited=0)
+                                db.add_frontier(link, depth+1, url)
             return new_links
         except Exception:
             logging.exception("Error processing URL: %s", url)
             try:
-                write_url_row([url, 'error', depth, parent or ''])
+                run.write_url_row([url, 'error', depth, parent or ''])
             except Exception:
                 pass
             return []
 
-    # page worker pool
-    page_executor = ThreadPoolExecutor(max_workers=max_workers)
-    futures_to_item = {}
-
-    try:
-        while frontier and len(visited) < max_pages and not shutdown_event.is_set():
-            # submit page jobs up to available worker slots
-            while frontier and len(futures_to_item) < max_workers and len(visited) + len(futures_to_item) < max_pages and not shutdown_event.is_set():
-                item = frontier.popleft()
+    def _receive_routed(self, run):
+        # URLs and image jobs other shards found for domains this shard owns
+        for kind, u, depth, parent in run.link_router.receive():
+            if kind == "image":
+                self.submit_image_download(run, u, parent, depth or 0)
+            elif u not in run.visited and u not in run.canonical_covered:
+                run.frontier.push(u, depth, parent)
+                if run.db:
+                    run.db.add_page(u, status=None, depth=depth, parent=parent, visited=0)
+                    run.db.add_frontier(u, depth, parent)
+
+    def _receive_sitemap(self, run, timeout=0.0):
+        # batches of sitemap URLs handed over by the loader thread (already in the DB)
+        got = False
+        while True:
+            try:
+                items = run.sitemap_queue.get(timeout=timeout) if timeout else run.sitemap_queue.get_nowait()
+            except queue.Empty:
+                return got
+            got = True
+            timeout = 0.0
+            if run.link_router is not None:
+                items = run.link_router.route(items)
+            for u, d, p in items:
+                if u not in run.visited and u not in run.canonical_covered:
+                    run.frontier.push(u, d, p)
+
+    def _loop(self, run):
+        opts = run.opts
+        max_pages, max_depth, max_workers = opts["max_pages"], opts["max_depth"], opts["max_workers"]
+        frontier, visited = run.frontier, run.visited
+        futures_to_item, inflight_urls = run.futures_to_item, run.inflight_urls
+        link_router, sitemap_loader = run.link_router, run.sitemap_loader
+
+        while len(visited) < max_pages and not self.stopping():
+            if not self._unpaused.is_set() and not futures_to_item:
+                # paused with nothing in flight: hold, without treating the crawl as finished
+                self._unpaused.wait(0.2)
+                continue
+            frontier.fill(max_workers)
+            if sitemap_loader is not None:
+                self._receive_sitemap(run)
+                if not frontier and not futures_to_item and sitemap_loader.running:
+                    # the crawl is not idle while sitemaps are still being read
+                    self._receive_sitemap(run, timeout=0.2)
+                    continue
+            if link_router is not None:
+                self._receive_routed(run)
+                if link_router.exhausted():
+                    break
+                if not frontier and not futures_to_item:
+                    # idle: wait for routed work until every shard is idle with nothing in transit
+                    if link_router.wait_idle(timeout=0.2):
+                        break
+                    continue
+            elif not frontier and not futures_to_item:
+                # a shared frontier may still get work from other crawler processes
+                if frontier.wait_idle():
+                    break
+                continue
+            # submit page jobs up to available worker slots (none while paused)
+            while (frontier and self._unpaused.is_set() and len(futures_to_item) < max_workers
+                   and len(visited) + len(futures_to_item) < max_pages and not self.stopping()):
+                item = frontier.pop()
                 url, depth, parent = item
-                if url in visited:
+                if url in inflight_urls:
                     continue
-                if depth > max_depth:
+                if url in visited or depth > max_depth:
+                    frontier.complete(url)
                     continue
-                fut = page_executor.submit(process_url, url, depth, parent)
+                fut = run.page_executor.submit(self._process_page, run, url, depth, parent)
                 futures_to_item[fut] = item
+                inflight_urls.add(url)
 
             if not futures_to_item:
                 # nothing in flight; either frontier empty or reached max
-                if not frontier or shutdown_event.is_set():
+                if self.stopping():
                     break
+                if not frontier:
+                    continue
                 else:
                     time.sleep(0.1)
                     continue
@@ -275,17 +792,22 @@ def threaded_crawl_enhanced(start_url, output_base, max_pages=200, max_depth=2,
                 new_links = []
 
             originating_item = futures_to_item.pop(done, None)
+            if originating_item is not None:
+                inflight_urls.discard(originating_item[0])
+                frontier.complete(originating_item[0])
+            if link_router is not None:
+                new_links = link_router.route(new_links)
             # add new links to frontier (BFS)
             for nl in new_links:
-                if shutdown_event.is_set():
+                if self.stopping():
                     break
                 if len(visited) + len(futures_to_item) >= max_pages:
                     break
-                if nl[0] not in visited:
-                    frontier.append(nl)
+                if nl[0] not in visited and nl[0] not in run.canonical_covered:
+                    frontier.push(*nl)
 
         # If shutdown requested, log and persist frontier
-        if shutdown_event.is_set():
+        if self.stopping():
             logging.info("Shutdown requested - saving frontier and stopping submission of new tasks...")
 
         # wait for remaining page futures to complete, but do not block forever
@@ -296,65 +818,112 @@ def threaded_crawl_enhanced(start_url, output_base, max_pages=200, max_depth=2,
                 fut.result(timeout=remaining if remaining > 0 else 0.1)
             except Exception:
                 logging.debug("Page future did not finish before timeout or raised an exception")
-
-        # attempt graceful image executor shutdown (allow already submitted images to finish)
-        logging.info("Shutting down image executor, waiting briefly for image jobs to finish")
-        try:
-            image_executor.shutdown(wait=False)
-            # give a short grace period for running image tasks to finish
-            grace_end = time.time() + max(2.0, min(GRACEFUL_SHUTDOWN_WAIT, 5.0))
-            while time.time() < grace_end:
-                if shutdown_event.is_set() and not image_executor._work_queue.qsize():
-                    break
-                time.sleep(0.2)
-        except Exception:
-            logging.exception("Error shutting down image executor")
-
-    except KeyboardInterrupt:
-        logging.info("Interrupted by user, initiating graceful shutdown...")
-        shutdown_event.set()
-    except Exception:
-        logging.exception("Top-level crawler exception")
-    finally:
+        for fut, item in futures_to_item.items():
+            if fut.done():
+                frontier.complete(item[0])
+
+        # short grace period for queued image jobs; what is left is saved to the DB in _finish
+        if not self.stopping():
+            logging.info("Waiting briefly for queued image jobs to finish")
+            run.images.join(timeout=max(2.0, min(GRACEFUL_SHUTDOWN_WAIT, 5.0)))
+
+    def _replay_loop(self, run, reader):
+        futures_to_item = run.futures_to_item
+        window = 2 * run.opts["max_workers"]
+        for rec in reader:
+            if self.stopping():
+                break
+            while not self._unpaused.is_set() and not self.stopping():
+                self._unpaused.wait(0.2)
+            fut = run.page_executor.submit(self._process_page, run, rec.url, rec.depth, rec.parent, rec)
+            futures_to_item[fut] = (rec.url, rec.depth, rec.parent)
+            if len(futures_to_item) >= window:
+                done, _ = wait(futures_to_item, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    futures_to_item.pop(fut, None)
+        wait(futures_to_item, timeout=GRACEFUL_SHUTDOWN_WAIT)
+        futures_to_item.clear()
+        logging.info("Replayed %d archived responses (%d unreadable records)", reader.records, reader.errors)
+
+    def _finish(self, run, shared_frontier):
         logging.info("Finalizing: persisting state and closing resources")
+        db, frontier, output_base = run.db, run.frontier, run.output_base
         # stop submitting new tasks
         try:
-            page_executor.shutdown(wait=False)
+            if run.page_executor is not None:
+                run.page_executor.shutdown(wait=False)
         except Exception:
-            logging.exception("Error shutting down page executor")
+            logging.exception("Error shutting down executor")
+        if run.archive is not None:
+            try:
+                run.archive.close()
+                logging.info("Response archive: %s", run.archive.get_stats())
+            except Exception:
+                logging.exception("Error closing response archive")
+        if run.archive_db is not None:
+            run.archive_db.close()
+        if run.images is not None:
+            try:
+                n = run.images.close()
+                if n:
+                    logging.info("Saved %d pending image jobs to DB", n)
+                logging.info("Image queue: %s", run.images.get_stats())
+            except Exception:
+                logging.exception("Error shutting down image queue")
+
+        if run.sitemap_loader is not None:
+            run.sitemap_loader.stop()
+            logging.info("Sitemap ingestion: %s", run.sitemap_loader.get_stats())
+
+        # URLs routed here after this shard stopped are kept for resume
+        if run.link_router is not None and frontier is not None:
+            images = []
+            for kind, u, d, p in run.link_router.drain():
+                if kind == "page":
+                    frontier.push(u, d, p)
+                else:
+                    images.append((u, p, d or 0))
+            if images and db:
+                db.add_image_jobs(images)
 
-        # dump remaining frontier to DB if resume enabled
-        if db:
+        # dump remaining frontier to DB if resume enabled (a shared frontier releases its leases instead)
+        if frontier is not None:
             try:
-                for (u, d, p) in frontier:
-                    db.add_frontier(u, d, p)
-                logging.info("Saved frontier to DB (%d items)", len(frontier))
+                n = frontier.close()
+                if db:
+                    logging.info("Saved frontier to DB (%d items)", n)
             except Exception:
                 logging.exception("Failed saving frontier to DB")
+            if shared_frontier:
+                logging.info("Frontier backend: %s", frontier.get_stats())
+        limiters = {d: self.limiters[d] for d in list(run.domains) if d in self.limiters}
+        if db:
+            try:
+                n = db.save_domain_states(dl.export_state() for dl in limiters.values())
+                logging.info("Saved limiter state for %d domains to DB", n)
+            except Exception:
+                logging.exception("Failed saving domain state to DB")
             try:
                 db.close()
             except Exception:
                 pass
 
         # close CSVs
-        try:
-            close_urls()
-        except Exception:
-            pass
-        try:
-            close_images()
-        except Exception:
-            pass
+        for close in (run.close_urls, run.close_images, run.close_texts):
+            try:
+                if close is not None:
+                    close()
+            except Exception:
+                pass
 
         # dump domain health to JSON
         try:
             health = {}
-            for d, dl in domain_cache.items():
+            for d, dl in limiters.items():
                 try:
                     health[d] = dl.get_health()
                 except Exception:
                     health[d] = {"error": "failed to collect"}
-            import json
             outpath = os.path.join(output_base, "domain_health.json")
             with open(outpath, "w", encoding="utf-8") as f:
                 json.dump(health, f, ensure_ascii=False, indent=2)
@@ -362,4 +931,65 @@ def threaded_crawl_enhanced(start_url, output_base, max_pages=200, max_depth=2,
         except Exception:
             logging.exception("Failed to write domain health")
 
-        logging.info("Crawl finished. Processed %d pages. Data in %s", len(visited), output_base)
+        if self.canonicalizer is not None:
+            try:
+                cstats = self.canonicalizer.get_stats()
+                outpath = os.path.join(output_base, "canonical_stats.json")
+                with open(outpath, "w", encoding="utf-8") as f:
+                    json.dump(cstats, f, ensure_ascii=False, indent=2)
+                logging.info("URL canonicalization: %d links rewritten, %d fetches avoided",
+                             cstats["links_rewritten"], cstats["fetches_avoided"])
+            except Exception:
+                logging.exception("Failed to write canonicalization stats")
+
+        if self.budget is not None:
+            logging.info("Global budget usage: %s", self.budget.get_stats())
+
+        # stage timings / profiles
+        stages = self.metrics.stages
+        if stages.enabled:
+            report = write_stage_report(os.path.join(output_base, "stage_timings.json"), stages,
+                                        {"pages": len(run.visited)})
+            for name, st in list(report["stages"].items())[:8]:
+                logging.info("Stage %-12s n=%d total=%.3fs mean=%.2fms p95<=%.2fms", name, st["count"],
+                             st["total"], st["mean"] * 1000, st["p95"] * 1000)
+        if run.profiler is not None:
+            try:
+                for p in run.profiler.write(output_base):
+                    logging.info("Wrote profile: %s", p)
+            except Exception:
+                logging.exception("Failed to write profile")
+
+        # final metrics snapshot
+        if run.snapshots is not None:
+            run.snapshots.close()
+
+        logging.info("Crawl finished. Processed %d pages. Data in %s", len(run.visited), output_base)
+
+
+def threaded_crawl_enhanced(start_url, output_base, max_pages=200, max_depth=2, allow_external=False,
+                            max_workers=10, image_workers=4, image_queue_size=IMAGE_QUEUE_SIZE,
+                            image_queue_policy=IMAGE_QUEUE_POLICY, resume=False, logfile=None, verbose=False,
+                            canonicalize=True, canonicalizer=None, manifest_rotate_rows=0, manifest_compress=False,
+                            domain_burst=None, domain_max_in_flight=None, budget=None, throttle_factory=None,
+                            metrics=None, metrics_port=None, metrics_interval=0, stage_timing=False,
+                            profile_pages=0, profile_mode="cprofile", archive=False, link_router=None,
+                            frontier_backend=None):
+    """
+    One crawl with a throwaway Crawler (see Crawler for the options); returns its stats().
+    Services running many crawls should keep a Crawler instead, to reuse its connection pool,
+    limiters and caches.
+    """
+    crawler = Crawler(logfile=logfile, verbose=verbose, canonicalize=canonicalize, canonicalizer=canonicalizer,
+                      domain_burst=domain_burst, domain_max_in_flight=domain_max_in_flight, budget=budget,
+                      throttle_factory=throttle_factory, metrics=metrics, metrics_port=metrics_port,
+                      stage_timing=stage_timing, max_pages=max_pages, max_depth=max_depth,
+                      allow_external=allow_external, max_workers=max_workers, image_workers=image_workers,
+                      image_queue_size=image_queue_size, image_queue_policy=image_queue_policy, resume=resume,
+                      manifest_rotate_rows=manifest_rotate_rows, manifest_compress=manifest_compress,
+                      metrics_interval=metrics_interval, profile_pages=profile_pages, profile_mode=profile_mode,
+                      archive=archive)
+    try:
+        return crawler.run(start_url, output_base, link_router=link_router, frontier_backend=frontier_backend)
+    finally:
+        crawler.close()
@@ -1,7 +1,13 @@
+import json
 import logging
 from threading import Lock
 import sqlite3
 
+# JSON-encoded columns of domain_state
+_DOMAIN_STATE_JSON = ("latency_samples", "throttle_state")
+_DOMAIN_STATE_COLUMNS = ("domain", "crawl_delay", "robots_delay", "avg_latency", "latency_samples", "error_count",
+                         "request_count", "robots_txt", "robots_fetched", "last_access", "throttle_state")
+
 class CrawlDB:
     def __init__(self, path):
         self.path = path
@@ -47,6 +53,30 @@ class CrawlDB:
             )
             """
         )
+        # image downloads not done yet: spilled by a full image queue, or left at exit (resume)
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS image_jobs (
+                image_url TEXT PRIMARY KEY,
+                page_url TEXT,
+                priority INTEGER
+            )
+            """
+        )
+        cur.execute("CREATE INDEX IF NOT EXISTS image_jobs_priority ON image_jobs(priority)")
+        # raw response archive (archive.py): where the latest response for each URL is stored
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS archive_index (
+                url TEXT PRIMARY KEY,
+                segment TEXT,
+                offset INTEGER,
+                length INTEGER,
+                status INTEGER,
+                fetched REAL
+            )
+            """
+        )
         # content map: one canonical_url per content_hash
         cur.execute(
             """
@@ -56,8 +86,58 @@ class CrawlDB:
             )
             """
         )
+        # link graph: integer node ids and every outlink edge (src -> dst), clustered by src
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS nodes (
+                id INTEGER PRIMARY KEY,
+                url TEXT UNIQUE
+            )
+            """
+        )
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS links (
+                src INTEGER,
+                dst INTEGER,
+                PRIMARY KEY (src, dst)
+            ) WITHOUT ROWID
+            """
+        )
+        # learned per-domain limiter state (DomainLimiter.export_state), used to warm-start the next run
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS domain_state (
+                domain TEXT PRIMARY KEY,
+                crawl_delay REAL,
+                robots_delay REAL,
+                avg_latency REAL,
+                latency_samples TEXT,
+                error_count INTEGER,
+                request_count INTEGER,
+                robots_txt TEXT,
+                robots_fetched REAL,
+                last_access REAL,
+                throttle_state TEXT
+            )
+            """
+        )
+        # columns added after the first release: migrate existing DBs in place
+        self._ensure_columns(cur, "pages", {
+            "pagerank": "REAL",
+            "hub_score": "REAL",
+            "authority_score": "REAL",
+            "lastmod": "TEXT",
+        })
         self.conn.commit()
 
+    def _ensure_columns(self, cur, table, columns):
+        cur.execute(f"PRAGMA table_info({table})")
+        existing = {r[1] for r in cur.fetchall()}
+        for name, decl in columns.items():
+            if name not in existing:
+                cur.execute(f"ALTER TABLE {table} ADD COLUMN {name} {decl}")
+
     def add_page(self, url, status=None, depth=0, parent=None, visited=0):
         with self.lock:
             cur = self.conn.cursor()
@@ -99,6 +179,30 @@ class CrawlDB:
             self.conn.commit()
             return rows
 
+    def add_sitemap_urls(self, rows, depth=0, parent="sitemap"):
+        """
+        rows: (url, lastmod) pairs from a sitemap. Records them as pages (updating lastmod of
+        known ones) and queues the unvisited ones in the frontier, in one transaction.
+        """
+        rows = [(u, lm) for u, lm in rows if u]
+        with self.lock:
+            cur = self.conn.cursor()
+            try:
+                cur.executemany(
+                    "INSERT INTO pages(url,status,depth,parent,visited,lastmod) VALUES(?,'',?,?,0,?) "
+                    "ON CONFLICT(url) DO UPDATE SET lastmod=COALESCE(excluded.lastmod, lastmod)",
+                    [(u, depth, parent, lm) for u, lm in rows])
+                cur.executemany(
+                    "INSERT OR IGNORE INTO frontier(url,depth,parent) "
+                    "SELECT ?,?,? WHERE NOT EXISTS (SELECT 1 FROM pages WHERE url=? AND visited=1)",
+                    [(u, depth, parent, u) for u, _ in rows])
+                self.conn.commit()
+            except Exception:
+                self.conn.rollback()
+                logging.exception("Failed to add %d sitemap URLs", len(rows))
+                return 0
+        return len(rows)
+
     def get_unvisited_pages(self):
         with self.lock:
             cur = self.conn.cursor()
@@ -115,6 +219,203 @@ class CrawlDB:
             except Exception:
                 logging.exception("Failed to insert image manifest: %s", image_url)
 
+    def add_image_jobs(self, rows):
+        """rows: (image_url, page_url, priority) image downloads to do later, in one transaction."""
+        rows = list(rows)
+        with self.lock:
+            cur = self.conn.cursor()
+            try:
+                cur.executemany("INSERT OR IGNORE INTO image_jobs(image_url,page_url,priority) VALUES(?,?,?)", rows)
+                self.conn.commit()
+            except Exception:
+                self.conn.rollback()
+                logging.exception("Failed to add %d image jobs", len(rows))
+                return 0
+        return len(rows)
+
+    def pop_image_jobs(self, limit=1000):
+        """Remove and return up to `limit` image jobs, lowest priority value (shallowest page) first."""
+        with self.lock:
+            cur = self.conn.cursor()
+            cur.execute("SELECT image_url,page_url,priority FROM image_jobs ORDER BY priority, rowid LIMIT ?",
+                        (limit,))
+            rows = cur.fetchall()
+            cur.executemany("DELETE FROM image_jobs WHERE image_url=?", [(r[0],) for r in rows])
+            self.conn.commit()
+            return rows
+
+    def count_image_jobs(self) -> int:
+        with self.lock:
+            cur = self.conn.cursor()
+            cur.execute("SELECT COUNT(*) FROM image_jobs")
+            return cur.fetchone()[0]
+
+    def add_archive_records(self, rows):
+        """rows: (url, segment, offset, length, status, fetched); a URL fetched again points to the new record."""
+        rows = list(rows)
+        with self.lock:
+            cur = self.conn.cursor()
+            try:
+                cur.executemany("INSERT OR REPLACE INTO archive_index(url,segment,offset,length,status,fetched) "
+                                "VALUES(?,?,?,?,?,?)", rows)
+                self.conn.commit()
+            except Exception:
+                self.conn.rollback()
+                logging.exception("Failed to index %d archive records", len(rows))
+                return 0
+        return len(rows)
+
+    def iter_archive_records(self, batch=10000):
+        """Yield (segment, offset, length) of every indexed record in file order."""
+        cur = self.conn.cursor()
+        cur.execute("SELECT segment, offset, length FROM archive_index ORDER BY segment, offset")
+        while True:
+            with self.lock:
+                rows = cur.fetchmany(batch)
+            if not rows:
+                break
+            yield from rows
+
+    def _select_node_ids(self, cur, urls):
+        ids = {}
+        for i in range(0, len(urls), 500):
+            chunk = urls[i:i + 500]
+            cur.execute(f"SELECT url, id FROM nodes WHERE url IN ({','.join('?' * len(chunk))})", chunk)
+            ids.update(cur.fetchall())
+        return ids
+
+    def _node_ids(self, cur, urls):
+        cur.executemany("INSERT OR IGNORE INTO nodes(url) VALUES(?)", [(u,) for u in urls])
+        return self._select_node_ids(cur, urls)
+
+    def node_id(self, url: str) -> int:
+        with self.lock:
+            cur = self.conn.cursor()
+            nid = self._node_ids(cur, [url])[url]
+            self.conn.commit()
+            return nid
+
+    def get_node_ids(self, urls) -> dict:
+        """{url: node id} for the urls already in the link graph; unknown urls are not added."""
+        urls = [u for u in dict.fromkeys(urls) if u]
+        with self.lock:
+            return self._select_node_ids(self.conn.cursor(), urls)
+
+    def add_links(self, src_url: str, dst_urls):
+        """Record every outlink of src_url as (src_id, dst_id) in one transaction."""
+        dst_urls = [u for u in dict.fromkeys(dst_urls) if u]
+        with self.lock:
+            cur = self.conn.cursor()
+            try:
+                ids = self._node_ids(cur, [src_url] + dst_urls)
+                src = ids[src_url]
+                cur.executemany("INSERT OR IGNORE INTO links(src,dst) VALUES(?,?)",
+                                [(src, ids[u]) for u in dst_urls])
+                self.conn.commit()
+            except Exception:
+                self.conn.rollback()
+                logging.exception("Failed to add links for: %s", src_url)
+
+    def set_page_scores(self, rows, batch=10000):
+        """
+        rows: iterable of (url, pagerank, hub_score, authority_score). Updates existing pages
+        rows in batches (one transaction per batch); returns the number of rows processed.
+        """
+        n = 0
+        buf = []
+
+        def flush():
+            with self.lock:
+                cur = self.conn.cursor()
+                try:
+                    cur.executemany("UPDATE pages SET pagerank=?, hub_score=?, authority_score=? WHERE url=?",
+                                    [(p, h, a, u) for u, p, h, a in buf])
+                    self.conn.commit()
+                except Exception:
+                    self.conn.rollback()
+                    logging.exception("Failed to write page scores")
+            buf.clear()
+
+        for r in rows:
+            buf.append(r)
+            n += 1
+            if len(buf) >= batch:
+                flush()
+        if buf:
+            flush()
+        return n
+
+    def save_domain_states(self, states):
+        """Upsert DomainLimiter.export_state() dicts in one transaction; returns the number saved."""
+        rows = []
+        for st in states:
+            st = dict(st)
+            for k in _DOMAIN_STATE_JSON:
+                st[k] = json.dumps(st.get(k))
+            rows.append(tuple(st.get(c) for c in _DOMAIN_STATE_COLUMNS))
+        with self.lock:
+            cur = self.conn.cursor()
+            try:
+                cur.executemany(
+                    f"INSERT OR REPLACE INTO domain_state({','.join(_DOMAIN_STATE_COLUMNS)}) "
+                    f"VALUES({','.join('?' * len(_DOMAIN_STATE_COLUMNS))})", rows)
+                self.conn.commit()
+            except Exception:
+                self.conn.rollback()
+                logging.exception("Failed to save domain state")
+                return 0
+        return len(rows)
+
+    def load_domain_state(self, domain: str):
+        """Saved state dict for `domain`, or None."""
+        with self.lock:
+            cur = self.conn.cursor()
+            cur.execute(f"SELECT {','.join(_DOMAIN_STATE_COLUMNS)} FROM domain_state WHERE domain=?", (domain,))
+            r = cur.fetchone()
+        if r is None:
+            return None
+        st = dict(zip(_DOMAIN_STATE_COLUMNS, r))
+        for k in _DOMAIN_STATE_JSON:
+            try:
+                st[k] = json.loads(st[k]) if st[k] else None
+            except ValueError:
+                st[k] = None
+        return st
+
+    def count_nodes(self) -> int:
+        with self.lock:
+            cur = self.conn.cursor()
+            cur.execute("SELECT COALESCE(MAX(id), 0) FROM nodes")
+            return cur.fetchone()[0]
+
+    def count_links(self) -> int:
+        with self.lock:
+            cur = self.conn.cursor()
+            cur.execute("SELECT COUNT(*) FROM links")
+            return cur.fetchone()[0]
+
+    def iter_nodes(self, batch=10000):
+        """Yield (id, url) in id order."""
+        cur = self.conn.cursor()
+        cur.execute("SELECT id, url FROM nodes ORDER BY id")
+        while True:
+            with self.lock:
+                rows = cur.fetchmany(batch)
+            if not rows:
+                break
+            yield from rows
+
+    def iter_links(self, batch=100000):
+        """Yield (src_id, dst_id) sorted by src, then dst (the table's clustering order)."""
+        cur = self.conn.cursor()
+        cur.execute("SELECT src, dst FROM links ORDER BY src, dst")
+        while True:
+            with self.lock:
+                rows = cur.fetchmany(batch)
+            if not rows:
+                break
+            yield from rows
+
     def close(self):
         try:
             self.conn.close()
@@ -1,56 +1,121 @@
 import logging
 import time
 
+from autothrottle import parse_retry_after
 from configs import IMAGE_TIMEOUT, REQUEST_TIMEOUT, USER_AGENT
+from profiling import NULL_TIMER
 
 
-def fetch_page(session, url, domain_limiter):
+def _release(domain_limiter):
+    try:
+        domain_limiter.release_slot()
+    except Exception:
+        logging.debug("Failed to release domain slot")
+
+
+def _record(domain_limiter, elapsed, status, resp, url):
+    try:
+        retry_after = None
+        if status in (429, 503):
+            retry_after = parse_retry_after((getattr(resp, "headers", None) or {}).get("Retry-After"))
+        if retry_after is None:
+            domain_limiter.record_response(elapsed, status)
+        else:
+            domain_limiter.record_response(elapsed, status, retry_after)
+    except Exception:
+        logging.debug("Failed to record domain response for %s", url)
+
+
+def _response_size(resp):
+    try:
+        return len(resp.content or b"")
+    except Exception:
+        return 0
+
+
+def fetch_page(session, url, domain_limiter, budget=None, metrics=None, archive=None):
+    # archive: optional callable(resp) given every response received (raw response archive)
+    stages = metrics.stages if metrics is not None else NULL_TIMER
     try:
         if not domain_limiter.can_fetch(url):
             logging.debug("Blocked by robots: %s", url)
             return 403, "", None
-        domain_limiter.wait_for_slot()
-        start = time.perf_counter()
-        resp = session.get(url, headers={"User-Agent": USER_AGENT}, timeout=REQUEST_TIMEOUT)
-        elapsed = time.perf_counter() - start
+        with stages.stage("wait_slot"):
+            if domain_limiter.wait_for_slot() is False:
+                # stopping: not fetched
+                return None, "", None
+        reserved = 0.0
+        try:
+            if budget is not None:
+                with stages.stage("wait_budget"):
+                    reserved = budget.acquire("page")
+            start = time.perf_counter()
+            with stages.stage("network"):
+                resp = session.get(url, headers={"User-Agent": USER_AGENT}, timeout=REQUEST_TIMEOUT)
+            elapsed = time.perf_counter() - start
+        finally:
+            _release(domain_limiter)
         status = resp.status_code
+        if budget is not None or metrics is not None:
+            size = _response_size(resp)
+            if budget is not None:
+                budget.record_bytes("page", size, reserved)
+            if metrics is not None:
+                metrics.observe_fetch("page", elapsed, status, size)
         ctype = resp.headers.get("Content-Type", "") or ""
-        try:
-            domain_limiter.record_response(elapsed, status)
-        except Exception:
-            logging.debug("Failed to record domain response for %s", url)
+        _record(domain_limiter, elapsed, status, resp, url)
+        if archive is not None:
+            with stages.stage("archive"):
+                try:
+                    archive(resp)
+                except Exception:
+                    logging.exception("Failed to archive response: %s", url)
         if status != 200:
             return status, ctype, None
         # attempt to return text; if it fails, decode bytes
-        try:
-            return status, ctype, resp.text
-        except Exception:
+        with stages.stage("decode"):
             try:
-                return status, ctype, resp.content.decode("utf-8", errors="replace")
+                return status, ctype, resp.text
             except Exception:
-                return status, ctype, ""
+                try:
+                    return status, ctype, resp.content.decode("utf-8", errors="replace")
+                except Exception:
+                    return status, ctype, ""
     except Exception:
         logging.exception("Exception fetching page: %s", url)
         return 0, "", None
 
 
-def download_image(session, img_url, domain_limiter):
+def download_image(session, img_url, domain_limiter, budget=None, metrics=None):
+    stages = metrics.stages if metrics is not None else NULL_TIMER
     try:
         if not domain_limiter.can_fetch(img_url):
             logging.debug("Image blocked by robots: %s", img_url)
             return None, None
-        domain_limiter.wait_for_slot()
-        start = time.perf_counter()
-        resp = session.get(img_url, headers={"User-Agent": USER_AGENT}, stream=True, timeout=IMAGE_TIMEOUT)
-        elapsed = time.perf_counter() - start
-        status = resp.status_code
+        with stages.stage("image_wait_slot"):
+            if domain_limiter.wait_for_slot() is False:
+                return None, None
+        reserved = 0.0
         try:
-            domain_limiter.record_response(elapsed, status)
-        except Exception:
-            logging.debug("Failed to record domain response for %s", img_url)
-        if resp.status_code != 200:
-            return resp.status_code, None
-        data = resp.content
+            if budget is not None:
+                with stages.stage("image_wait_budget"):
+                    reserved = budget.acquire("image")
+            start = time.perf_counter()
+            with stages.stage("image_network"):
+                resp = session.get(img_url, headers={"User-Agent": USER_AGENT}, stream=True, timeout=IMAGE_TIMEOUT)
+                status = resp.status_code
+                # streamed body: the connection is busy until content has been read
+                data = resp.content if status == 200 else None
+            elapsed = time.perf_counter() - start
+        finally:
+            _release(domain_limiter)
+        if budget is not None:
+            budget.record_bytes("image", len(data or b""), reserved)
+        if metrics is not None:
+            metrics.observe_fetch("image", elapsed, status, len(data or b""))
+        _record(domain_limiter, elapsed, status, resp, img_url)
+        if status != 200:
+            return status, None
         return 200, data
     except Exception:
         logging.exception("Exception downloading image: %s", img_url)
@@ -0,0 +1,595 @@
+import hashlib
+import json
+import logging
+import os
+import socket
+import sys
+import time
+from array import array
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Lock, Thread
+
+from url_utils import domain_of
+from utils import lazy_import
+
+# only RemoteFrontier talks HTTP as a client; load requests when one is created
+requests = lazy_import("requests")
+
+# ---------- Frontier backends ----------
+#
+# threaded_crawl_enhanced talks to its frontier through this interface (main thread only):
+#
+#   restore() -> int            load saved work (resume); 0 = nothing, seed the start URL
+#   push(url, depth, parent)    enqueue a discovered URL
+#   pop() -> item | None        next (url, depth, parent) this process may fetch
+#   __len__()                   items pop() can return without waiting
+#   fill(n)                     top up the local buffer (remote backends)
+#   complete(url, status)       the page was processed
+#   wait_idle(timeout) -> bool  nothing to do locally: True when the whole crawl is finished
+#   close() -> int              release / persist what is left at exit
+#   visited                     URLs fetched by this process
+#
+# LocalFrontier is the single-process default. RemoteFrontier shares one frontier and seen-set,
+# held by a FrontierServer, between crawler processes on several machines.
+#
+# Queued URLs are stored compactly (FrontierQueue): column arrays instead of one tuple per URL,
+# and the parent as an integer id (ParentIds), so a page's URL is held once however many of its
+# outlinks wait. The (url, depth, parent) tuple is only built when pop() hands an item out.
+
+
+class ParentIds:
+    """
+    Parent URL <-> integer id for queued entries. With a CrawlDB, a parent already in the link
+    graph is identified by its node id (nodes.id > 0); other parents (no DB, "sitemap", pages
+    recorded by another process) get local ids < 0. 0 means no parent. An id is kept for the
+    life of the frontier: one per distinct parent (page fetched), not one per queued URL.
+    """
+
+    __slots__ = ("db", "_ids", "_urls", "_next_local")
+
+    def __init__(self, db=None):
+        self.db = db
+        self._ids = {}
+        self._urls = {}
+        self._next_local = -1
+
+    def intern(self, urls):
+        """Assign ids to new parent URLs, with one DB lookup for the batch."""
+        new = [u for u in dict.fromkeys(urls) if u and u not in self._ids]
+        if not new:
+            return
+        found = {}
+        if self.db is not None:
+            try:
+                found = self.db.get_node_ids(new)
+            except Exception:
+                logging.exception("Failed to look up parent node ids")
+        for u in new:
+            pid = found.get(u)
+            if pid is None:
+                pid = self._next_local
+                self._next_local -= 1
+            self._ids[u] = pid
+            self._urls[pid] = u
+
+    def id_of(self, url) -> int:
+        if not url:
+            return 0
+        pid = self._ids.get(url)
+        if pid is None:
+            self.intern((url,))
+            pid = self._ids[url]
+        return pid
+
+    def url_of(self, pid):
+        return self._urls.get(pid) if pid else None
+
+    def __len__(self):
+        return len(self._ids)
+
+
+def _block_url(urls, ends, i):
+    if ends is None:
+        return urls[i]
+    return urls[ends[i - 1] if i else 0:ends[i]].decode("utf-8", "surrogatepass")
+
+
+class FrontierQueue:
+    """
+    FIFO of (url, depth, parent_id) entries held column-wise in blocks of BLOCK entries: the
+    URLs' UTF-8 bytes in one bytearray with an array of end offsets, depths and parent ids in
+    arrays. About the URL's length plus 16 bytes per entry, against a str, a tuple and a deque
+    slot (plus the parent str when it is not shared).
+
+    shared_urls=True keeps the URL str objects in a list instead, for owners that hold every
+    URL anyway (a seen-set): a bytes copy would only add to them. appendleft() is for re-queued
+    entries (rare): they wait as tuples and are served first.
+    """
+
+    __slots__ = ("shared_urls", "_blocks", "_head", "_front", "_len")
+    BLOCK = 4096
+
+    def __init__(self, shared_urls=False):
+        self.shared_urls = shared_urls
+        # (urls, ends, depths, parents): urls a bytearray with end offsets array('I'), or a
+        # list of str with ends None; depths array('i'), parent ids array('q')
+        self._blocks = deque()
+        self._head = 0  # next entry of the first block
+        self._front = deque()
+        self._len = 0
+
+    def append(self, url, depth, parent_id=0):
+        blocks = self._blocks
+        if not blocks or len(blocks[-1][2]) >= self.BLOCK:
+            if self.shared_urls:
+                blocks.append(([], None, array("i"), array("q")))
+            else:
+                blocks.append((bytearray(), array("I"), array("i"), array("q")))
+        urls, ends, depths, parents = blocks[-1]
+        if ends is None:
+            urls.append(url)
+        else:
+            urls += url.encode("utf-8", "surrogatepass")
+            ends.append(len(urls))
+        depths.append(depth)
+        parents.append(parent_id)
+        self._len += 1
+
+    def appendleft(self, url, depth, parent_id=0):
+        self._front.appendleft((url, depth, parent_id))
+        self._len += 1
+
+    def popleft(self):
+        """The oldest entry as (url, depth, parent_id), or None when empty."""
+        if self._front:
+            self._len -= 1
+            return self._front.popleft()
+        if not self._blocks:
+            return None
+        urls, ends, depths, parents = self._blocks[0]
+        i = self._head
+        entry = (_block_url(urls, ends, i), depths[i], parents[i])
+        if i + 1 < len(depths):
+            self._head = i + 1
+        else:
+            # block drained: its memory goes with it
+            self._blocks.popleft()
+            self._head = 0
+        self._len -= 1
+        return entry
+
+    def __len__(self):
+        return self._len
+
+    def __iter__(self):
+        yield from self._front
+        head = self._head
+        for urls, ends, depths, parents in self._blocks:
+            for i in range(head, len(depths)):
+                yield _block_url(urls, ends, i), depths[i], parents[i]
+            head = 0
+
+
+class LocalFrontier:
+    """In-process FIFO frontier (a FrontierQueue), restored from and saved to CrawlDB's frontier table."""
+
+    name = "local"
+
+    def __init__(self, db=None):
+        self.db = db
+        self.visited = set()
+        self.parents = ParentIds(db)
+        self._queue = FrontierQueue()
+
+    def restore(self, limit=1000) -> int:
+        if not self.db:
+            return 0
+        rows = self.db.pop_frontier_batch(limit=limit)
+        self.parents.intern(r[2] for r in rows)
+        for url, depth, parent in rows:
+            self.push(url, depth, parent)
+        return len(rows)
+
+    def push(self, url, depth, parent):
+        self._queue.append(url, depth, self.parents.id_of(parent))
+
+    def pop(self):
+        entry = self._queue.popleft()
+        if entry is None:
+            return None
+        return entry[0], entry[1], self.parents.url_of(entry[2])
+
+    def __len__(self):
+        return len(self._queue)
+
+    def __iter__(self):
+        url_of = self.parents.url_of
+        return iter([(u, d, url_of(p)) for u, d, p in self._queue])
+
+    def fill(self, n):
+        return
+
+    def complete(self, url, status=None):
+        return
+
+    def wait_idle(self, timeout=0.0) -> bool:
+        # nothing queued and nothing in flight: the crawl is over
+        return True
+
+    def close(self) -> int:
+        if not self.db:
+            return 0
+        for u, d, p in self:
+            self.db.add_frontier(u, d, p)
+        return len(self._queue)
+
+    def get_stats(self) -> dict:
+        return {"backend": self.name, "queued": len(self._queue), "parents": len(self.parents),
+                "visited": len(self.visited)}
+
+
+# ---------- shared frontier (server side) ----------
+
+def _domain_key(url: str) -> str:
+    # one str object per domain, shared by the queue, lease and owner maps
+    return sys.intern(domain_of(url))
+
+
+def _hrw(domain: str, worker: str) -> int:
+    return int.from_bytes(hashlib.blake2b(f"{worker}\0{domain}".encode("utf-8"), digest_size=8).digest(), "big")
+
+
+class FrontierState:
+    """
+    Shared frontier and seen-set for cooperating crawler processes.
+
+    - Every URL is accepted once (seen-set); a leased URL is handed to one worker at a time.
+    - Leases expire after `lease_ttl` seconds without a complete/release, and the URL is
+      queued again (front of its domain queue).
+    - Domain affinity: a domain's URLs go to the live worker with the highest rendezvous hash
+      for it, so each domain is fetched (and its politeness kept) by one process. A domain
+      stays with its current worker while that worker holds leases on it; workers not seen
+      for `worker_ttl` seconds drop out and their domains move.
+    - max_pages > 0 stops leasing once that many URLs were completed crawl-wide.
+
+    All calls go through sync(); the state is in memory (restart = new crawl).
+    """
+
+    def __init__(self, lease_ttl=300.0, worker_ttl=None, max_pages=0, clock=time.monotonic):
+        self.lease_ttl = float(lease_ttl)
+        self.worker_ttl = float(worker_ttl if worker_ttl is not None else lease_ttl)
+        self.max_pages = int(max_pages or 0)
+        self.clock = clock
+        self.lock = Lock()
+        self._seen = set()
+        self._completed = set()
+        self._queues = {}          # domain -> FrontierQueue of (url, depth, parent id)
+        self._parents = ParentIds()
+        self._leases = {}          # url -> (worker, expiry, item)
+        self._domain_leases = {}   # domain -> {worker: count}
+        self._workers = {}         # worker -> last sync time
+        self._owner_cache = {}     # domain -> (workers_version, owner)
+        self._workers_version = 0
+        self.pushed = 0
+        self.duplicates = 0
+        self.leased = 0
+        self.expired = 0
+
+    # ---- bookkeeping ----
+
+    def _touch_worker(self, worker, now):
+        if worker not in self._workers:
+            self._workers_version += 1
+        self._workers[worker] = now
+        dead = [w for w, t in self._workers.items() if now - t > self.worker_ttl]
+        for w in dead:
+            del self._workers[w]
+            self._workers_version += 1
+
+    def _expire(self, now):
+        for url, (worker, expiry, item) in list(self._leases.items()):
+            if expiry <= now:
+                self._drop_lease(url)
+                self.expired += 1
+                if url not in self._completed:
+                    self._requeue(item)
+
+    def _queue_for(self, url):
+        d = _domain_key(url)
+        q = self._queues.get(d)
+        if q is None:
+            q = self._queues[d] = FrontierQueue(shared_urls=True)  # the seen-set holds every URL
+        return q
+
+    def _requeue(self, item):
+        # a leased item back to the front of its domain queue
+        self._queue_for(item[0]).appendleft(item[0], int(item[1]), self._parents.id_of(item[2]))
+
+    def _drop_lease(self, url):
+        worker, _, _ = self._leases.pop(url)
+        d = _domain_key(url)
+        held = self._domain_leases.get(d)
+        if held:
+            held[worker] -= 1
+            if held[worker] <= 0:
+                del held[worker]
+            if not held:
+                del self._domain_leases[d]
+
+    def _owner(self, domain):
+        held = self._domain_leases.get(domain)
+        if held:
+            # sticky while leases are out: never two workers on one domain
+            return next(iter(held))
+        cached = self._owner_cache.get(domain)
+        if cached and cached[0] == self._workers_version:
+            return cached[1]
+        owner = max(self._workers, key=lambda w: _hrw(domain, w)) if self._workers else None
+        self._owner_cache[domain] = (self._workers_version, owner)
+        return owner
+
+    def _push(self, items):
+        for item in items:
+            url, depth, parent = item[0], int(item[1]), item[2]
+            if not url or url in self._seen:
+                self.duplicates += 1
+                continue
+            self._seen.add(url)
+            self._queue_for(url).append(url, depth, self._parents.id_of(parent))
+            self.pushed += 1
+
+    def _lease(self, worker, n, now):
+        out = []
+        if n <= 0 or (self.max_pages and len(self._completed) + len(self._leases) >= self.max_pages):
+            return out
+        if self.max_pages:
+            n = min(n, self.max_pages - len(self._completed) - len(self._leases))
+        mine = [d for d, q in self._queues.items() if q and self._owner(d) == worker]
+        # round-robin over this worker's domains so one big domain does not fill the batch
+        while mine and len(out) < n:
+            still = []
+            for d in mine:
+                q = self._queues[d]
+                while q and len(out) < n:
+                    url, depth, pid = q.popleft()
+                    if url in self._completed or url in self._leases:
+                        continue
+                    item = (url, depth, self._parents.url_of(pid))
+                    self._leases[url] = (worker, now + self.lease_ttl, item)
+                    held = self._domain_leases.setdefault(d, {})
+                    held[worker] = held.get(worker, 0) + 1
+                    out.append(item)
+                    break
+                if q:
+                    still.append(d)
+                else:
+                    del self._queues[d]
+            mine = still
+        self.leased += len(out)
+        return out
+
+    # ---- API ----
+
+    def sync(self, worker, push=(), complete=(), release=(), lease=0, leave=False) -> dict:
+        """
+        One round trip for a worker: record pushes, completions and released leases, then
+        lease up to `lease` URLs. Returns {"items", "done", "pending", "leased"}; done means
+        nothing is queued or leased anywhere (or max_pages was reached). With `leave` the
+        worker is deregistered: leases it still holds are queued again and its domains move
+        to the remaining workers at once instead of after worker_ttl.
+        """
+        with self.lock:
+            now = self.clock()
+            self._touch_worker(worker, now)
+            self._expire(now)
+            self._push(push)
+            for url in complete:
+                self._completed.add(url)
+                if url in self._leases:
+                    self._drop_lease(url)
+            for item in release:
+                url = item[0]
+                if url in self._leases and self._leases[url][0] == worker:
+                    self._drop_lease(url)
+                    if url not in self._completed:
+                        self._requeue(item)
+            if leave:
+                for url, (holder, _, item) in list(self._leases.items()):
+                    if holder == worker:
+                        self._drop_lease(url)
+                        self._requeue(item)
+                del self._workers[worker]
+                self._workers_version += 1
+                lease = 0
+            items = self._lease(worker, int(lease), now)
+            pending = sum(len(q) for q in self._queues.values())
+            capped = bool(self.max_pages) and len(self._completed) >= self.max_pages
+            done = capped or (not pending and not self._leases)
+            return {"items": items, "done": done, "pending": pending, "leased": len(self._leases)}
+
+    def get_stats(self) -> dict:
+        with self.lock:
+            return {
+                "seen": len(self._seen),
+                "completed": len(self._completed),
+                "pending": sum(len(q) for q in self._queues.values()),
+                "leased": len(self._leases),
+                "domains": len(self._queues),
+                "workers": sorted(self._workers),
+                "pushed": self.pushed,
+                "duplicates": self.duplicates,
+                "leases_granted": self.leased,
+                "leases_expired": self.expired,
+            }
+
+
+class FrontierServer:
+    """
+    Serves a FrontierState over HTTP/JSON from a daemon thread: POST /sync (body = sync()
+    keyword arguments plus "worker") and GET /stats. No authentication: bind to a private
+    interface. Port 0 picks a free port (see .port).
+    """
+
+    def __init__(self, state=None, host="127.0.0.1", port=0):
+        self.state = st = state if state is not None else FrontierState()
+
+        class Handler(BaseHTTPRequestHandler):
+            def _reply(self, status, obj):
+                body = json.dumps(obj).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                if self.path.split("?", 1)[0] == "/stats":
+                    self._reply(200, st.get_stats())
+                else:
+                    self._reply(404, {"error": "not found"})
+
+            def do_POST(self):
+                if self.path.split("?", 1)[0] != "/sync":
+                    self._reply(404, {"error": "not found"})
+                    return
+                try:
+                    req = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+                    res = st.sync(str(req["worker"]), push=req.get("push") or (), complete=req.get("complete") or (),
+                                  release=req.get("release") or (), lease=int(req.get("lease") or 0),
+                                  leave=bool(req.get("leave")))
+                except (KeyError, TypeError, ValueError) as e:
+                    self._reply(400, {"error": str(e)})
+                    return
+                self._reply(200, res)
+
+            def log_message(self, format, *args):
+                logging.debug("frontier http: " + format, *args)
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self._thread = Thread(target=self.httpd.serve_forever, name="frontier-http", daemon=True)
+        self._thread.start()
+
+    @property
+    def port(self) -> int:
+        return self.httpd.server_address[1]
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def close(self):
+        try:
+            self.httpd.shutdown()
+            self.httpd.server_close()
+        except Exception:
+            logging.debug("Failed to stop frontier server")
+
+
+# ---------- shared frontier (crawler side) ----------
+
+class RemoteFrontier:
+    """
+    Frontier held by a FrontierServer at `url`. Pushes and completions are buffered and sent
+    with the next lease request, so a page's outlinks always reach the server no later than
+    its completion. `visited` only covers this process; the seen-set is the server's.
+    At close() unprocessed leased items are released and the worker leaves, so its domains
+    move to the other workers at once.
+    """
+
+    name = "remote"
+    # consecutive failed syncs after which an idle worker gives up on the server
+    MAX_FAILURES = 20
+
+    def __init__(self, url, worker_id=None, timeout=10.0, poll_interval=0.5, session=None):
+        self.url = url.rstrip("/")
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        self.session = session or requests.Session()
+        self.visited = set()
+        self._buffer = deque()
+        self._push = []
+        self._complete = []
+        self._next_poll = 0.0
+        self._batch = 1
+        self._failures = 0
+        self.done = False
+        self.errors = 0
+        self.server_pending = 0
+
+    def restore(self, limit=1000) -> int:
+        # the server keeps the shared frontier; every worker seeds, the seen-set drops repeats
+        return 0
+
+    def push(self, url, depth, parent):
+        self._push.append((url, depth, parent))
+
+    def pop(self):
+        return self._buffer.popleft() if self._buffer else None
+
+    def __len__(self):
+        return len(self._buffer)
+
+    def __iter__(self):
+        return iter(list(self._buffer))
+
+    def complete(self, url, status=None):
+        self._complete.append(url)
+
+    def _sync(self, lease=0, release=(), leave=False) -> bool:
+        push, complete = self._push, self._complete
+        body = {"worker": self.worker_id, "push": push, "complete": complete, "release": list(release), "lease": lease}
+        if leave:
+            body["leave"] = True
+        try:
+            r = self.session.post(self.url + "/sync", json=body, timeout=self.timeout)
+            r.raise_for_status()
+            res = r.json()
+        except Exception as e:
+            self.errors += 1
+            self._failures += 1
+            logging.warning("Frontier sync with %s failed: %s", self.url, e)
+            return False
+        self._failures = 0
+        self._push, self._complete = [], []
+        self._buffer.extend(tuple(it) for it in res.get("items") or ())
+        self.done = bool(res.get("done"))
+        self.server_pending = res.get("pending", 0)
+        return True
+
+    def fill(self, n):
+        """Send buffered pushes / completions and lease up to 2n items when the buffer runs low."""
+        now = time.monotonic()
+        self._batch = max(1, n)
+        want = 2 * n - len(self._buffer) if len(self._buffer) < n else 0
+        if (want > 0 and now >= self._next_poll) or len(self._push) + len(self._complete) >= n:
+            got = len(self._buffer)
+            self._sync(lease=max(0, want))
+            if len(self._buffer) == got:
+                self._next_poll = now + self.poll_interval
+
+    def wait_idle(self, timeout=0.5) -> bool:
+        ok = self._sync(lease=self._batch)
+        if self._buffer:
+            return False
+        if ok and self.done:
+            return True
+        if self._failures >= self.MAX_FAILURES:
+            logging.error("Frontier server %s unreachable - stopping", self.url)
+            return True
+        time.sleep(timeout)
+        return False
+
+    def close(self) -> int:
+        # leave the crawl: this worker's domains go to the others without waiting for worker_ttl
+        release = list(self._buffer)
+        self._buffer.clear()
+        self._sync(release=release, leave=True)
+        return 0
+
+    def get_stats(self) -> dict:
+        return {"backend": self.name, "server": self.url, "worker": self.worker_id, "buffered": len(self._buffer),
+                "visited": len(self.visited), "sync_errors": self.errors}
@@ -1,13 +1,32 @@
-from bs4 import BeautifulSoup
 import xml.etree.ElementTree as ET
 
 from url_utils import normalize_url
 
 def parse_html_for_links_and_text(html, base_url):
+    visible_text, links, images, _ = parse_html_page(html, base_url)
+    return visible_text, links, images
+
+
+def parse_html_page(html, base_url):
+    """Same as parse_html_for_links_and_text, plus the normalized <link rel="canonical"> target (or None)."""
+    # imported on first use (bs4 costs ~25ms at startup); a no-op lookup afterwards
+    from bs4 import BeautifulSoup
     try:
         soup = BeautifulSoup(html, "html.parser")
     except Exception:
-        return "", set(), []
+        return "", set(), [], None
+
+    canonical = None
+    try:
+        for ln in soup.find_all("link", href=True):
+            rel = ln.get("rel") or []
+            if isinstance(rel, str):
+                rel = rel.split()
+            if any(r.lower() == "canonical" for r in rel):
+                canonical = normalize_url(base_url, ln.get("href"))
+                break
+    except Exception:
+        canonical = None
 
     for el in soup(["script", "style", "noscript", "header", "footer", "svg", "meta", "link"]):
         try:
@@ -40,7 +59,7 @@ def parse_html_for_links_and_text(html, base_url):
     except Exception:
         pass
 
-    return visible_text, links, images
+    return visible_text, links, images, canonical
 
 
 def parse_sitemap_xml(text):
@@ -0,0 +1,234 @@
+import bisect
+import itertools
+import logging
+import time
+from threading import Condition, Thread
+
+from configs import IMAGE_QUEUE_POLICY, IMAGE_QUEUE_SIZE, IMAGE_SPILL_BATCH
+
+POLICIES = ("block", "drop", "spill")
+
+
+class ImageQueue:
+    """
+    Bounded image pipeline: at most `maxsize` jobs wait in memory for `workers` threads, which
+    call handler(img_url, page_url) for each.
+
+    Jobs are ordered by priority (the depth of the page the image was found on): shallower
+    pages first, FIFO within a depth. When the queue is full, `policy` decides:
+      block  submit() waits for room, so page workers slow down to the image workers' pace
+      drop   the least important job (deepest, newest) is discarded, possibly the new one
+      spill  the least important job goes to CrawlDB's image_jobs table, in batches of
+             IMAGE_SPILL_BATCH, and is read back whenever the queue is less than half full
+    With a db, close() saves the jobs still queued and load() picks them up on the next run
+    (--resume). Without one, spill falls back to block and unfinished jobs are lost at close().
+    """
+
+    def __init__(self, handler, workers=4, maxsize=IMAGE_QUEUE_SIZE, policy=IMAGE_QUEUE_POLICY, db=None,
+                 should_stop=None, spill_batch=IMAGE_SPILL_BATCH):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown image queue policy {policy!r} (expected one of {', '.join(POLICIES)})")
+        if policy == "spill" and db is None:
+            logging.warning("Image queue policy 'spill' needs the crawl DB (--resume); blocking instead")
+            policy = "block"
+        self.handler = handler
+        self.maxsize = max(1, int(maxsize))
+        self.policy = policy
+        self.db = db
+        # () -> bool: when true, no further job starts and close() saves what is queued
+        self.should_stop = should_stop
+        self.spill_batch = max(1, int(spill_batch))
+        # sorted (priority, seq, img_url, page_url): the next job at index 0, the least important last
+        self._jobs = []
+        self._seq = itertools.count()
+        self._cond = Condition()
+        self._spill_buf = []
+        self._backlog = 0  # jobs in the image_jobs table
+        self._refilling = False
+        self._active = 0
+        self._closed = False
+        self.submitted = 0
+        self.completed = 0
+        self.dropped = 0
+        self.spilled = 0
+        self.restored = 0
+        self.blocked_seconds = 0.0
+        self._threads = [Thread(target=self._worker, name=f"image-{i}", daemon=True) for i in range(max(1, workers))]
+        for t in self._threads:
+            t.start()
+
+    def load(self) -> int:
+        """Jobs saved in the DB by an earlier run; they are queued as room frees up."""
+        if self.db is None:
+            return 0
+        try:
+            n = self.db.count_image_jobs()
+        except Exception:
+            logging.exception("Failed to count saved image jobs")
+            return 0
+        with self._cond:
+            self._backlog = n
+            self._cond.notify_all()
+        return n
+
+    def _stopping(self):
+        return self._closed or (self.should_stop is not None and self.should_stop())
+
+    def submit(self, img_url, page_url, priority=0) -> bool:
+        """Queue an image download; False when it was dropped (or the queue is stopping)."""
+        job = (priority, next(self._seq), img_url, page_url)
+        with self._cond:
+            if self._stopping():
+                return False
+            self.submitted += 1
+            if len(self._jobs) >= self.maxsize and self.policy == "block":
+                t0 = time.monotonic()
+                while len(self._jobs) >= self.maxsize and not self._stopping():
+                    self._cond.wait(0.2)
+                self.blocked_seconds += time.monotonic() - t0
+                if self._stopping():
+                    return False
+            if len(self._jobs) < self.maxsize:
+                bisect.insort(self._jobs, job)
+                self._cond.notify()
+                return True
+            # full: the least important of the queued jobs and the new one gives way
+            kept = job < self._jobs[-1]
+            victim = job
+            if kept:
+                victim = self._jobs.pop()
+                bisect.insort(self._jobs, job)
+                self._cond.notify()
+            if self.policy == "drop":
+                self.dropped += 1
+                logging.debug("Image queue full: dropped %s", victim[2])
+                return kept
+            self._spill_buf.append((victim[2], victim[3], victim[0]))
+            self.spilled += 1
+            if len(self._spill_buf) < self.spill_batch or self._refilling:
+                return True
+            buf, self._spill_buf = self._spill_buf, []
+            self._refilling = True
+        self._write_backlog(buf)
+        with self._cond:
+            self._refilling = False
+        return True
+
+    def _write_backlog(self, buf):
+        try:
+            self.db.add_image_jobs(buf)
+        except Exception:
+            logging.exception("Failed to spill %d image jobs to the DB", len(buf))
+            return
+        with self._cond:
+            self._backlog += len(buf)
+            self._cond.notify_all()
+
+    def _refill(self):
+        # spilled / saved jobs back from the DB, most important first
+        with self._cond:
+            if self._refilling or self._stopping():
+                return
+            self._refilling = True
+            buf, self._spill_buf = self._spill_buf, []
+            room = self.maxsize - len(self._jobs)
+        try:
+            if buf:
+                self._write_backlog(buf)
+            rows = self.db.pop_image_jobs(room) if room > 0 else []
+        except Exception:
+            logging.exception("Failed to read image jobs back from the DB")
+            rows = []
+        with self._cond:
+            # a short read means the table is drained
+            self._backlog = max(0, self._backlog - len(rows)) if len(rows) == room else 0
+            for img_url, page_url, priority in rows:
+                bisect.insort(self._jobs, (priority, next(self._seq), img_url, page_url))
+            self.restored += len(rows)
+            self._refilling = False
+            self._cond.notify_all()
+
+    def _next(self):
+        while True:
+            if ((self._backlog or self._spill_buf) and not self._refilling
+                    and len(self._jobs) <= self.maxsize // 2):
+                self._refill()
+            with self._cond:
+                if self._stopping():
+                    return None
+                if self._jobs:
+                    self._active += 1
+                    job = self._jobs.pop(0)
+                    self._cond.notify_all()
+                    return job
+                self._cond.wait(0.2)
+
+    def _worker(self):
+        while True:
+            job = self._next()
+            if job is None:
+                return
+            try:
+                self.handler(job[2], job[3])
+            except Exception:
+                logging.exception("Image job failed for: %s", job[2])
+            finally:
+                with self._cond:
+                    self._active -= 1
+                    self.completed += 1
+                    self._cond.notify_all()
+
+    def qsize(self) -> int:
+        return len(self._jobs)
+
+    def backlog(self) -> int:
+        """Jobs waiting in the DB (spilled or saved by an earlier run)."""
+        return self._backlog + len(self._spill_buf)
+
+    def join(self, timeout=None) -> bool:
+        """Wait until the in-memory queue is empty and no job runs; True when it is."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while (self._jobs or self._active) and not self._stopping():
+                remaining = 0.2 if deadline is None else min(0.2, deadline - time.monotonic())
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            return not self._jobs and not self._active
+
+    def close(self, timeout=2.0) -> int:
+        """
+        Stop the workers (a running download may finish within `timeout`) and save the jobs
+        still queued to the DB. Returns the number saved, 0 without a db.
+        """
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        deadline = time.monotonic() + timeout
+        for t in self._threads:
+            t.join(max(0.0, deadline - time.monotonic()))
+        with self._cond:
+            left = [(u, p, prio) for prio, _, u, p in self._jobs] + self._spill_buf
+            self._jobs, self._spill_buf = [], []
+        if self.db is None or not left:
+            return 0
+        try:
+            self.db.add_image_jobs(left)
+        except Exception:
+            logging.exception("Failed to save %d image jobs to the DB", len(left))
+            return 0
+        return len(left)
+
+    def get_stats(self) -> dict:
+        return {
+            "policy": self.policy,
+            "maxsize": self.maxsize,
+            "queued": len(self._jobs),
+            "backlog": self.backlog(),
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "dropped": self.dropped,
+            "spilled": self.spilled,
+            "restored": self.restored,
+            "blocked_s": round(self.blocked_seconds, 3),
+        }
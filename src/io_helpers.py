@@ -1,23 +1,195 @@
 import csv
+import glob
+import gzip
 import logging
+import os
 from concurrent.futures import ThreadPoolExecutor, as_completed
+from threading import Event, Lock, Thread
 
-def make_csv_writer(path, header):
-    f = open(path, "w", newline="", encoding="utf-8")
-    writer = csv.writer(f)
-    writer.writerow(header)
-    f.flush()
+
+class ManifestWriter:
+    """
+    Thread-safe, buffered CSV manifest writer.
+
+    Rows from any thread are appended to an in-memory buffer under a lock and written out in
+    one batch when `flush_rows` rows are pending, every `flush_interval` seconds (background
+    flusher thread), and on close(). Each flush is a single writerows + flush, so rows are
+    never interleaved and there is no syscall per row.
+
+    With `rotate_rows` > 0 the manifest is split into segments of at most that many rows:
+    the first segment is `path`, the following ones `<stem>-00001<ext>`, ... each with its own
+    header. `compress=True` writes gzip segments (`.gz` appended to every name).
+
+    A writer starts a new manifest: segments left at `path` by an earlier run (rotated ones,
+    or written with the other `compress` setting) are deleted, so readers never mix them in.
+    With `append=True` it continues the existing plain file at `path` instead (header only if
+    the file is new); an append-only log cannot be rotated or compressed.
+    """
+
+    def __init__(self, path, header, flush_rows=500, flush_interval=1.0, rotate_rows=0, compress=False,
+                 append=False):
+        if append and (rotate_rows or compress):
+            raise ValueError("append=True cannot be combined with rotate_rows or compress")
+        self.path = path
+        self.append = append
+        self.header = list(header)
+        self.flush_rows = max(1, int(flush_rows))
+        self.flush_interval = flush_interval
+        self.rotate_rows = int(rotate_rows or 0)
+        self.compress = compress
+        self.lock = Lock()
+        self._buffer = []
+        self._segment = 0
+        self._segment_rows = 0
+        self._closed = False
+        self._f = None
+        self._writer = None
+        if not append:
+            self._remove_old_segments()
+        self._open_segment()
+        self._stop = Event()
+        self._flusher = None
+        if flush_interval and flush_interval > 0:
+            self._flusher = Thread(target=self._flush_loop, name="manifest-flusher", daemon=True)
+            self._flusher.start()
+
+    def _remove_old_segments(self):
+        for seg in manifest_segments(self.path):
+            try:
+                os.remove(seg)
+            except OSError:
+                logging.warning("Failed to remove old manifest segment %s", seg)
+
+    def _open_segment(self):
+        path = segment_path(self.path, self._segment)
+        if self.compress:
+            path += ".gz"
+            self._f = gzip.open(path, "wt", newline="", encoding="utf-8")
+        else:
+            tail = _last_byte(path) if self.append else None
+            self._f = open(path, "a" if self.append else "w", newline="", encoding="utf-8")
+            if tail not in (None, b"\n"):
+                # end a row an interrupted writer left without its newline
+                self._f.write("\r\n")
+        self._writer = csv.writer(self._f)
+        if not self._f.tell():
+            self._writer.writerow(self.header)
+        self._f.flush()
+        self._segment_rows = 0
+
+    def _flush_loop(self):
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+
+    def write_row(self, row):
+        with self.lock:
+            if self._closed:
+                logging.debug("Manifest %s closed; dropping row: %s", self.path, row)
+                return
+            self._buffer.append(row)
+            if len(self._buffer) >= self.flush_rows:
+                self._flush_locked()
+
+    def flush(self):
+        with self.lock:
+            if not self._closed:
+                self._flush_locked()
+
+    def _flush_locked(self):
+        if not self._buffer:
+            return
+        rows, self._buffer = self._buffer, []
+        try:
+            while rows:
+                n = len(rows)
+                if self.rotate_rows:
+                    if self._segment_rows >= self.rotate_rows:
+                        self._f.close()
+                        self._segment += 1
+                        self._open_segment()
+                    n = min(n, self.rotate_rows - self._segment_rows)
+                self._writer.writerows(rows[:n])
+                self._segment_rows += n
+                rows = rows[n:]
+            self._f.flush()
+        except Exception:
+            logging.exception("Failed to write %d CSV rows to %s", len(rows), self.path)
+
+    def close(self):
+        self._stop.set()
+        if self._flusher is not None:
+            self._flusher.join(timeout=5.0)
+        with self.lock:
+            if self._closed:
+                return
+            self._flush_locked()
+            self._closed = True
+            try:
+                self._f.close()
+            except Exception:
+                pass
+
+
+def _last_byte(path):
+    # None for a missing or empty file
+    try:
+        with open(path, "rb") as f:
+            if not f.seek(0, os.SEEK_END):
+                return None
+            f.seek(-1, os.SEEK_END)
+            return f.read(1)
+    except FileNotFoundError:
+        return None
+
+
+def segment_path(path, index):
+    """Name of rotated segment `index` of manifest `path` (segment 0 is `path` itself)."""
+    if index == 0:
+        return path
+    stem, ext = os.path.splitext(path)
+    return f"{stem}-{index:05d}{ext}"
+
+
+def manifest_segments(path):
+    """All existing segments (plain or gzip) of manifest `path`, in write order."""
+    stem, ext = os.path.splitext(path)
+    found = [p for p in (path, path + ".gz") if os.path.exists(p)]
+    rotated = glob.glob(glob.escape(stem) + "-[0-9][0-9][0-9][0-9][0-9]" + ext) + \
+        glob.glob(glob.escape(stem) + "-[0-9][0-9][0-9][0-9][0-9]" + ext + ".gz")
+    return found + sorted(rotated)
+
+
+def open_manifest(path):
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", newline="", encoding="utf-8")
+    return open(path, newline="", encoding="utf-8")
+
+
+def iter_manifest_rows(path):
+    """Yield dict rows from every segment of manifest `path`; raises FileNotFoundError if none exist."""
+    segments = manifest_segments(path)
+    if not segments:
+        raise FileNotFoundError(path)
+    for seg in segments:
+        with open_manifest(seg) as f:
+            for row in csv.DictReader(f):
+                yield row
+
+
+def make_csv_writer(path, header, flush_rows=500, flush_interval=1.0, rotate_rows=0, compress=False,
+                    append=False):
+    mw = ManifestWriter(path, header, flush_rows=flush_rows, flush_interval=flush_interval,
+                        rotate_rows=rotate_rows, compress=compress, append=append)
 
     def write_row(row):
         try:
-            writer.writerow(row)
-            f.flush()
+            mw.write_row(row)
         except Exception:
             logging.exception("Failed to write CSV row: %s", row)
 
     def close():
         try:
-            f.close()
+            mw.close()
         except Exception:
             pass
 
@@ -30,6 +202,8 @@ def save_text(path, text):
             f.write(text or "")
     except Exception:
         logging.exception("Failed to save text file: %s", path)
+        return False
+    return True
 
 
 def save_binary(path, data):
@@ -1,75 +1,242 @@
 import time
+import urllib.error
+import urllib.request
 from urllib import robotparser
-from threading import RLock
+from threading import Condition, Lock, RLock
 import logging
-from configs import USER_AGENT, DEFAULT_PER_DOMAIN_DELAY
+from autothrottle import LegacyThrottle
+from configs import (USER_AGENT, DEFAULT_PER_DOMAIN_DELAY, DEFAULT_DOMAIN_BURST, DEFAULT_DOMAIN_MAX_IN_FLIGHT,
+                     MAX_RETRY_AFTER, REQUEST_TIMEOUT, ROBOTS_CACHE_TTL)
 
 # ---------- Domain limiter (robots + delay) ----------
 from collections import deque
 
+# stored in place of the body when robots.txt answers 401/403 (same meaning as RobotFileParser.read)
+ROBOTS_DISALLOW_ALL = "User-agent: *\nDisallow: /\n"
+
 class DomainLimiter:
     # bounds for crawl_delay (seconds)
     MIN_DELAY = 0.1
     MAX_DELAY = 30.0
 
-    def __init__(self, domain: str, window: int = 8):
+    # seconds between checks of should_stop while waiting for a slot
+    STOP_POLL = 0.2
+
+    def __init__(self, domain: str, window: int = 8, burst: int = None, max_in_flight: int = None, throttle=None,
+                 state: dict = None, should_stop=None):
         self.domain = domain
+        # callable; once true, wait_for_slot() gives up instead of waiting (up to MAX_RETRY_AFTER)
+        self.should_stop = should_stop
         self.rp = robotparser.RobotFileParser()
         self._robots_urls = [f"https://{domain}/robots.txt", f"http://{domain}/robots.txt"]
         self.crawl_delay = DEFAULT_PER_DOMAIN_DELAY
+        # delay demanded by robots.txt (Crawl-delay / Request-rate); throttles never go below it
+        self.robots_delay = None
+        # raw robots.txt as last fetched (None = not fetched), kept so it can be persisted
+        self.robots_txt = None
+        self.robots_fetched = 0.0
         self.latency_samples = deque(maxlen=window)
         self.lock = RLock()
         self.last_request = 0.0
         self.error_count = 0
         self.request_count = 0
-        self._read_robots()
+        # token bucket (GCRA form): _tat is the theoretical arrival time of the next request
+        self.burst = max(1, int(DEFAULT_DOMAIN_BURST if burst is None else burst))
+        self._tat = 0.0
+        # per-domain concurrency cap; 0 = unlimited. Guarded by its own condition so that
+        # threads waiting for a connection never block record_response()
+        self.max_in_flight = int(DEFAULT_DOMAIN_MAX_IN_FLIGHT if max_in_flight is None else max_in_flight)
+        # the cap as configured (--domain-max-in-flight); a throttle may lower it, never raise it
+        self.configured_max_in_flight = self.max_in_flight
+        self.in_flight = 0
+        self._flight = Condition(Lock())
+        # pluggable policy adjusting crawl_delay / max_in_flight after each response
+        self.throttle = throttle if throttle is not None else LegacyThrottle()
+        if not self._restore_robots(state):
+            self._read_robots()
+        if state:
+            self._restore_state(state)
+
+    def _fetch_robots_txt(self, rurl):
+        # mirrors RobotFileParser.read(): 401/403 disallow everything, other 4xx allow everything
+        try:
+            with urllib.request.urlopen(rurl, timeout=REQUEST_TIMEOUT) as f:
+                return f.read().decode("utf-8", errors="replace")
+        except urllib.error.HTTPError as err:
+            if err.code in (401, 403):
+                return ROBOTS_DISALLOW_ALL
+            if 400 <= err.code < 500:
+                return ""
+            raise
 
     def _read_robots(self):
         for rurl in self._robots_urls:
             try:
                 self.rp.set_url(rurl)
-                self.rp.read()
-                cd = None
-                try:
-                    cd = self.rp.crawl_delay(USER_AGENT)
-                except Exception:
-                    cd = None
-                if cd is None:
-                    try:
-                        cd = self.rp.crawl_delay("*")
-                    except Exception:
-                        cd = None
-                if cd is not None:
-                    self.crawl_delay = float(cd)
+                self._apply_robots(self._fetch_robots_txt(rurl))
+                self.robots_fetched = time.time()
                 return
             except Exception:
                 continue
 
+    def _apply_robots(self, text: str):
+        """Parse a robots.txt body and derive crawl_delay / robots_delay from it."""
+        self.rp.parse(text.splitlines())
+        self.robots_txt = text
+        cd = None
+        try:
+            cd = self.rp.crawl_delay(USER_AGENT)
+        except Exception:
+            cd = None
+        if cd is None:
+            try:
+                cd = self.rp.crawl_delay("*")
+            except Exception:
+                cd = None
+        if cd is not None:
+            self.crawl_delay = float(cd)
+        # Request-rate: n requests per s seconds
+        rr = None
+        try:
+            rr = self.rp.request_rate(USER_AGENT) or self.rp.request_rate("*")
+        except Exception:
+            rr = None
+        if rr is not None and rr.requests > 0:
+            self.crawl_delay = max(self.crawl_delay if cd is not None else 0.0,
+                                   float(rr.seconds) / float(rr.requests))
+        if cd is not None or (rr is not None and rr.requests > 0):
+            self.robots_delay = self.crawl_delay
+
+    def _restore_robots(self, state) -> bool:
+        """Reuse the robots.txt stored in `state` if it is younger than ROBOTS_CACHE_TTL."""
+        if not state or state.get("robots_txt") is None:
+            return False
+        fetched = float(state.get("robots_fetched") or 0.0)
+        if time.time() - fetched > ROBOTS_CACHE_TTL:
+            return False
+        try:
+            self._apply_robots(state["robots_txt"])
+        except Exception:
+            logging.debug("Stored robots.txt for %s unusable; refetching", self.domain)
+            return False
+        self.robots_fetched = fetched
+        return True
+
+    def _restore_state(self, state: dict):
+        """Warm start from a saved export_state() snapshot (see CrawlDB.load_domain_state)."""
+        try:
+            with self.lock:
+                delay = state.get("crawl_delay")
+                if delay:
+                    self.crawl_delay = min(self.MAX_DELAY, max(float(delay), self.robots_delay or self.MIN_DELAY))
+                for s in state.get("latency_samples") or []:
+                    self.latency_samples.append(float(s))
+                self.error_count = int(state.get("error_count") or 0)
+                self.request_count = int(state.get("request_count") or 0)
+                last = float(state.get("last_access") or 0.0)
+                self.last_request = last
+                # keep spacing across a restart that happens within one crawl_delay
+                self._tat = last + self.crawl_delay if last else 0.0
+                restore = getattr(self.throttle, "restore_state", None)
+                if restore is not None and state.get("throttle_state"):
+                    restore(self, state["throttle_state"])
+        except Exception:
+            logging.exception("Failed to restore domain state for %s", self.domain)
+
+    def export_state(self) -> dict:
+        """Learned state worth keeping across runs (stored by CrawlDB.save_domain_states)."""
+        with self.lock:
+            export = getattr(self.throttle, "export_state", None)
+            return {
+                "domain": self.domain,
+                "crawl_delay": float(self.crawl_delay),
+                "robots_delay": self.robots_delay,
+                "avg_latency": float(self.avg_latency()),
+                "latency_samples": list(self.latency_samples),
+                "error_count": int(self.error_count),
+                "request_count": int(self.request_count),
+                "robots_txt": self.robots_txt,
+                "robots_fetched": float(self.robots_fetched),
+                "last_access": float(self.last_request),
+                "throttle_state": export() if export is not None else {},
+            }
+
     def can_fetch(self, url: str):
         try:
             return self.rp.can_fetch(USER_AGENT, url)
         except Exception:
             return True
 
-    def wait_for_slot(self):
+    def _stopping(self):
+        return self.should_stop is not None and self.should_stop()
+
+    def wait_for_slot(self) -> bool:
+        """
+        Block until this caller may send a request to the domain; True when it may.
+
+        First waits for a free in-flight permit (if max_in_flight is set), then reserves a send
+        time from the token bucket under the lock: up to `burst` requests go back-to-back,
+        after that each reservation is spaced by crawl_delay. Every waiter gets its own slot,
+        so concurrent callers are serialized instead of all waking at once. Pair every call
+        that returned True with release_slot() once the response has been read.
+
+        Returns False, holding no permit, as soon as should_stop() is true: a slot pushed back
+        by Retry-After can be minutes away, and stopping must not wait for it.
+        """
+        with self._flight:
+            while self.max_in_flight > 0 and self.in_flight >= self.max_in_flight:
+                if self._stopping():
+                    return False
+                self._flight.wait(self.STOP_POLL if self.should_stop is not None else None)
+            self.in_flight += 1
+
         with self.lock:
             now = time.time()
-            wait = self.crawl_delay - (now - self.last_request)
-            if wait <= 0:
-                self.last_request = time.time()
-                return
+            interval = self.crawl_delay
+            tat = max(self._tat, now)
+            start = max(now, tat - (self.burst - 1) * interval)
+            self._tat = tat + interval
+            self.last_request = start
         # sleep outside lock (prevents blocking other threads)
-        time.sleep(wait)
+        if self.should_stop is None:
+            wait = start - now
+            if wait > 0:
+                time.sleep(wait)
+            return True
+        while True:
+            if self._stopping():
+                self.release_slot()
+                return False
+            wait = start - time.time()
+            if wait <= 0:
+                return True
+            time.sleep(min(wait, self.STOP_POLL))
+
+    def release_slot(self):
+        """Return the in-flight permit taken by wait_for_slot()."""
+        with self._flight:
+            if self.in_flight > 0:
+                self.in_flight -= 1
+            self._flight.notify()
+
+    def set_max_in_flight(self, n: int):
+        with self._flight:
+            self.max_in_flight = max(0, int(n))
+            self._flight.notify_all()
 
-        # after sleeping, update last_request under lock
+    def defer(self, seconds: float):
+        """Push the next slot at least `seconds` into the future (server asked us to back off)."""
+        seconds = min(max(0.0, float(seconds)), MAX_RETRY_AFTER)
         with self.lock:
-            self.last_request = time.time()
+            # leave room for the burst allowance so the first request after the pause waits too
+            self._tat = max(self._tat, time.time() + seconds + (self.burst - 1) * self.crawl_delay)
 
-    def record_response(self, latency: float, status_code: int):
+    def record_response(self, latency: float, status_code: int, retry_after: float = None):
         """
         Call this AFTER a request completes.
         - latency: elapsed seconds for the request (float)
         - status_code: HTTP status code (int)
+        - retry_after: seconds from a Retry-After header on 429/503, if any
         """
         try:
             with self.lock:
@@ -80,18 +247,11 @@ class DomainLimiter:
                 if status_code is None or status_code >= 500 or status_code == 429:
                     self.error_count += 1
 
-                avg_latency = sum(self.latency_samples) / len(self.latency_samples)
+                if retry_after is not None:
+                    self.defer(retry_after)
 
                 # adaptive policy
-                if avg_latency > (self.crawl_delay * 2) or self.error_rate() > 0.2:
-                    new_delay = min(self.crawl_delay * 1.8, self.MAX_DELAY)
-                    if new_delay > self.crawl_delay:
-                        self.crawl_delay = new_delay
-                else:
-                    if avg_latency > 0 and avg_latency < (self.crawl_delay * 0.6):
-                        new_delay = max(self.crawl_delay * 0.85, self.MIN_DELAY)
-                        if new_delay < self.crawl_delay:
-                            self.crawl_delay = new_delay
+                self.throttle.on_response(self, latency, status_code, retry_after)
 
                 # bounds
                 if self.crawl_delay < self.MIN_DELAY:
@@ -123,4 +283,8 @@ class DomainLimiter:
                 "errors": int(self.error_count),
                 "requests": int(self.request_count),
                 "error_rate": float(self.error_rate()),
+                "burst": int(self.burst),
+                "max_in_flight": int(self.max_in_flight),
+                "in_flight": int(self.in_flight),
+                **self.throttle.get_stats(),
             }
@@ -7,34 +7,47 @@ containing edges and basic node/domain stats.
 
 Input layout (default `data/`):
  - data/urls/urls.csv  (expects columns: url,parent, ...)
+ - data/crawl_state.db (--from-db: nodes/links tables with every outlink, written with --resume)
 
 Output:
  - data/link_graph.json  -> {"nodes": [...], "edges": [[src,dst],...], "domain_counts": {...}}
+ - data/link_graph.offsets.i64, .targets.i32, .nodes.txt, .meta.json  (--formats csr)
+ - data/link_graph.edges.tsv  -> "src<TAB>dst" node indexes, one edge per line (--formats edgelist)
+ - data/link_graph.jsonl[.gz] -> one {"type": "node"|"edge"|"domain_counts", ...} object per line (--formats jsonl)
+ - data/link_graph.json[.gz]  -> same schema as link_graph.json, streamed compactly (--formats json-stream)
 
 Usage:
     python src/link_graph_exporter.py --output data --out-file link_graph.json
+    python src/link_graph_exporter.py --output data --from-db --formats csr,edgelist
+    python src/link_graph_exporter.py --output data --from-db --formats jsonl --gzip
 
-This is intentionally small and robust: it reads the `parent` field written by the
-crawler's urls.csv manifest. If parent is empty, no incoming edge is produced.
+Without --from-db it reads the `parent` field written by the crawler's urls.csv manifest
+(one discovery edge per page). If parent is empty, no incoming edge is produced.
 """
 
 import argparse
-import csv
+import gzip
 import json
 import os
+import sys
+from array import array
 from collections import defaultdict
 
+from configs import DB_NAME
+from io_helpers import iter_manifest_rows, manifest_segments
 
 def read_urls_csv(path):
-    rows = []
-    try:
-        with open(path, newline='', encoding='utf-8') as f:
-            r = csv.DictReader(f)
-            for row in r:
-                rows.append(row)
-    except FileNotFoundError:
-        raise
-    return rows
+    # reads every segment (rotated / gzip) of the manifest; FileNotFoundError if none exist
+    return list(iter_manifest_rows(path))
+
+
+def read_urls_columnar(output_dir):
+    """Rows with only url/parent from the columnar export (columnar_export.py), or None if absent."""
+    from columnar_export import open_table
+    table = open_table(output_dir, 'urls')
+    if table is None:
+        return None
+    return table.iter_rows(['url', 'parent'])
 
 
 def make_domain(url):
@@ -79,22 +92,311 @@ def write_graph(outpath, graph):
         json.dump(graph, f, ensure_ascii=False, indent=2)
 
 
+# ---------- streaming JSON writer / reader ----------
+
+def _open_text_out(path, compress):
+    if compress:
+        return gzip.open(path, 'wt', encoding='utf-8', compresslevel=6)
+    return open(path, 'w', encoding='utf-8')
+
+
+def write_graph_stream(outpath, nodes, edges, domain_counts=None, fmt='jsonl', compress=None):
+    """
+    Write a graph without building it (or its serialized form) in memory.
+
+    nodes: iterable of node values (URL strings); edges: iterable of (src, dst) pairs, either
+    URLs or 0-based indexes into the node order. fmt='jsonl' writes one object per line:
+        {"type": "node", "id": i, "url": ...} / {"type": "edge", "src": ..., "dst": ...}
+        / {"type": "domain_counts", "counts": {...}}
+    fmt='json' streams the write_graph schema ({"nodes", "edges", "domain_counts"}) compactly,
+    one element per line. compress=None gzips when outpath ends with .gz. domain_counts is
+    serialized last, so it may be a dict that is filled while `nodes` is consumed.
+    Returns (node_count, edge_count).
+    """
+    if compress is None:
+        compress = outpath.endswith('.gz')
+    n_nodes = n_edges = 0
+    dumps = json.dumps
+    with _open_text_out(outpath, compress) as f:
+        if fmt == 'jsonl':
+            for u in nodes:
+                f.write(dumps({'type': 'node', 'id': n_nodes, 'url': u}, ensure_ascii=False) + '\n')
+                n_nodes += 1
+            for s, d in edges:
+                f.write(dumps({'type': 'edge', 'src': s, 'dst': d}, ensure_ascii=False) + '\n')
+                n_edges += 1
+            if domain_counts is not None:
+                f.write(dumps({'type': 'domain_counts', 'counts': domain_counts}, ensure_ascii=False) + '\n')
+        elif fmt == 'json':
+            f.write('{"nodes": [\n')
+            for u in nodes:
+                f.write((',\n' if n_nodes else '') + dumps(u, ensure_ascii=False))
+                n_nodes += 1
+            f.write('\n],\n"edges": [\n')
+            for s, d in edges:
+                f.write((',\n' if n_edges else '') + dumps([s, d], ensure_ascii=False))
+                n_edges += 1
+            f.write('\n],\n"domain_counts": ' + dumps(domain_counts or {}, ensure_ascii=False) + '}\n')
+        else:
+            raise ValueError(f'Unknown stream format: {fmt}')
+    return n_nodes, n_edges
+
+
+def _open_text_in(path):
+    with open(path, 'rb') as f:
+        magic = f.read(2)
+    if magic == b'\x1f\x8b':
+        return gzip.open(path, 'rt', encoding='utf-8')
+    return open(path, 'r', encoding='utf-8')
+
+
+def iter_graph_stream(path):
+    """
+    Stream a graph written by write_graph_stream (either format, gzip detected by magic).
+    Yields ('node', url), ('edge', (src, dst)) and ('domain_counts', dict) events in file order.
+    """
+    with _open_text_in(path) as f:
+        first = f.readline()
+        if first.strip() == '{"nodes": [':
+            section = 'node'
+            for line in f:
+                line = line.rstrip('\n')
+                if line in ('', ']', '],'):
+                    continue
+                if line == '"edges": [':
+                    section = 'edge'
+                    continue
+                if line.startswith('"domain_counts": '):
+                    yield 'domain_counts', json.loads(line[len('"domain_counts": '):-1])
+                    continue
+                item = json.loads(line.rstrip(','))
+                yield (section, tuple(item)) if section == 'edge' else (section, item)
+            return
+        for line in _chain_first(first, f):
+            if not line.strip():
+                continue
+            obj = json.loads(line)
+            typ = obj.get('type')
+            if typ == 'node':
+                yield 'node', obj['url']
+            elif typ == 'edge':
+                yield 'edge', (obj['src'], obj['dst'])
+            elif typ == 'domain_counts':
+                yield 'domain_counts', obj['counts']
+
+
+def _chain_first(first, rest):
+    if first:
+        yield first
+    yield from rest
+
+
+def read_graph_stream(path):
+    """Load a streamed graph into the write_graph dict shape (for small graphs / tests)."""
+    graph = {'nodes': [], 'edges': [], 'domain_counts': {}}
+    for kind, value in iter_graph_stream(path):
+        if kind == 'node':
+            graph['nodes'].append(value)
+        elif kind == 'edge':
+            graph['edges'].append(list(value))
+        else:
+            graph['domain_counts'] = value
+    return graph
+
+
+# ---------- CSR graph from CrawlDB outlinks ----------
+
+class CSRGraph:
+    """
+    Compressed sparse row adjacency over integer node indexes: the outlinks of node i are
+    targets[offsets[i]:offsets[i + 1]]. Node i is CrawlDB nodes.id == i + 1. Both arrays are
+    typed (int64 offsets, int32 targets), about 4 bytes per edge.
+    """
+
+    def __init__(self, offsets, targets):
+        self.offsets = offsets
+        self.targets = targets
+
+    @property
+    def num_nodes(self):
+        return len(self.offsets) - 1
+
+    @property
+    def num_edges(self):
+        return len(self.targets)
+
+    def neighbors(self, i):
+        return self.targets[self.offsets[i]:self.offsets[i + 1]]
+
+    def out_degree(self, i):
+        return self.offsets[i + 1] - self.offsets[i]
+
+    def iter_edges(self):
+        offsets, targets = self.offsets, self.targets
+        for i in range(self.num_nodes):
+            for j in range(offsets[i], offsets[i + 1]):
+                yield i, targets[j]
+
+    def as_numpy(self):
+        """(offsets, targets) as zero-copy numpy views; requires numpy (in requirements.txt)."""
+        try:
+            # optional and slow to import: CSR arrays are stdlib arrays, numpy only wraps them
+            import numpy as np
+        except ImportError:
+            raise RuntimeError('CSRGraph.as_numpy() needs numpy: pip install numpy')
+        return np.frombuffer(self.offsets, dtype=np.int64), np.frombuffer(self.targets, dtype=np.int32)
+
+
+def build_csr_from_db(db):
+    """Build a CSRGraph from a CrawlDB's links table (streamed in (src, dst) order)."""
+    n = db.count_nodes()
+    offsets = array('q', [0]) * (n + 1)
+    targets = array('i')
+    for src, dst in db.iter_links():
+        offsets[src] += 1  # src is 1-based: counts for node src-1 land at index src
+        targets.append(dst - 1)
+    for i in range(1, n + 1):
+        offsets[i] += offsets[i - 1]
+    return CSRGraph(offsets, targets)
+
+
+def iter_db_node_urls(db):
+    """URL of node index 0..n-1 in order ('' for an unused id)."""
+    expected = 1
+    for nid, url in db.iter_nodes():
+        while expected < nid:
+            yield ''
+            expected += 1
+        yield url
+        expected += 1
+
+
+def write_csr(prefix, graph, node_urls):
+    """Write <prefix>.offsets.i64, .targets.i32, .nodes.txt (one URL per node index) and .meta.json."""
+    with open(prefix + '.offsets.i64', 'wb') as f:
+        graph.offsets.tofile(f)
+    with open(prefix + '.targets.i32', 'wb') as f:
+        graph.targets.tofile(f)
+    with open(prefix + '.nodes.txt', 'w', encoding='utf-8') as f:
+        for u in node_urls:
+            f.write(u + '\n')
+    with open(prefix + '.meta.json', 'w', encoding='utf-8') as f:
+        json.dump({'nodes': graph.num_nodes, 'edges': graph.num_edges, 'byteorder': sys.byteorder}, f)
+
+
+def read_csr(prefix):
+    with open(prefix + '.meta.json', 'r', encoding='utf-8') as f:
+        meta = json.load(f)
+    offsets, targets = array('q'), array('i')
+    with open(prefix + '.offsets.i64', 'rb') as f:
+        offsets.frombytes(f.read())
+    with open(prefix + '.targets.i32', 'rb') as f:
+        targets.frombytes(f.read())
+    if meta.get('byteorder', sys.byteorder) != sys.byteorder:
+        offsets.byteswap()
+        targets.byteswap()
+    return CSRGraph(offsets, targets)
+
+
+def read_csr_nodes(prefix):
+    with open(prefix + '.nodes.txt', 'r', encoding='utf-8') as f:
+        return [line.rstrip('\n') for line in f]
+
+
+def write_edge_list(outpath, graph):
+    with open(outpath, 'w', encoding='utf-8') as f:
+        for i in range(graph.num_nodes):
+            nbrs = graph.neighbors(i)
+            if nbrs:
+                f.write(''.join(f'{i}\t{j}\n' for j in nbrs))
+
+
+def graph_from_csr(graph, node_urls):
+    """The JSON graph dict (same shape as build_link_graph) for a CSR graph."""
+    urls = list(node_urls)
+    domain_counts = defaultdict(int)
+    for u in urls:
+        if u:
+            domain_counts[make_domain(u)] += 1
+    edges = sorted([urls[i], urls[j]] for i, j in graph.iter_edges())
+    return {
+        'nodes': sorted(u for u in urls if u),
+        'edges': edges,
+        'domain_counts': dict(sorted(domain_counts.items(), key=lambda kv: kv[1], reverse=True)),
+    }
+
+
 def main():
     parser = argparse.ArgumentParser(description='Export link graph from crawler output')
     parser.add_argument('--output', default='data', help='Crawler output dir (contains urls/urls.csv)')
     parser.add_argument('--out-file', default='link_graph.json', help='Output filename inside output dir')
+    parser.add_argument('--source', choices=['csv', 'columnar'], default='csv',
+                        help='Read urls.csv or the columnar export (columnar_export.py)')
+    parser.add_argument('--from-db', action='store_true', help='Use every outlink edge stored in crawl_state.db')
+    parser.add_argument('--formats', default='json',
+                        help='Comma-separated: json,jsonl,json-stream,csr,edgelist (csr/edgelist need --from-db)')
+    parser.add_argument('--gzip', action='store_true', help='gzip the jsonl / json-stream outputs')
     args = parser.parse_args()
-
-    urls_csv = os.path.join(args.output, 'urls', 'urls.csv')
-    if not os.path.exists(urls_csv):
-        print('ERROR: urls.csv not found in', urls_csv)
+    formats = {f.strip() for f in args.formats.split(',') if f.strip()}
+    if 'json' in formats and 'json-stream' in formats:
+        print('ERROR: json and json-stream both write', args.out_file)
         return 2
+    prefix = os.path.join(args.output, os.path.splitext(args.out_file)[0])
+    suffix = '.gz' if args.gzip else ''
+
+    def write_streams(nodes_fn, edges_fn, domain_counts):
+        for fmt, path in (('jsonl', prefix + '.jsonl' + suffix), ('json', prefix + '.json' + suffix)):
+            if (fmt == 'jsonl' and 'jsonl' in formats) or (fmt == 'json' and 'json-stream' in formats):
+                n, e = write_graph_stream(path, nodes_fn(), edges_fn(), domain_counts, fmt=fmt, compress=args.gzip)
+                print('Wrote streamed link graph: %s (%d nodes, %d edges)' % (path, n, e))
+
+    if args.from_db:
+        from db import CrawlDB
+        db_path = os.path.join(args.output, DB_NAME)
+        if not os.path.exists(db_path):
+            print('ERROR: crawl DB not found in', db_path)
+            return 2
+        db = CrawlDB(db_path)
+        try:
+            graph = build_csr_from_db(db)
+            domain_counts = defaultdict(int)
+
+            def counted_nodes():
+                domain_counts.clear()
+                for u in iter_db_node_urls(db):
+                    if u:
+                        domain_counts[make_domain(u)] += 1
+                    yield u
+
+            # streamed edges are node indexes into the node order
+            write_streams(counted_nodes, graph.iter_edges, domain_counts)
+            if 'csr' in formats:
+                write_csr(prefix, graph, iter_db_node_urls(db))
+                print('Wrote CSR graph: %s.* (%d nodes, %d edges)' % (prefix, graph.num_nodes, graph.num_edges))
+            if 'edgelist' in formats:
+                write_edge_list(prefix + '.edges.tsv', graph)
+                print('Wrote edge list:', prefix + '.edges.tsv')
+            if 'json' in formats:
+                outpath = os.path.join(args.output, args.out_file)
+                write_graph(outpath, graph_from_csr(graph, iter_db_node_urls(db)))
+                print('Wrote link graph:', outpath)
+        finally:
+            db.close()
+        return 0
 
-    rows = read_urls_csv(urls_csv)
+    rows = read_urls_columnar(args.output) if args.source == 'columnar' else None
+    if rows is None:
+        urls_csv = os.path.join(args.output, 'urls', 'urls.csv')
+        if not manifest_segments(urls_csv):
+            print('ERROR: urls.csv not found in', urls_csv)
+            return 2
+        rows = read_urls_csv(urls_csv)
     graph = build_link_graph(rows)
-    outpath = os.path.join(args.output, args.out_file)
-    write_graph(outpath, graph)
-    print('Wrote link graph:', outpath)
+    write_streams(lambda: graph['nodes'], lambda: graph['edges'], graph['domain_counts'])
+    if 'json' in formats:
+        outpath = os.path.join(args.output, args.out_file)
+        write_graph(outpath, graph)
+        print('Wrote link graph:', outpath)
     return 0
 
 
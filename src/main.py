@@ -3,12 +3,18 @@
 Threaded web scraper — Enhanced with graceful SIGTERM handling
 
 Features:
-- Background image downloads in a separate thread pool.
+- Background image downloads through a bounded, prioritized queue (block, drop or spill to the DB when full).
 - Resume capability using SQLite (optional --resume).
 - Verbose/logfile support with rotating logs.
 - **Graceful SIGINT/SIGTERM handling:** catches termination signals, sets a shutdown flag,
   stops accepting new work, persists frontier to the DB (if enabled), and attempts a clean
   shutdown of thread pools so in-progress work has a chance to finish.
+- Optional raw response archive (--archive, WARC-style .warc.gz segments) and --replay of it
+  through parsing / dedup / topic detection without network access.
+- Multi-process mode (--shards N): one crawler process per shard of the domain space, so
+  per-domain politeness stays exact while every core is used.
+- Distributed mode: --serve-frontier HOST:PORT on one machine, --frontier http://HOST:PORT on
+  each crawler; URLs are leased so no two crawlers fetch the same one.
 
 Usage:
   pip install requests beautifulsoup4
@@ -18,8 +24,14 @@ Usage:
 
 import argparse
 import os
+import time
 from urllib.parse import urlparse
-from crawler import threaded_crawl_enhanced
+from autothrottle import THROTTLES
+from budget import GlobalBudget
+from configs import BUDGET_IMAGE_WEIGHT, BUDGET_PAGE_WEIGHT, IMAGE_QUEUE_POLICY, IMAGE_QUEUE_SIZE
+from crawler import Crawler, install_signal_handlers, threaded_crawl_enhanced
+from frontier import FrontierServer, FrontierState, RemoteFrontier
+from url_utils import load_canonical_rules
 # ---------- CLI ----------
 
 def main():
@@ -31,19 +43,114 @@ def main():
     parser.add_argument("--allow-external", action="store_true")
     parser.add_argument("--workers", type=int, default=10)
     parser.add_argument("--image-workers", type=int, default=4)
+    parser.add_argument("--image-queue-size", type=int, default=IMAGE_QUEUE_SIZE,
+                        help="Image jobs held in memory for the image workers")
+    parser.add_argument("--image-queue-policy", choices=["block", "drop", "spill"], default=IMAGE_QUEUE_POLICY,
+                        help="When the image queue is full: block page workers, drop the deepest page's images, "
+                             "or spill them to the resume DB (needs --resume)")
     parser.add_argument("--resume", action="store_true", help="Enable resume using SQLite DB in output dir")
     parser.add_argument("--logfile", type=str, default=None, help="Optional rotating logfile path")
     parser.add_argument("--verbose", action="store_true", help="Enable verbose console logging (DEBUG)")
+    parser.add_argument("--canonical-rules", type=str, default=None, help="JSON file with URL canonicalization rules (global and per-domain)")
+    parser.add_argument("--no-canonicalize", action="store_true", help="Disable URL canonicalization before enqueue")
+    parser.add_argument("--manifest-rotate-rows", type=int, default=0, help="Rotate urls/images CSV manifests every N rows (0 = single file)")
+    parser.add_argument("--manifest-compress", action="store_true", help="Write gzip-compressed CSV manifest segments")
+    parser.add_argument("--domain-burst", type=int, default=None, help="Requests per domain allowed back-to-back before crawl_delay spacing")
+    parser.add_argument("--domain-max-in-flight", type=int, default=None, help="Max concurrent requests per domain (0 = unlimited)")
+    parser.add_argument("--throttle", choices=sorted(THROTTLES), default="legacy",
+                        help="Per-domain throttle policy: legacy delay scaling or AIMD with a p95 latency target")
+    parser.add_argument("--metrics-port", type=int, default=None,
+                        help="Serve Prometheus metrics on 127.0.0.1:PORT/metrics (0 = any free port)")
+    parser.add_argument("--metrics-interval", type=float, default=0,
+                        help="Write metrics.json snapshots to the output dir every N seconds (always written at exit)")
+    parser.add_argument("--stage-timing", action="store_true",
+                        help="Time each hot-path stage; report in stage_timings.json at exit")
+    parser.add_argument("--profile-pages", type=int, default=0, help="Profile the first N pages (report at exit)")
+    parser.add_argument("--profile-mode", choices=["cprofile", "sample"], default="cprofile",
+                        help="cProfile (profile.pstats/profile.txt) or stack sampling (profile.collapsed)")
+    parser.add_argument("--archive", action="store_true",
+                        help="Store raw responses in <output>/archive/*.warc.gz (indexed in the crawl DB) for --replay")
+    parser.add_argument("--replay", type=str, default=None, metavar="CRAWL_DIR",
+                        help="Reprocess the responses archived in CRAWL_DIR (--archive) into --output, without network")
+    parser.add_argument("--shards", type=int, default=1,
+                        help="Worker processes, each owning the domains that hash to it (0 = one per CPU)")
+    parser.add_argument("--frontier", type=str, default=None,
+                        help="Share one crawl between machines: URL of a frontier server (see --serve-frontier)")
+    parser.add_argument("--worker-id", type=str, default=None, help="Name of this crawler at the frontier server (default host-pid)")
+    parser.add_argument("--serve-frontier", type=str, default=None, metavar="HOST:PORT",
+                        help="Run only the shared frontier server for --frontier crawlers (--max-pages is crawl-wide)")
+    parser.add_argument("--lease-ttl", type=float, default=300.0,
+                        help="Seconds a leased URL stays with a crawler before the frontier server hands it out again")
+    parser.add_argument("--max-rps", type=float, default=0, help="Crawl-wide requests/sec budget across all domains (0 = unlimited)")
+    parser.add_argument("--max-bps", type=float, default=0, help="Crawl-wide bytes/sec budget across all domains (0 = unlimited)")
+    parser.add_argument("--page-weight", type=float, default=BUDGET_PAGE_WEIGHT, help="Share of the budget for page fetches")
+    parser.add_argument("--image-weight", type=float, default=BUDGET_IMAGE_WEIGHT, help="Share of the budget for image downloads")
+    parser.add_argument("--budget-control", type=str, default=None,
+                        help="JSON file {max_rps, max_bps, page_weight, image_weight} re-read on change or SIGHUP")
     args = parser.parse_args()
 
+    if args.serve_frontier:
+        host, _, port = args.serve_frontier.rpartition(":")
+        server = FrontierServer(FrontierState(lease_ttl=args.lease_ttl, max_pages=args.max_pages),
+                                host=host or "127.0.0.1", port=int(port))
+        print(f"Frontier server on {server.url} (Ctrl-C to stop)")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.close()
+        return
+
     if not urlparse(args.start_url).scheme:
         print("start_url missing scheme (http:// or https://)")
         return
 
+    crawl_kwargs = dict(max_depth=args.depth, allow_external=args.allow_external, max_workers=args.workers,
+                        image_workers=args.image_workers, image_queue_size=args.image_queue_size,
+                        image_queue_policy=args.image_queue_policy, resume=args.resume, logfile=args.logfile,
+                        verbose=args.verbose, canonicalize=not args.no_canonicalize,
+                        manifest_rotate_rows=args.manifest_rotate_rows, manifest_compress=args.manifest_compress,
+                        domain_burst=args.domain_burst, domain_max_in_flight=args.domain_max_in_flight,
+                        throttle_factory=THROTTLES[args.throttle],
+                        metrics_port=args.metrics_port, metrics_interval=args.metrics_interval,
+                        stage_timing=args.stage_timing, profile_pages=args.profile_pages,
+                        profile_mode=args.profile_mode, archive=args.archive)
+    budget_kwargs = None
+    if args.max_rps or args.max_bps or args.budget_control:
+        budget_kwargs = dict(max_rps=args.max_rps, max_bps=args.max_bps, page_weight=args.page_weight,
+                             image_weight=args.image_weight, control_file=args.budget_control)
+
+    install_signal_handlers()
     os.makedirs(args.output, exist_ok=True)
-    threaded_crawl_enhanced(args.start_url, args.output, max_pages=args.max_pages, max_depth=args.depth,
-                            allow_external=args.allow_external, max_workers=args.workers,
-                            image_workers=args.image_workers, resume=args.resume, logfile=args.logfile, verbose=args.verbose)
+    if args.replay:
+        canonicalizer = load_canonical_rules(args.canonical_rules) if args.canonical_rules else None
+        crawl_kwargs.pop("archive")
+        with Crawler(canonicalizer=canonicalizer, **crawl_kwargs) as crawler:
+            crawler.replay(args.replay, args.output)
+        return
+    if args.frontier and args.shards != 1:
+        print("--frontier and --shards cannot be combined; run one crawler per core instead")
+        return
+    if args.shards != 1:
+        from sharding import sharded_crawl  # multiprocessing is only loaded for sharded runs
+        # each shard process builds its own canonicalizer and its 1/N share of the budget
+        sharded_crawl(args.start_url, args.output, shards=args.shards, max_pages=args.max_pages,
+                      canonical_rules=args.canonical_rules, budget_kwargs=budget_kwargs, **crawl_kwargs)
+        return
+
+    canonicalizer = load_canonical_rules(args.canonical_rules) if args.canonical_rules else None
+
+    # crawl-wide requests/sec and bytes/sec budget shared by page and image workers
+    budget = None
+    if budget_kwargs:
+        budget = GlobalBudget(**budget_kwargs)
+        budget.install_reload_signal()
+
+    frontier_backend = RemoteFrontier(args.frontier, worker_id=args.worker_id) if args.frontier else None
+    threaded_crawl_enhanced(args.start_url, args.output, max_pages=args.max_pages, canonicalizer=canonicalizer,
+                            budget=budget, frontier_backend=frontier_backend, **crawl_kwargs)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,389 @@
+import json
+import logging
+import os
+import time
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Event, Lock, Thread
+
+from profiling import NULL_TIMER, StageTimer
+
+# ---------- In-process metrics (Prometheus text format) ----------
+#
+# Counters, gauges and histograms with optional labels. Hot-path updates are one small lock
+# per series; values that already live elsewhere (frontier size, queue depth, per-domain
+# delay) are callback gauges, read only when someone scrapes or snapshots.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _fmt(v) -> str:
+    if v == float("inf"):
+        return "+Inf"
+    if isinstance(v, float) and v.is_integer() and abs(v) < 1e15:
+        return str(int(v))
+    return repr(v) if isinstance(v, float) else str(v)
+
+
+def _escape(v: str) -> str:
+    return str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _label_str(names, values, extra=None) -> str:
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{n}="{_escape(v)}"' for n, v in pairs) + "}"
+
+
+class _CounterValue:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = Lock()
+
+    def inc(self, amount=1.0):
+        with self._lock:
+            self.value += amount
+
+
+class _GaugeValue(_CounterValue):
+    __slots__ = ()
+
+    def set(self, value):
+        self.value = float(value)
+
+    def dec(self, amount=1.0):
+        self.inc(-amount)
+
+
+class _HistogramValue:
+    __slots__ = ("bounds", "counts", "sum", "count", "_lock")
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = Lock()
+
+    def observe(self, value):
+        i = bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+            self.count += 1
+
+    def cumulative(self):
+        with self._lock:
+            counts, total, n = list(self.counts), self.sum, self.count
+        out, acc = [], 0
+        for bound, c in zip(self.bounds + (float("inf"),), counts):
+            acc += c
+            out.append((bound, acc))
+        return out, total, n
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = Lock()
+        if not self.labelnames:
+            self._default = self.labels()
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values):
+        key = tuple(str(v) for v in values)
+        child = self._children.get(key)
+        if child is None:
+            if len(key) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}, got {values}")
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def series(self):
+        with self._lock:
+            return list(self._children.items())
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _CounterValue()
+
+    def inc(self, amount=1.0):
+        self._default.inc(amount)
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def _new_child(self):
+        return _GaugeValue()
+
+    def set(self, value):
+        self._default.set(value)
+
+    def inc(self, amount=1.0):
+        self._default.inc(amount)
+
+    def dec(self, amount=1.0):
+        self._default.dec(amount)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.bounds = tuple(sorted(float(b) for b in buckets))
+        super().__init__(name, help_text, labelnames)
+
+    def _new_child(self):
+        return _HistogramValue(self.bounds)
+
+    def observe(self, value):
+        self._default.observe(value)
+
+
+class CallbackGauge:
+    """Gauge whose value(s) come from `fn()` at collection time: a number, or {label_values: number}."""
+
+    kind = "gauge"
+
+    def __init__(self, name, help_text, fn, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.fn = fn
+        self.labelnames = tuple(labelnames)
+
+    def values(self):
+        try:
+            v = self.fn()
+        except Exception:
+            logging.debug("Metric callback %s failed", self.name)
+            return []
+        if isinstance(v, dict):
+            return [((k if isinstance(k, tuple) else (k,)), float(x)) for k, x in v.items()]
+        return [((), float(v))]
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name, help_text, labelnames=()):
+        return self._register(Counter(name, help_text, labelnames))
+
+    def gauge(self, name, help_text, labelnames=()):
+        return self._register(Gauge(name, help_text, labelnames))
+
+    def histogram(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self._register(Histogram(name, help_text, labelnames, buckets))
+
+    def gauge_callback(self, name, help_text, fn, labelnames=()):
+        """Register (or replace) a callback gauge."""
+        with self._lock:
+            self._metrics[name] = CallbackGauge(name, help_text, fn, labelnames)
+            return self._metrics[name]
+
+    def metrics(self):
+        with self._lock:
+            return list(self._metrics.values())
+
+    def render_prometheus(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)."""
+        lines = []
+        for m in self.metrics():
+            lines.append(f"# HELP {m.name} {m.help}")
+            lines.append(f"# TYPE {m.name} {m.kind}")
+            if isinstance(m, CallbackGauge):
+                for key, v in m.values():
+                    lines.append(f"{m.name}{_label_str(m.labelnames, key)} {_fmt(v)}")
+            elif isinstance(m, Histogram):
+                for key, child in m.series():
+                    buckets, total, n = child.cumulative()
+                    for bound, c in buckets:
+                        lines.append(f"{m.name}_bucket{_label_str(m.labelnames, key, ('le', _fmt(bound)))} {c}")
+                    lines.append(f"{m.name}_sum{_label_str(m.labelnames, key)} {_fmt(total)}")
+                    lines.append(f"{m.name}_count{_label_str(m.labelnames, key)} {n}")
+            else:
+                for key, child in m.series():
+                    lines.append(f"{m.name}{_label_str(m.labelnames, key)} {_fmt(child.value)}")
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self) -> dict:
+        """JSON-serializable view: {"timestamp", "metrics": {name: {"type", "help", "series": [...]}}}."""
+        out = {}
+        for m in self.metrics():
+            series = []
+            if isinstance(m, CallbackGauge):
+                for key, v in m.values():
+                    series.append({"labels": dict(zip(m.labelnames, key)), "value": v})
+            elif isinstance(m, Histogram):
+                for key, child in m.series():
+                    buckets, total, n = child.cumulative()
+                    series.append({"labels": dict(zip(m.labelnames, key)), "count": n, "sum": total,
+                                   "buckets": {_fmt(b): c for b, c in buckets}})
+            else:
+                for key, child in m.series():
+                    series.append({"labels": dict(zip(m.labelnames, key)), "value": child.value})
+            out[m.name] = {"type": m.kind, "help": m.help, "series": series}
+        return {"timestamp": time.time(), "metrics": out}
+
+
+def instrument_methods(obj, names, histogram):
+    """Wrap obj.<name> for each name so its run time is observed into histogram{op=name}."""
+    for name in names:
+        fn = getattr(obj, name, None)
+        if fn is None:
+            continue
+        child = histogram.labels(name)
+
+        def timed(*args, _fn=fn, _child=child, **kwargs):
+            t0 = time.perf_counter()
+            try:
+                return _fn(*args, **kwargs)
+            finally:
+                _child.observe(time.perf_counter() - t0)
+
+        setattr(obj, name, timed)
+
+
+# ---------- exporters ----------
+
+class MetricsServer:
+    """
+    Serves GET /metrics (Prometheus text) and /metrics.json (snapshot) from a daemon thread.
+    Binds to 127.0.0.1 by default; port 0 picks a free port (see .port).
+    """
+
+    def __init__(self, registry, host="127.0.0.1", port=0):
+        reg = registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                path = self.path.split("?", 1)[0]
+                if path in ("/", "/metrics"):
+                    body = reg.render_prometheus().encode("utf-8")
+                    ctype = "text/plain; version=0.0.4; charset=utf-8"
+                elif path == "/metrics.json":
+                    body = json.dumps(reg.snapshot()).encode("utf-8")
+                    ctype = "application/json"
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", ctype)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                logging.debug("metrics http: " + format, *args)
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self._thread = Thread(target=self.httpd.serve_forever, name="metrics-http", daemon=True)
+        self._thread.start()
+
+    @property
+    def port(self) -> int:
+        return self.httpd.server_address[1]
+
+    def close(self):
+        try:
+            self.httpd.shutdown()
+            self.httpd.server_close()
+        except Exception:
+            logging.debug("Failed to stop metrics server")
+
+
+class SnapshotWriter:
+    """Writes registry.snapshot() to `path` every `interval` seconds (atomic replace) and once on close()."""
+
+    def __init__(self, registry, path, interval=30.0):
+        self.registry = registry
+        self.path = path
+        self.interval = interval
+        self._stop = Event()
+        self._thread = None
+        if interval and interval > 0:
+            self._thread = Thread(target=self._loop, name="metrics-snapshot", daemon=True)
+            self._thread.start()
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            self.write()
+
+    def write(self):
+        tmp = self.path + ".tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(self.registry.snapshot(), f, ensure_ascii=False, indent=2)
+            os.replace(tmp, self.path)
+        except Exception:
+            logging.exception("Failed to write metrics snapshot: %s", self.path)
+
+    def close(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5.0)
+        self.write()
+
+
+# ---------- the crawler's metric set ----------
+
+# CrawlDB methods timed into crawler_db_write_seconds{op}
+DB_WRITE_METHODS = ("add_page", "mark_visited", "add_frontier", "add_image_manifest", "add_links",
+                    "register_content_hash", "mark_page_duplicate", "save_domain_states",
+                    "add_sitemap_urls", "add_image_jobs", "add_archive_records")
+
+
+class CrawlMetrics:
+    """
+    The crawler's standard metrics on one registry; gauges for live state are attached by the
+    crawler. `stages` is a profiling.StageTimer when stage timing is on, else NULL_TIMER.
+    """
+
+    def __init__(self, registry=None, stage_timing=False):
+        r = self.registry = registry if registry is not None else MetricsRegistry()
+        self.stages = NULL_TIMER
+        if stage_timing:
+            self.enable_stage_timing()
+        self.fetch_seconds = r.histogram("crawler_fetch_seconds", "Request to response time", ("kind",))
+        self.fetch_bytes = r.counter("crawler_fetch_bytes_total", "Response body bytes received", ("kind",))
+        self.responses = r.counter("crawler_responses_total", "Responses by kind and HTTP status", ("kind", "code"))
+        self.parse_seconds = r.histogram("crawler_parse_seconds", "HTML parse time per page")
+        self.db_write_seconds = r.histogram("crawler_db_write_seconds", "CrawlDB write call time", ("op",))
+        self.pages = r.counter("crawler_pages_total", "Pages processed")
+
+    def enable_stage_timing(self):
+        if not self.stages.enabled:
+            self.stages = StageTimer(self.registry)
+
+    def observe_fetch(self, kind, seconds, status, nbytes):
+        self.fetch_seconds.labels(kind).observe(seconds)
+        if nbytes:
+            self.fetch_bytes.labels(kind).inc(nbytes)
+        self.responses.labels(kind, status).inc()
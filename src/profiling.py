@@ -0,0 +1,264 @@
+import io
+import json
+import logging
+import os
+import sys
+import time
+from collections import Counter
+from threading import Event, Lock, Thread, get_ident
+
+# ---------- Per-stage timing and page profiling ----------
+#
+#   with metrics.stages.stage("parse"):
+#       parse_html_page(...)
+#
+# With stage timing off, metrics.stages is NULL_TIMER and stage() returns one shared no-op
+# context manager, so instrumented code costs a method call per stage.
+
+STAGE_BUCKETS = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class _NullStage:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+class NullStageTimer:
+    enabled = False
+
+    def stage(self, name):
+        return _NULL_STAGE
+
+    def report(self) -> dict:
+        return {}
+
+
+NULL_TIMER = NullStageTimer()
+
+
+class _Stage:
+    __slots__ = ("_hist", "_stats", "_t0")
+
+    def __init__(self, hist, stats):
+        self._hist = hist
+        self._stats = stats
+
+    def __enter__(self):
+        self._t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        dt = time.perf_counter() - self._t0
+        self._hist.observe(dt)
+        self._stats.add(dt)
+        return False
+
+
+class _StageStats:
+    __slots__ = ("total", "max", "_lock")
+
+    def __init__(self):
+        self.total = 0.0
+        self.max = 0.0
+        self._lock = Lock()
+
+    def add(self, dt):
+        with self._lock:
+            self.total += dt
+            if dt > self.max:
+                self.max = dt
+
+
+class StageTimer:
+    """
+    Times named stages into crawler_stage_seconds{stage} histograms on `registry` (a
+    metrics.MetricsRegistry) plus exact total / max per stage. report() gives count, total,
+    mean, max and p50 / p95 (bucket upper bounds) per stage, slowest total first.
+    """
+
+    enabled = True
+
+    def __init__(self, registry, buckets=STAGE_BUCKETS):
+        self._hist = registry.histogram("crawler_stage_seconds", "Time per hot-path stage", ("stage",), buckets)
+        self._stages = {}
+        self._lock = Lock()
+
+    def stage(self, name):
+        entry = self._stages.get(name)
+        if entry is None:
+            with self._lock:
+                entry = self._stages.setdefault(name, (self._hist.labels(name), _StageStats()))
+        return _Stage(*entry)
+
+    def report(self) -> dict:
+        out = {}
+        for name, (hist, stats) in list(self._stages.items()):
+            buckets, _, n = hist.cumulative()
+
+            def quantile(q):
+                for bound, c in buckets:
+                    if c >= q * n:
+                        return bound if bound != float("inf") else stats.max
+                return stats.max
+
+            out[name] = {
+                "count": n,
+                "total": stats.total,
+                "mean": stats.total / n if n else 0.0,
+                "max": stats.max,
+                "p50": quantile(0.5) if n else 0.0,
+                "p95": quantile(0.95) if n else 0.0,
+            }
+        return dict(sorted(out.items(), key=lambda kv: kv[1]["total"], reverse=True))
+
+
+class PageProfiler:
+    """
+    Profiles the first `pages` pages processed.
+
+    mode="cprofile": each page runs under its own cProfile.Profile (one page at a time; pages
+    arriving while another is being profiled run unprofiled) and the results are merged.
+    mode="sample": a background thread samples the stacks of threads currently inside page()
+    every `interval` seconds and aggregates them as collapsed stacks (flamegraph input).
+    """
+
+    def __init__(self, pages, mode="cprofile", interval=0.005):
+        if mode not in ("cprofile", "sample"):
+            raise ValueError(f"Unknown profile mode: {mode}")
+        self.pages = int(pages)
+        self.mode = mode
+        self.interval = interval
+        self.profiled = 0
+        self._lock = Lock()
+        self._busy = Lock()
+        self._stats = None
+        self._active = set()
+        self._samples = Counter()
+        self._stop = Event()
+        self._sampler = None
+        if mode == "sample" and self.pages > 0:
+            self._sampler = Thread(target=self._sample_loop, name="page-sampler", daemon=True)
+            self._sampler.start()
+
+    def _claim(self) -> bool:
+        with self._lock:
+            if self.profiled >= self.pages:
+                return False
+            self.profiled += 1
+            return True
+
+    def page(self):
+        return _ProfiledPage(self)
+
+    # cProfile (cProfile / pstats are only imported when a page is actually profiled)
+    def _start_cprofile(self):
+        if not self._busy.acquire(blocking=False):
+            return None
+        if not self._claim():
+            self._busy.release()
+            return None
+        import cProfile
+        prof = cProfile.Profile()
+        prof.enable()
+        return prof
+
+    def _stop_cprofile(self, prof):
+        prof.disable()
+        try:
+            import pstats
+            if self._stats is None:
+                self._stats = pstats.Stats(prof)
+            else:
+                self._stats.add(prof)
+        finally:
+            self._busy.release()
+
+    # sampling
+    def _sample_loop(self):
+        me = get_ident()
+        while not self._stop.wait(self.interval):
+            active = set(self._active)
+            if not active:
+                continue
+            for tid, frame in sys._current_frames().items():
+                if tid == me or tid not in active:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                self._samples[";".join(reversed(stack))] += 1
+
+    def write(self, output_base) -> list:
+        """Write the profile report(s) into output_base; returns the paths written."""
+        self._stop.set()
+        if self._sampler is not None:
+            self._sampler.join(timeout=2.0)
+        paths = []
+        if self.mode == "cprofile" and self._stats is not None:
+            import pstats
+            raw = os.path.join(output_base, "profile.pstats")
+            self._stats.dump_stats(raw)
+            buf = io.StringIO()
+            pstats.Stats(raw, stream=buf).sort_stats("cumulative").print_stats(50)
+            txt = os.path.join(output_base, "profile.txt")
+            with open(txt, "w", encoding="utf-8") as f:
+                f.write(f"# cProfile of {self.profiled} pages\n")
+                f.write(buf.getvalue())
+            paths += [raw, txt]
+        elif self.mode == "sample" and self._samples:
+            path = os.path.join(output_base, "profile.collapsed")
+            with open(path, "w", encoding="utf-8") as f:
+                for stack, n in self._samples.most_common():
+                    f.write(f"{stack} {n}\n")
+            paths.append(path)
+        return paths
+
+
+class _ProfiledPage:
+    __slots__ = ("_p", "_prof", "_tid")
+
+    def __init__(self, profiler):
+        self._p = profiler
+        self._prof = None
+        self._tid = None
+
+    def __enter__(self):
+        p = self._p
+        if p.profiled >= p.pages:
+            return self
+        if p.mode == "cprofile":
+            self._prof = p._start_cprofile()
+        elif p._claim():
+            self._tid = get_ident()
+            p._active.add(self._tid)
+        return self
+
+    def __exit__(self, *exc):
+        if self._prof is not None:
+            self._p._stop_cprofile(self._prof)
+        elif self._tid is not None:
+            self._p._active.discard(self._tid)
+        return False
+
+
+def write_stage_report(path, timer, extra=None):
+    """Dump timer.report() (plus `extra` keys) as JSON; returns the report."""
+    report = {"stages": timer.report()}
+    if extra:
+        report.update(extra)
+    try:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    except Exception:
+        logging.exception("Failed to write stage timing report: %s", path)
+    return report
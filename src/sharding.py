@@ -0,0 +1,269 @@
+import json
+import logging
+import multiprocessing
+import os
+import queue
+import time
+import zlib
+
+from budget import GlobalBudget
+from crawler import install_signal_handlers, shutdown_event, threaded_crawl_enhanced
+from url_utils import domain_of, load_canonical_rules
+
+# ---------- Multi-process crawling, sharded by domain ----------
+#
+# The coordinator starts N worker processes; worker i runs threaded_crawl_enhanced for the
+# domains with shard_of(domain, N) == i, in <output>/shard-<i>/ with its own CrawlDB,
+# manifests and DomainLimiters. A domain is only ever fetched by its owning shard, so its
+# politeness state (crawl delay, robots.txt, in-flight cap) is exact. Links and image jobs
+# for other shards' domains travel through one multiprocessing queue per shard.
+#
+# Termination: `active` counts shards that are not idle and `pending` counts batches put on
+# a queue and not yet taken. A sender bumps `pending` before it can go idle, and a receiver
+# becomes active before it lowers `pending`, so work exists somewhere while either is
+# non-zero; when both are zero every shard stops.
+
+
+def shard_of(domain: str, shards: int) -> int:
+    """Stable shard index for `domain` (same in every process and Python run)."""
+    return zlib.crc32(domain.lower().encode("utf-8")) % shards if shards > 1 else 0
+
+
+class ShardRouter:
+    """
+    Per-process side of a sharded crawl, passed to threaded_crawl_enhanced as link_router.
+
+    inboxes[i] is shard i's queue of message batches; each message is
+    ("page", url, depth, parent) or ("image", img_url, page_depth, page_url). `active`, `pending`
+    and `pages` are multiprocessing.Value('i') counters shared by all shards.
+    """
+
+    def __init__(self, index, shards, inboxes, active, pending, pages, max_pages):
+        self.index = index
+        self.shards = shards
+        self.inboxes = inboxes
+        self.active = active
+        self.pending = pending
+        self.pages = pages
+        self.max_pages = max_pages
+        self.idle = False
+        self.sent_pages = 0
+        self.sent_images = 0
+        self.received = 0
+        self._sent = set()
+        self._held = []
+        self._owner = {}
+
+    def owner(self, url: str) -> int:
+        d = domain_of(url)
+        i = self._owner.get(d)
+        if i is None:
+            i = self._owner[d] = shard_of(d, self.shards)
+        return i
+
+    def owns(self, url: str) -> bool:
+        return self.owner(url) == self.index
+
+    def _put(self, shard, batch):
+        with self.pending.get_lock():
+            self.pending.value += 1
+        self.inboxes[shard].put(batch)
+
+    def route(self, items):
+        """Send (url, depth, parent) items owned by other shards; returns the ones owned here."""
+        local = []
+        out = {}
+        for item in items:
+            shard = self.owner(item[0])
+            if shard == self.index:
+                local.append(item)
+            elif item[0] not in self._sent:
+                self._sent.add(item[0])
+                out.setdefault(shard, []).append(("page",) + tuple(item))
+        for shard, batch in out.items():
+            self._put(shard, batch)
+            self.sent_pages += len(batch)
+        return local
+
+    def send_image(self, img_url, page_url, depth=0):
+        if img_url in self._sent:
+            return
+        self._sent.add(img_url)
+        self._put(self.owner(img_url), [("image", img_url, depth, page_url)])
+        self.sent_images += 1
+
+    def _take(self, block=False, timeout=None):
+        try:
+            batch = self.inboxes[self.index].get(block, timeout)
+        except queue.Empty:
+            return False
+        if self.idle:
+            with self.active.get_lock():
+                self.active.value += 1
+            self.idle = False
+        with self.pending.get_lock():
+            self.pending.value -= 1
+        self._held.extend(batch)
+        self.received += len(batch)
+        return True
+
+    def receive(self):
+        """Every message waiting for this shard (non-blocking)."""
+        while self._take():
+            pass
+        out, self._held = self._held, []
+        return out
+
+    def wait_idle(self, timeout=0.2) -> bool:
+        """
+        Called when this shard has nothing to do. Returns True when the crawl is over (no
+        shard active, nothing in transit, or the page cap reached); otherwise waits up to
+        `timeout` for a message (picked up by the next receive()) and returns False.
+        """
+        if not self.idle:
+            self.idle = True
+            with self.active.get_lock():
+                self.active.value -= 1
+        if self.exhausted() or self.quiescent():
+            return True
+        self._take(block=True, timeout=timeout)
+        return False
+
+    def quiescent(self) -> bool:
+        with self.active.get_lock(), self.pending.get_lock():
+            return self.active.value == 0 and self.pending.value == 0
+
+    def page_done(self):
+        with self.pages.get_lock():
+            self.pages.value += 1
+
+    def exhausted(self) -> bool:
+        return self.pages.value >= self.max_pages
+
+    def drain(self):
+        """Messages left in this shard's queue at exit."""
+        return self.receive()
+
+    def close(self):
+        # queued data may be lost if a peer already exited; never hang at interpreter exit on it
+        for q in self.inboxes:
+            q.cancel_join_thread()
+
+    def get_stats(self) -> dict:
+        return {
+            "shard": self.index,
+            "sent_pages": self.sent_pages,
+            "sent_images": self.sent_images,
+            "received": self.received,
+            "domains_seen": len(self._owner),
+        }
+
+
+def _shard_log_path(logfile, index):
+    if not logfile:
+        return None
+    root, ext = os.path.splitext(logfile)
+    return f"{root}.shard{index}{ext}"
+
+
+def _shard_main(index, shards, inboxes, active, pending, pages, start_url, output_base, max_pages,
+                canonical_rules, budget_kwargs, crawl_kwargs):
+    # SIGTERM from the coordinator: save the frontier and stop like a single-process crawl
+    install_signal_handlers()
+    router = ShardRouter(index, shards, inboxes, active, pending, pages, max_pages)
+    kwargs = dict(crawl_kwargs)
+    if canonical_rules:
+        kwargs["canonicalizer"] = load_canonical_rules(canonical_rules)
+    if budget_kwargs:
+        kwargs["budget"] = GlobalBudget(share=1.0 / shards, **budget_kwargs)
+    if kwargs.get("metrics_port"):
+        kwargs["metrics_port"] += index
+    kwargs["logfile"] = _shard_log_path(kwargs.get("logfile"), index)
+    os.makedirs(output_base, exist_ok=True)
+    try:
+        threaded_crawl_enhanced(start_url, output_base, max_pages=max_pages, link_router=router, **kwargs)
+    finally:
+        if not router.idle:
+            with active.get_lock():
+                active.value -= 1
+            router.idle = True
+        try:
+            with open(os.path.join(output_base, "shard_stats.json"), "w", encoding="utf-8") as f:
+                json.dump(router.get_stats(), f, indent=2)
+        except Exception:
+            logging.exception("Failed to write shard stats")
+        router.close()
+
+
+def sharded_crawl(start_url, output_base, shards=0, max_pages=200, canonical_rules=None, budget_kwargs=None,
+                  **crawl_kwargs):
+    """
+    Crawl with `shards` worker processes (0 = one per CPU), each owning the domains that hash
+    to it. Output goes to <output_base>/shard-<i>/ plus a <output_base>/shards.json summary.
+
+    max_pages is crawl-wide (approximate: shards stop once the shared count reaches it, pages
+    already in flight still finish). crawl_kwargs are passed to threaded_crawl_enhanced and
+    must be picklable; the canonicalizer comes from the `canonical_rules` file and the budget
+    from `budget_kwargs` (GlobalBudget arguments, split evenly across shards). metrics_port
+    P serves shard i on P + i; logfile gets a .shard<i> suffix.
+
+    Without allow_external every page is on the start URL's domain, so one shard does all the
+    page fetching.
+    """
+    shards = int(shards) or os.cpu_count() or 1
+    if not crawl_kwargs.get("allow_external"):
+        logging.warning("Sharded crawl without allow_external: all pages belong to one domain and one shard")
+    os.makedirs(output_base, exist_ok=True)
+    ctx = multiprocessing.get_context("spawn")
+    inboxes = [ctx.Queue() for _ in range(shards)]
+    active = ctx.Value("i", shards)
+    pending = ctx.Value("i", 0)
+    pages = ctx.Value("i", 0)
+    procs = []
+    for i in range(shards):
+        out = os.path.join(output_base, f"shard-{i}")
+        p = ctx.Process(target=_shard_main, name=f"crawl-shard-{i}",
+                        args=(i, shards, inboxes, active, pending, pages, start_url, out, max_pages,
+                              canonical_rules, budget_kwargs, crawl_kwargs))
+        p.start()
+        procs.append(p)
+    logging.info("Started %d crawl shards (start URL owned by shard %d)", shards, shard_of(domain_of(start_url), shards))
+
+    started = time.time()
+    forwarded = False
+    try:
+        while any(p.is_alive() for p in procs):
+            failed = [p.name for p in procs if p.exitcode not in (None, 0)]
+            if failed and not forwarded:
+                # URLs routed to a dead shard would keep the others waiting forever
+                logging.error("Shard process(es) failed: %s - stopping the crawl", ", ".join(failed))
+            if (shutdown_event.is_set() or failed) and not forwarded:
+                # workers save their frontier and stop on SIGTERM, like a single-process crawl
+                for p in procs:
+                    if p.is_alive():
+                        p.terminate()
+                forwarded = True
+            for p in procs:
+                p.join(timeout=0.2)
+    finally:
+        for q in inboxes:
+            q.cancel_join_thread()
+
+    summary = {"shards": shards, "pages": pages.value, "elapsed_s": round(time.time() - started, 3), "per_shard": []}
+    for i, p in enumerate(procs):
+        out = os.path.join(output_base, f"shard-{i}")
+        entry = {"shard": i, "output": out, "exitcode": p.exitcode}
+        try:
+            with open(os.path.join(out, "shard_stats.json"), encoding="utf-8") as f:
+                entry.update(json.load(f))
+        except (OSError, ValueError):
+            pass
+        summary["per_shard"].append(entry)
+    try:
+        with open(os.path.join(output_base, "shards.json"), "w", encoding="utf-8") as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+    except Exception:
+        logging.exception("Failed to write shard summary")
+    logging.info("Sharded crawl finished: %d pages over %d shards in %.1fs", summary["pages"], shards,
+                 summary["elapsed_s"])
+    return summary
@@ -0,0 +1,274 @@
+import gzip
+import io
+import logging
+import queue
+import time
+import xml.etree.ElementTree as ET
+from collections import deque
+from threading import Event, Thread
+from urllib.parse import urlparse
+
+from configs import (SITEMAP_BATCH, SITEMAP_MAX_BYTES, SITEMAP_MAX_DEPTH, SITEMAP_MAX_URLS, SITEMAP_TIMEOUT,
+                     USER_AGENT)
+
+# ---------- Streaming sitemap ingestion ----------
+#
+# Sitemaps are parsed incrementally (iterparse, clearing each finished <url>), so a file with
+# millions of entries never sits in memory as a tree. Sitemap indexes are followed up to
+# SITEMAP_MAX_DEPTH levels, gzip bodies (.xml.gz or gzip magic) are decompressed on the fly,
+# and robots.txt `Sitemap:` lines are used alongside /sitemap.xml.
+
+
+class _LimitedReader(io.RawIOBase):
+    """Stops with an error once more than `limit` bytes were read (guards against gzip bombs)."""
+
+    def __init__(self, stream, limit):
+        self._stream = stream
+        self._limit = limit
+        self._left = limit
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        data = self._stream.read(min(len(b), self._left + 1))
+        if len(data) > self._left:
+            raise ValueError("sitemap larger than %d bytes" % self._limit)
+        self._left -= len(data)
+        b[:len(data)] = data
+        return len(data)
+
+
+def open_sitemap_body(resp, max_bytes=SITEMAP_MAX_BYTES):
+    """Binary file object over a (streamed) response body, gunzipped when it is gzip data."""
+    raw = getattr(resp, "raw", None)
+    if raw is None or not hasattr(raw, "read"):
+        raw = io.BytesIO(resp.content or b"")
+    else:
+        try:
+            raw.decode_content = True  # Content-Encoding: gzip is undone by urllib3
+        except Exception:
+            pass
+    # read through our own wrapper: urllib3 closes the raw stream at EOF, which a
+    # BufferedReader directly on top of it reports as "read of closed file"
+    stream = io.BufferedReader(_LimitedReader(raw, max_bytes))
+    if stream.peek(2)[:2] == b"\x1f\x8b":
+        stream = io.BufferedReader(_LimitedReader(gzip.GzipFile(fileobj=stream), max_bytes))
+    return stream
+
+
+def iter_sitemap(stream):
+    """
+    Yield ("url", loc, lastmod) for <urlset> entries and ("sitemap", loc, lastmod) for
+    <sitemapindex> entries of a sitemap file object, without building the whole tree.
+    Namespaces are ignored. A malformed document ends the iteration (after the entries
+    before the error).
+    """
+    root = None
+    loc = lastmod = None
+    try:
+        for event, elem in ET.iterparse(stream, events=("start", "end")):
+            if event == "start":
+                if root is None:
+                    root = elem
+                continue
+            tag = elem.tag.rsplit("}", 1)[-1]
+            if tag == "loc":
+                loc = (elem.text or "").strip()
+            elif tag == "lastmod":
+                lastmod = (elem.text or "").strip() or None
+            elif tag in ("url", "sitemap"):
+                if loc:
+                    yield tag, loc, lastmod
+                loc = lastmod = None
+                # drop finished entries: root keeps no children, memory stays flat
+                root.clear()
+    except ET.ParseError as e:
+        logging.debug("Sitemap parse stopped: %s", e)
+
+
+class SitemapLoader:
+    """
+    Ingests a site's sitemaps from a background thread while the crawl runs.
+
+    Sources: <scheme>://<host>/sitemap.xml of the start URL plus every robots.txt `Sitemap:`
+    line; indexes are followed up to `max_depth` levels. URLs are canonicalized with
+    `canonicalize`, written to `db` in batches of `batch` (add_sitemap_urls: page row with
+    lastmod + frontier row) and the first `forward_limit` of them are put on `out` as lists of
+    (url, 0, "sitemap") for the crawler's frontier. Without a DB ingestion stops once
+    `forward_limit` URLs were forwarded; with one it continues up to `max_urls`, so the rest
+    waits in the DB frontier for the next --resume run.
+
+    Requests go through the domain's limiter (robots rules, crawl delay) and the budget.
+    """
+
+    def __init__(self, session, limiter_for, out, db=None, canonicalize=None, forward_limit=None,
+                 max_urls=SITEMAP_MAX_URLS, max_depth=SITEMAP_MAX_DEPTH, batch=SITEMAP_BATCH, stop_event=None,
+                 budget=None, metrics=None):
+        self.session = session
+        self.limiter_for = limiter_for
+        self.out = out
+        self.db = db
+        self.canonicalize = canonicalize
+        self.forward_limit = forward_limit
+        self.max_urls = max_urls
+        self.max_depth = max_depth
+        self.batch = batch
+        self.stop_event = stop_event if stop_event is not None else Event()
+        self._stopped = Event()
+        self.budget = budget
+        self.metrics = metrics
+        self.sitemaps = 0
+        self.indexes = 0
+        self.urls = 0
+        self.forwarded = 0
+        self.errors = 0
+        self._buf = []
+        self._thread = None
+
+    # ---- control ----
+
+    def start(self, start_url):
+        self._thread = Thread(target=self._run, args=(start_url,), name="sitemap-loader", daemon=True)
+        self._thread.start()
+        return self
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def join(self, timeout=None):
+        """Wait for ingestion to finish on its own."""
+        if self._thread is not None:
+            self._thread.join(timeout=timeout)
+
+    def stop(self, timeout=2.0):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join(timeout=timeout)
+
+    def _should_stop(self) -> bool:
+        if self._stopped.is_set() or self.stop_event.is_set() or self.urls >= self.max_urls:
+            return True
+        # without a DB there is nowhere to keep URLs the crawl will not reach
+        return self.db is None and self.forward_limit is not None and self.forwarded >= self.forward_limit
+
+    # ---- ingestion ----
+
+    def discover(self, start_url):
+        """Sitemap URLs for the start URL's site: /sitemap.xml plus robots.txt Sitemap: lines."""
+        p = urlparse(start_url)
+        found = [f"{p.scheme}://{p.netloc}/sitemap.xml"]
+        try:
+            found += self.limiter_for(start_url).rp.site_maps() or []
+        except Exception:
+            logging.debug("No robots.txt sitemaps for %s", start_url)
+        return list(dict.fromkeys(u.strip() for u in found if u and u.strip()))
+
+    def _run(self, start_url):
+        started = time.time()
+        todo = deque((u, 0) for u in self.discover(start_url))
+        done = set()
+        try:
+            while todo and not self._should_stop():
+                url, depth = todo.popleft()
+                if url in done:
+                    continue
+                done.add(url)
+                for sub in self._ingest(url):
+                    if depth < self.max_depth and sub not in done:
+                        todo.append((sub, depth + 1))
+            self._flush()
+        except Exception:
+            self.errors += 1
+            logging.exception("Sitemap ingestion failed")
+        logging.info("Sitemaps: %d files (%d indexes), %d URLs, %d queued for this run in %.1fs", self.sitemaps,
+                     self.indexes, self.urls, self.forwarded, time.time() - started)
+
+    def _get(self, url):
+        dl = self.limiter_for(url)
+        if not dl.can_fetch(url):
+            logging.debug("Sitemap blocked by robots: %s", url)
+            return None
+        if dl.wait_for_slot() is False:
+            return None
+        try:
+            if self.budget is not None:
+                self.budget.acquire("page")
+            start = time.perf_counter()
+            resp = self.session.get(url, headers={"User-Agent": USER_AGENT}, timeout=SITEMAP_TIMEOUT, stream=True)
+            elapsed = time.perf_counter() - start
+        finally:
+            dl.release_slot()
+        try:
+            dl.record_response(elapsed, resp.status_code)
+        except Exception:
+            logging.debug("Failed to record sitemap response for %s", url)
+        if self.metrics is not None:
+            self.metrics.observe_fetch("sitemap", elapsed, resp.status_code, 0)
+        if resp.status_code != 200:
+            logging.debug("Sitemap %s: HTTP %s", url, resp.status_code)
+            return None
+        return resp
+
+    def _ingest(self, url):
+        """Stream one sitemap file; returns the nested sitemap URLs it lists."""
+        nested = []
+        try:
+            resp = self._get(url)
+        except Exception as e:
+            self.errors += 1
+            logging.debug("Sitemap fetch failed: %s (%s)", url, e)
+            return nested
+        if resp is None:
+            return nested
+        n = 0
+        try:
+            for kind, loc, lastmod in iter_sitemap(open_sitemap_body(resp)):
+                if kind == "sitemap":
+                    nested.append(loc)
+                    continue
+                if self.canonicalize is not None:
+                    loc = self.canonicalize(loc)
+                self._buf.append((loc, lastmod))
+                self.urls += 1
+                n += 1
+                if len(self._buf) >= self.batch:
+                    self._flush()
+                if self._should_stop():
+                    break
+        except Exception as e:
+            self.errors += 1
+            logging.warning("Sitemap %s: stopped after %d URLs (%s)", url, n, e)
+        finally:
+            close = getattr(resp, "close", None)
+            if close:
+                close()
+        self.sitemaps += 1
+        if nested:
+            self.indexes += 1
+        logging.info("Sitemap %s: %d URLs, %d nested sitemaps", url, n, len(nested))
+        return nested
+
+    def _flush(self):
+        rows, self._buf = self._buf, []
+        if not rows:
+            return
+        if self.db is not None:
+            self.db.add_sitemap_urls(rows)
+        if self.forward_limit is None or self.forwarded < self.forward_limit:
+            room = len(rows) if self.forward_limit is None else self.forward_limit - self.forwarded
+            items = [(u, 0, "sitemap") for u, _ in rows[:room]]
+            self.forwarded += len(items)
+            self.out.put(items)
+
+    def wait(self, timeout):
+        """Block up to `timeout` for the next batch; returns it or None."""
+        try:
+            return self.out.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def get_stats(self) -> dict:
+        return {"sitemaps": self.sitemaps, "indexes": self.indexes, "urls": self.urls, "forwarded": self.forwarded,
+                "errors": self.errors}
@@ -1,4 +1,11 @@
-from urllib.parse import urlparse, urljoin, urldefrag
+import fnmatch
+import json
+import re
+import string
+from threading import Lock
+from urllib.parse import urlparse, urljoin, urldefrag, urlsplit, urlunsplit, unquote
+
+from configs import CANONICAL_INDEX_PAGES, CANONICAL_RULES, CANONICAL_SEEN_LIMIT, CANONICAL_TRACKING_PARAMS
 
 def normalize_url(base: str, link: str):
     if not link:
@@ -25,4 +32,186 @@ def domain_of(url: str):
     try:
         return urlparse(url).netloc.lower()
     except Exception:
-        return ""
\ No newline at end of file
+        return ""
+
+
+# ---------- Canonicalization pipeline ----------
+
+_PCT_RE = re.compile(r"%([0-9A-Fa-f]{2})")
+_UNRESERVED = frozenset(string.ascii_letters + string.digits + "-._~")
+_PATH_SESSION_RE = re.compile(r";(jsessionid|phpsessid|sid)=[^/?]*", re.IGNORECASE)
+
+
+def _normalize_percent(s: str) -> str:
+    # decode escaped unreserved characters, uppercase the hex of everything else (RFC 3986 6.2.2)
+    def repl(m):
+        ch = chr(int(m.group(1), 16))
+        if ch in _UNRESERVED:
+            return ch
+        return "%" + m.group(1).upper()
+    return _PCT_RE.sub(repl, s)
+
+
+def _query_pairs(query: str):
+    return [p for p in query.split("&") if p]
+
+
+def _param_name(pair: str) -> str:
+    return unquote(pair.split("=", 1)[0]).lower()
+
+
+def _rule_lowercase_host(parts, ctx):
+    return parts._replace(scheme=parts.scheme.lower(), netloc=parts.netloc.lower())
+
+
+def _rule_normalize_percent(parts, ctx):
+    return parts._replace(path=_normalize_percent(parts.path), query=_normalize_percent(parts.query))
+
+
+def _rule_strip_tracking(parts, ctx):
+    path = _PATH_SESSION_RE.sub("", parts.path)
+    patterns = ctx["drop_params"]
+    kept = [p for p in _query_pairs(parts.query)
+            if not any(fnmatch.fnmatchcase(_param_name(p), pat) for pat in patterns)]
+    return parts._replace(path=path, query="&".join(kept))
+
+
+def _rule_sort_query(parts, ctx):
+    # stable sort on the parameter name keeps repeated keys (a=2&a=1) in their original order
+    pairs = sorted(_query_pairs(parts.query), key=lambda p: p.split("=", 1)[0])
+    return parts._replace(query="&".join(pairs))
+
+
+def _rule_strip_index(parts, ctx):
+    head, _, last = parts.path.rpartition("/")
+    if last.lower() in ctx["index_pages"]:
+        return parts._replace(path=head + "/")
+    return parts
+
+
+def _rule_strip_trailing_slash(parts, ctx):
+    if len(parts.path) > 1 and parts.path.endswith("/"):
+        return parts._replace(path=parts.path.rstrip("/") or "/")
+    return parts
+
+
+CANONICAL_RULE_FUNCS = {
+    "lowercase_host": _rule_lowercase_host,
+    "normalize_percent": _rule_normalize_percent,
+    "strip_tracking": _rule_strip_tracking,
+    "sort_query": _rule_sort_query,
+    "strip_index": _rule_strip_index,
+    "strip_trailing_slash": _rule_strip_trailing_slash,
+}
+
+
+class UrlCanonicalizer:
+    """
+    Rewrites normalized URLs into one canonical form so that variants of the same page
+    (tracking params, query order, index.html, escaping case, trailing slash) are only
+    enqueued once.
+
+    Rules run in the configured order. `domain_rules` maps a host (or a parent domain,
+    matched by suffix) to either a list of rule names, which replaces the default list, or
+    a dict with optional "rules" and "drop_params" keys.
+
+    The counters of get_stats() cover one crawl (reset()). The URLs they are computed from
+    are remembered up to `max_seen` raw URLs; past that the memory starts over, so a link
+    first seen before is counted again.
+    """
+
+    def __init__(self, rules=None, domain_rules=None, drop_params=None, index_pages=None,
+                 max_seen=CANONICAL_SEEN_LIMIT):
+        self.rules = list(CANONICAL_RULES if rules is None else rules)
+        self.drop_params = [p.lower() for p in (CANONICAL_TRACKING_PARAMS if drop_params is None else drop_params)]
+        self.index_pages = frozenset(p.lower() for p in (CANONICAL_INDEX_PAGES if index_pages is None else index_pages))
+        self.domain_rules = {}
+        for dom, spec in (domain_rules or {}).items():
+            if isinstance(spec, dict):
+                rs = spec.get("rules", self.rules)
+                dp = self.drop_params + [p.lower() for p in spec.get("drop_params", [])]
+            else:
+                rs, dp = spec, self.drop_params
+            self.domain_rules[dom.lower()] = (list(rs), dp)
+        for name in self.rules + [r for rs, _ in self.domain_rules.values() for r in rs]:
+            if name not in CANONICAL_RULE_FUNCS:
+                raise ValueError(f"Unknown canonicalization rule: {name}")
+        self._lock = Lock()
+        self.max_seen = int(max_seen)
+        self.reset()
+
+    def reset(self):
+        """Forget the URLs seen and zero the counters (a new crawl)."""
+        with self._lock:
+            self._raw_seen = set()
+            self._canonical_seen = set()
+            self.links_seen = 0
+            self.links_rewritten = 0
+            self.fetches_avoided = 0
+
+    def _rules_for(self, host: str):
+        h = host
+        while h:
+            if h in self.domain_rules:
+                return self.domain_rules[h]
+            if "." not in h:
+                break
+            h = h.split(".", 1)[1]
+        return self.rules, self.drop_params
+
+    def canonicalize(self, url: str):
+        if not url:
+            return url
+        try:
+            parts = urlsplit(url)
+            rules, drop_params = self._rules_for((parts.hostname or "").lower())
+            ctx = {"drop_params": drop_params, "index_pages": self.index_pages}
+            for name in rules:
+                parts = CANONICAL_RULE_FUNCS[name](parts, ctx)
+            return urlunsplit(parts._replace(fragment=""))
+        except Exception:
+            return url
+
+    def observe(self, raw_url: str, canonical_url: str):
+        """
+        Record that `raw_url` was rewritten to `canonical_url` before enqueue. Every distinct
+        raw variant after the first one mapping to the same canonical URL is one fetch avoided.
+        """
+        with self._lock:
+            if raw_url in self._raw_seen:
+                return
+            if len(self._raw_seen) >= self.max_seen:
+                self._raw_seen.clear()
+                self._canonical_seen.clear()
+            self._raw_seen.add(raw_url)
+            self.links_seen += 1
+            if raw_url != canonical_url:
+                self.links_rewritten += 1
+            if canonical_url in self._canonical_seen:
+                self.fetches_avoided += 1
+            else:
+                self._canonical_seen.add(canonical_url)
+
+    def record_avoided(self, n: int = 1):
+        with self._lock:
+            self.fetches_avoided += n
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return {
+                "links_seen": self.links_seen,
+                "links_rewritten": self.links_rewritten,
+                "fetches_avoided": self.fetches_avoided,
+            }
+
+
+def load_canonical_rules(path: str) -> UrlCanonicalizer:
+    """
+    Build a UrlCanonicalizer from a JSON file:
+        {"rules": [...], "drop_params": [...], "index_pages": [...], "domains": {"host": [...] | {...}}}
+    Missing keys fall back to the defaults in configs.py.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        cfg = json.load(f)
+    return UrlCanonicalizer(rules=cfg.get("rules"), domain_rules=cfg.get("domains"),
+                            drop_params=cfg.get("drop_params"), index_pages=cfg.get("index_pages"))
@@ -1,8 +1,32 @@
 import os
 import re
+import sys
 import hashlib
+import importlib.util
 from urllib.parse import urlparse
 
+
+def lazy_import(name: str):
+    """
+    Return module `name`, executed only on its first attribute access (importlib's LazyLoader),
+    so importing a module that merely references it stays cheap. The object is the one in
+    sys.modules, so patching its attributes works as usual.
+    LazyLoader is not thread-safe before Python 3.12: the first access must not race between
+    threads (use a function-level import for code first reached from worker threads).
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ImportError(f"No module named {name!r}", name=name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
+
+
 def safe_filename(url: str) -> str:
     h = hashlib.sha1(url.encode("utf-8")).hexdigest()[:12]
     parsed = urlparse(url)
@@ -0,0 +1,99 @@
+# -----------------------------
+# File: tests/test_archive.py
+# -----------------------------
+import csv
+import gzip
+import os
+
+import pytest
+
+from archive import ArchiveReader, ResponseArchive, segment_paths
+from crawler import Crawler
+from db import CrawlDB
+from limiter import DomainLimiter
+
+
+class DummyResp:
+    def __init__(self, url, status=200):
+        self.status_code = status
+        self.reason = 'OK'
+        self.headers = {'Content-Type': 'text/html; charset=utf-8', 'Content-Encoding': 'gzip'}
+        n = int(url.rsplit('/p', 1)[1]) if '/p' in url else 0
+        self.text = f'<html><body><p>page {n} café</p><a href="/p{n + 1}">next</a></body></html>'
+        self.content = self.text.encode('utf-8')
+
+
+class DummySession:
+    def __init__(self):
+        self.headers = {}
+        self.fetched = []
+
+    def get(self, url, headers=None, timeout=None, stream=False):
+        self.fetched.append(url)
+        return DummyResp(url)
+
+
+@pytest.fixture(autouse=True)
+def fast_limiter(monkeypatch):
+    monkeypatch.setattr(DomainLimiter, '_read_robots', lambda self: self._apply_robots(''))
+    monkeypatch.setattr(DomainLimiter, 'MIN_DELAY', 0.0)
+    monkeypatch.setattr('limiter.DEFAULT_PER_DOMAIN_DELAY', 0.0)
+
+
+def test_records_roll_segments_and_read_back_indexed_or_scanned(tmp_path):
+    db = CrawlDB(str(tmp_path / 'crawl.db'))
+    arch = ResponseArchive(str(tmp_path / 'archive'), db=db, segment_bytes=600, index_batch=3)
+    urls = [f'https://a.example/p{i}' for i in range(8)]
+    locs = [arch.write(u, DummyResp(u), depth=i, parent='https://a.example/') for i, u in enumerate(urls)]
+    arch.write(urls[0], DummyResp(urls[0], status=404))  # refetch: the index points to the newest record
+    arch.close()
+    assert len(segment_paths(str(tmp_path / 'archive'))) > 1
+    # every record is a gzip member of its own
+    seg, off, length = locs[3]
+    with open(tmp_path / 'archive' / seg, 'rb') as f:
+        f.seek(off)
+        assert b'WARC-Target-URI: https://a.example/p3' in gzip.decompress(f.read(length))
+
+    indexed = list(ArchiveReader(str(tmp_path / 'archive'), db=db))
+    scanned = list(ArchiveReader(str(tmp_path / 'archive')))
+    assert sorted(r.url for r in indexed) == sorted(urls) and len(scanned) == 9
+    rec = next(r for r in indexed if r.url == urls[5])
+    assert (rec.status, rec.depth, rec.parent) == (200, 5, 'https://a.example/')
+    assert 'café' in rec.text and 'content-encoding' not in rec.headers
+    assert rec.headers['content-length'] == str(len(rec.body))
+    assert next(r for r in indexed if r.url == urls[0]).status == 404
+
+    # a later run never appends to an earlier run's segment
+    again = ResponseArchive(str(tmp_path / 'archive'), db=db)
+    assert again.write(urls[1], DummyResp(urls[1]))[0] not in {loc[0] for loc in locs}
+    again.close()
+    db.close()
+
+
+def _urls(out):
+    with open(out / 'urls' / 'urls.csv', newline='', encoding='utf-8') as f:
+        return sorted((r['url'], r['status'], r['topic']) for r in csv.DictReader(f))
+
+
+def test_replay_reruns_pipeline_without_network(tmp_path):
+    session = DummySession()
+    with Crawler(session=session, max_pages=6, max_depth=10, max_workers=2, image_workers=1, archive=True) as c:
+        c.run('https://a.example/p0', str(tmp_path / 'crawl'))
+    fetched = len(session.fetched)
+
+    with Crawler(session=session, max_workers=2, classifier=lambda text: 'replayed') as c:
+        stats = c.replay(str(tmp_path / 'crawl'), str(tmp_path / 'replay'))
+        with pytest.raises(ValueError):
+            c.replay(str(tmp_path / 'crawl'), str(tmp_path / 'crawl'))
+    assert len(session.fetched) == fetched and stats['pages'] == 6
+    crawled = _urls(tmp_path / 'crawl')
+    assert [(u, s, 'replayed') for u, s, _ in crawled] == _urls(tmp_path / 'replay')
+    assert sorted(os.listdir(tmp_path / 'crawl' / 'texts')) == sorted(os.listdir(tmp_path / 'replay' / 'texts'))
+    db = CrawlDB(str(tmp_path / 'replay' / 'crawl_state.db'))
+    assert db.count_links() == 6
+    db.close()
+
+    # without the crawl's DB the segments are scanned
+    os.remove(tmp_path / 'crawl' / 'crawl_state.db')
+    with Crawler(session=session, max_workers=2) as c:
+        assert c.replay(str(tmp_path / 'crawl'), str(tmp_path / 'scan'))['pages'] == 6
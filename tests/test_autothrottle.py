@@ -0,0 +1,119 @@
+# -----------------------------
+# File: tests/test_autothrottle.py
+# -----------------------------
+import time
+from email.utils import formatdate
+
+from autothrottle import AutoThrottle, LegacyThrottle, parse_retry_after
+from download_utils import fetch_page
+from limiter import DomainLimiter
+
+
+def _limiter(monkeypatch, throttle=None):
+    monkeypatch.setattr(DomainLimiter, "_read_robots", lambda self: None)
+    return DomainLimiter("example.com", throttle=throttle)
+
+
+class FakeClock:
+    def __init__(self):
+        self.t = 0.0
+
+    def __call__(self):
+        return self.t
+
+
+def test_parse_retry_after():
+    assert parse_retry_after("7") == 7.0
+    assert parse_retry_after(None) is None
+    assert parse_retry_after("soon") is None
+    now = time.time()
+    assert 25 <= parse_retry_after(formatdate(now + 30, usegmt=True), now=now) <= 30
+
+
+def test_default_throttle_is_legacy(monkeypatch):
+    dl = _limiter(monkeypatch)
+    assert isinstance(dl.throttle, LegacyThrottle)
+    assert dl.get_health()["throttle"] == "legacy"
+
+
+def test_aimd_additive_increase_respects_robots_floor(monkeypatch):
+    clock = FakeClock()
+    dl = _limiter(monkeypatch, AutoThrottle(clock=clock, max_concurrency=4))
+    dl.crawl_delay = 1.0
+    dl.robots_delay = 0.5
+    for _ in range(200):
+        clock.t += 0.1
+        dl.record_response(0.05, 200)
+    assert dl.crawl_delay == 0.5
+    assert dl.max_in_flight == 4
+
+
+def test_aimd_never_raises_configured_max_in_flight(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(DomainLimiter, "_read_robots", lambda self: None)
+    dl = DomainLimiter("example.com", max_in_flight=1, throttle=AutoThrottle(clock=clock, max_concurrency=8))
+    for _ in range(200):
+        clock.t += 0.1
+        dl.record_response(0.05, 200)
+    assert dl.throttle.get_stats()["concurrency"] == 8
+    assert dl.max_in_flight == 1
+
+
+def test_aimd_multiplicative_decrease_with_cooldown(monkeypatch):
+    clock = FakeClock()
+    at = AutoThrottle(clock=clock, start_concurrency=4, cooldown=1.0)
+    dl = _limiter(monkeypatch, at)
+    dl.crawl_delay = 0.2
+    dl.record_response(0.1, 503)
+    assert abs(dl.crawl_delay - 0.4) < 1e-9
+    assert dl.max_in_flight == 2
+    # a burst of errors from the same congestion episode only halves once
+    dl.record_response(0.1, 503)
+    dl.record_response(0.1, 500)
+    assert abs(dl.crawl_delay - 0.4) < 1e-9
+    clock.t += 1.5
+    dl.record_response(0.1, 503)
+    assert abs(dl.crawl_delay - 0.8) < 1e-9
+    assert dl.max_in_flight == 1
+    assert dl.get_health()["decreases"] == 2
+
+
+def test_aimd_latency_target(monkeypatch):
+    clock = FakeClock()
+    dl = _limiter(monkeypatch, AutoThrottle(clock=clock, target_latency=1.0))
+    dl.crawl_delay = 0.2
+    for _ in range(4):
+        clock.t += 0.5
+        dl.record_response(0.1, 200)
+    before = dl.crawl_delay
+    for _ in range(5):
+        clock.t += 0.5
+        dl.record_response(3.0, 200)
+    assert dl.crawl_delay > before
+
+
+def test_retry_after_pushes_next_slot(monkeypatch):
+    dl = _limiter(monkeypatch, AutoThrottle())
+    dl.record_response(0.1, 429, 30)
+    assert dl._tat >= time.time() + 29
+    assert dl.get_health()["retry_after"] == 1
+
+
+def test_fetch_page_passes_retry_after(monkeypatch):
+    dl = _limiter(monkeypatch, AutoThrottle())
+    dl.rp.parse([])  # empty robots.txt: everything allowed
+    dl.crawl_delay = 0.01
+
+    class Resp:
+        status_code = 429
+        headers = {"Retry-After": "12"}
+        text = ""
+        content = b""
+
+    class Session:
+        def get(self, url, headers=None, timeout=None):
+            return Resp()
+
+    status, _, text = fetch_page(Session(), "https://example.com/x", dl)
+    assert status == 429 and text is None
+    assert dl._tat >= time.time() + 11
@@ -0,0 +1,108 @@
+# -----------------------------
+# File: tests/test_budget.py
+# -----------------------------
+import json
+import os
+import threading
+import time
+
+from budget import GlobalBudget, TokenBucket
+from download_utils import fetch_page
+
+
+def test_token_bucket_reservations_queue_up():
+    b = TokenBucket(10.0, capacity=1)
+    now = time.monotonic()
+    waits = [b.reserve(1, now) for _ in range(4)]
+    # first is free, the rest are spaced 0.1s apart
+    assert waits[0] == 0.0
+    assert abs(waits[1] - 0.1) < 1e-6 and abs(waits[3] - 0.3) < 1e-6
+
+
+def test_weights_split_request_rate():
+    g = GlobalBudget(max_rps=100, page_weight=3, image_weight=1)
+    assert abs(g._req['page'].rate - 75) < 1e-9
+    assert abs(g._req['image'].rate - 25) < 1e-9
+    # unlimited budget never blocks
+    u = GlobalBudget()
+    start = time.monotonic()
+    for _ in range(1000):
+        u.acquire('image')
+    assert time.monotonic() - start < 0.5 and not u.enabled
+
+
+def test_image_flood_does_not_starve_pages():
+    g = GlobalBudget(max_rps=40, page_weight=1, image_weight=1)
+    burst = [threading.Thread(target=g.acquire, args=('image',)) for _ in range(30)]
+    for t in burst:
+        t.start()
+    while g.get_stats()['requests']['image'] < 30:
+        time.sleep(0.01)
+    # the image workers queue for ~1.5s on their share; a page fetch goes straight out
+    start = time.monotonic()
+    g.acquire('page')
+    assert time.monotonic() - start < 0.1
+    assert g._req['image'].wait_time(time.monotonic()) > 1.0
+    for t in burst:
+        t.join()
+
+
+def test_byte_waits_are_spaced_out():
+    g = GlobalBudget(max_bps=1000, page_weight=1, image_weight=0)
+    g.record_bytes('page', 100, g.acquire('page'))  # average response: 100 bytes
+    g.record_bytes('page', 1000)  # 100 bytes of debt
+    # each waiting request reserves the average, so successive waits grow instead of all ending together
+    waits = []
+    for _ in range(3):
+        with g.lock:
+            now = time.monotonic()
+            waits.append(g._reserve(g._bytes['page'], g._total_bytes, 'page', g._avg_bytes['page'], now))
+    assert waits[0] > 0.1 and waits[1] > waits[0] + 0.1 and waits[2] > waits[1] + 0.1
+
+
+def test_byte_debt_delays_next_request():
+    g = GlobalBudget(max_bps=1000, page_weight=1, image_weight=0)
+    g.record_bytes('page', 1200)  # 1000 capacity -> 200 bytes of debt -> ~0.2s
+    start = time.monotonic()
+    g.acquire('page')
+    assert time.monotonic() - start >= 0.15
+    assert g.get_stats()['bytes']['page'] == 1200
+
+
+def test_control_file_reload(tmp_path):
+    ctl = tmp_path / 'budget.json'
+    ctl.write_text(json.dumps({'max_rps': 5}))
+    g = GlobalBudget(control_file=str(ctl), poll_interval=3600)
+    assert g.max_rps == 5
+    ctl.write_text(json.dumps({'max_rps': 50, 'image_weight': 0}))
+    os.utime(ctl, ns=(time.time_ns(), time.time_ns() + 10**9))
+    g.acquire('page')  # not yet due for a poll
+    assert g.max_rps == 5
+    g.request_reload()  # what SIGHUP does
+    g.acquire('page')
+    assert g.max_rps == 50 and g.image_weight == 0
+
+
+def test_fetch_page_charges_budget():
+    class DummyResp:
+        status_code = 200
+        headers = {'Content-Type': 'text/html'}
+        text = 'x' * 300
+        content = b'x' * 300
+
+    class DummySession:
+        def get(self, url, headers=None, timeout=None):
+            return DummyResp()
+
+    class StubDomain:
+        def can_fetch(self, url):
+            return True
+
+        def wait_for_slot(self):
+            return
+
+    g = GlobalBudget(max_rps=1000)
+    status, _, _ = fetch_page(DummySession(), 'https://example.com', StubDomain(), g)
+    stats = g.get_stats()
+    assert status == 200
+    assert stats['requests']['page'] == 1 and stats['bytes']['page'] == 300
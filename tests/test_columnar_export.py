@@ -0,0 +1,60 @@
+# tests/test_columnar_export.py
+import csv
+
+from columnar_export import export_output, open_table
+from crawl_summary import generate_summary
+from db import CrawlDB
+import link_graph_exporter as exporter
+
+
+def make_output(tmp_path):
+    out = tmp_path / 'data'
+    (out / 'urls').mkdir(parents=True)
+    (out / 'images').mkdir(parents=True)
+    (out / 'texts').mkdir(parents=True)
+    with open(out / 'urls' / 'urls.csv', 'w', newline='', encoding='utf-8') as f:
+        w = csv.writer(f)
+        w.writerow(['url', 'status', 'depth', 'parent', 'topic'])
+        w.writerow(['https://a.com/1', '200', '0', '', 'news'])
+        w.writerow(['https://a.com/2', '200', '1', 'https://a.com/1', 'news'])
+        w.writerow(['https://b.com/3', '404', '1', 'https://a.com/1', ''])
+        w.writerow(['https://a.com/4', 'error', '2', 'https://a.com/2'])
+    with open(out / 'images' / 'manifest.csv', 'w', newline='', encoding='utf-8') as f:
+        w = csv.writer(f)
+        w.writerow(['image_file', 'image_url', 'page_url', 'size_bytes'])
+        w.writerow(['x.jpg', 'https://a.com/x.jpg', 'https://a.com/1', '10'])
+    db = CrawlDB(str(out / 'crawl_state.db'))
+    db.add_page('https://a.com/1', status='200', depth=0, parent='', visited=1)
+    db.register_content_hash('h1', 'https://a.com/1')
+    db.close()
+    return str(out)
+
+
+def test_export_typed_dictionary_columns(tmp_path):
+    outdir = make_output(tmp_path)
+    counts = export_output(outdir)
+    assert counts['urls'] == 4
+    assert counts['image_manifest'] == 1
+    assert counts['pages'] == 1 and counts['content_map'] == 1
+
+    urls = open_table(outdir, 'urls')
+    assert list(urls.column('depth')) == [0, 1, 1, 2]
+    values, codes = urls.dictionary('status')
+    assert sorted(values) == ['200', '404', 'error']
+    assert len(codes) == 4
+    assert urls.value_counts('domain') == {'a.com': 3, 'b.com': 1}
+    assert list(urls.column('url'))[2] == 'https://b.com/3'
+    assert list(open_table(outdir, 'content_map').column('canonical_url')) == ['https://a.com/1']
+
+
+def test_summary_and_link_graph_read_columnar(tmp_path):
+    outdir = make_output(tmp_path)
+    from_csv = generate_summary(outdir)
+    export_output(outdir)
+    from_columnar = generate_summary(outdir, source='columnar')
+    assert from_columnar == from_csv
+
+    rows = exporter.read_urls_columnar(outdir)
+    graph = exporter.build_link_graph(rows)
+    csv_graph = exporter.build_link_graph(exporter.read_urls_csv(outdir + '/urls/urls.csv'))
+    assert graph['edges'] == csv_graph['edges']
@@ -0,0 +1,55 @@
+# -----------------------------
+# File: tests/test_corpus.py
+# -----------------------------
+import gzip
+from operator import attrgetter
+
+import pytest
+
+from corpus import TextCorpus, TextDoc
+
+TEXTS = {
+    'a.txt': 'plain ascii\nsecond line\n',
+    'b.txt': 'café naïve\nПривет мир',
+    'c.txt': '',
+}
+
+
+def _corpus(tmp_path):
+    for name, text in TEXTS.items():
+        (tmp_path / name).write_text(text, encoding='utf-8')
+    with gzip.open(tmp_path / 'd.txt.gz', 'wt', encoding='utf-8') as f:
+        f.write('zipped € text\n' * 3)
+    (tmp_path / 'notes.md').write_text('not a page text')
+    return tmp_path
+
+
+def _expected(text):
+    return len(text.encode('utf-8')), len(text.splitlines()), len(text)
+
+
+def test_counts_without_decoding_match_decoded_text(tmp_path):
+    d = _corpus(tmp_path)
+    for name, text in TEXTS.items():
+        with TextDoc(str(d / name)) as doc:
+            assert doc.counts() == _expected(text)
+            # windows split multi-byte characters; counts do not depend on where
+            assert doc.counts(window=3) == _expected(text)
+            assert doc.text() == text and bytes(doc.view()) == text.encode('utf-8')
+    with TextDoc(str(d / 'd.txt.gz')) as doc:
+        assert doc.counts(window=5) == _expected('zipped € text\n' * 3)
+        assert doc.byte_size() == len(('zipped € text\n' * 3).encode('utf-8'))
+        with pytest.raises(ValueError):
+            doc.view()
+
+
+def test_corpus_scans_in_process_pool_like_serial(tmp_path):
+    corpus = TextCorpus(str(_corpus(tmp_path)), chunk_size=1)
+    serial = corpus.stats()
+    assert serial['files'] == 4 and serial['min_chars'] == 0
+    assert serial['lines'] == 2 + 2 + 0 + 3
+    assert corpus.stats(workers=2) == serial
+    assert corpus.stats(workers=2, processes=False) == serial
+    names = sorted(corpus.map(attrgetter('name'), workers=2))
+    assert names == ['a.txt', 'b.txt', 'c.txt', 'd.txt.gz']
+    assert sorted(doc.name for doc in corpus) == names
@@ -29,3 +29,23 @@ def test_crawl_db_basic(tmp_path):
     finally:
         db.close()
 
+
+
+def test_domain_state_roundtrip(tmp_path):
+    db = CrawlDB(str(tmp_path / 'state.db'))
+    try:
+        assert db.load_domain_state('a.example') is None
+        st = {'domain': 'a.example', 'crawl_delay': 0.4, 'robots_delay': None, 'avg_latency': 0.2,
+              'latency_samples': [0.1, 0.3], 'error_count': 1, 'request_count': 10,
+              'robots_txt': 'User-agent: *\nDisallow: /private\n', 'robots_fetched': 123.0,
+              'last_access': 456.0, 'throttle_state': {'concurrency': 3}}
+        assert db.save_domain_states([st]) == 1
+        st['crawl_delay'] = 0.8
+        db.save_domain_states([st])
+        got = db.load_domain_state('a.example')
+        assert got['crawl_delay'] == 0.8
+        assert got['latency_samples'] == [0.1, 0.3]
+        assert got['throttle_state'] == {'concurrency': 3}
+        assert got['robots_txt'].startswith('User-agent')
+    finally:
+        db.close()
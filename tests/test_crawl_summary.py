@@ -4,8 +4,15 @@
 import os
 import json
 import csv
+import gzip
+import shutil
 
-from crawl_summary import generate_summary
+import pytest
+
+from configs import TEXT_LOG_NAME
+from corpus import text_chars
+from crawl_summary import STATE_FILE, collect_text_stats, generate_summary
+from io_helpers import ManifestWriter
 
 
 def make_sample_output(tmp_path):
@@ -44,6 +51,18 @@ def make_sample_output(tmp_path):
     return str(out)
 
 
+def save_page_text(outdir, name, text):
+    # what the crawler does: save the text and append it to the text log
+    path = os.path.join(outdir, 'texts', name)
+    replaced = text_chars(path) if os.path.exists(path) else ''
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(text)
+    mw = ManifestWriter(os.path.join(outdir, 'texts', TEXT_LOG_NAME), ['file', 'chars', 'replaced_chars'],
+                        flush_interval=0, append=True)
+    mw.write_row([name, len(text), replaced])
+    mw.close()
+
+
 def test_generate_summary_creates_files_and_checks_fields(tmp_path):
     outdir = make_sample_output(tmp_path)
     summary = generate_summary(outdir)
@@ -98,4 +117,111 @@ def test_generate_summary_creates_files_and_checks_fields(tmp_path):
     assert data['duplicates_skipped'] == 1
 
 
+def test_streaming_summary_matches_full_read(tmp_path):
+    outdir = make_sample_output(tmp_path)
+    with gzip.open(os.path.join(outdir, 'texts', 'c.txt.gz'), 'wt', encoding='utf-8') as f:
+        f.write('Sports match report, final score and the team player of the game.')
+
+    full = generate_summary(outdir)
+    streamed = generate_summary(outdir, streaming=True, workers=2)
+    # ASCII texts: byte sizes from metadata equal character counts
+    assert streamed == full
+    assert streamed['page_text_count'] == 3
+
+    # chunked parallel scan folds partial stats the same way
+    parallel = collect_text_stats(os.path.join(outdir, 'texts'), workers=3, use_size=True, chunk_size=1)
+    assert parallel == collect_text_stats(os.path.join(outdir, 'texts'))
+
+
+def test_incremental_summary_merges_new_records(tmp_path):
+    outdir = make_sample_output(tmp_path)
+    first = generate_summary(outdir, incremental=True)
+    assert first['pages_total'] == 3
+    assert os.path.exists(os.path.join(outdir, STATE_FILE))
+
+    # append rows (one of them still being written) and a new text file
+    with open(os.path.join(outdir, 'urls', 'urls.csv'), 'a', encoding='utf-8', newline='') as f:
+        f.write('https://c.com/x,200,2,https://a.com/page1,sports,en,0\r\n')
+        f.write('https://c.com/partial,20')
+    save_page_text(outdir, 'c.txt', 'new text café')
+    second = generate_summary(outdir, incremental=True)
+    assert second['pages_total'] == 4
+    assert second['topics']['sports'] == 1
+    assert second['page_text_count'] == 3
+
+    # finish the partial row: only it is picked up on the next run
+    with open(os.path.join(outdir, 'urls', 'urls.csv'), 'a', encoding='utf-8', newline='') as f:
+        f.write('0,2,,,,0\r\n')
+    third = generate_summary(outdir, incremental=True)
+    assert third['pages_total'] == 5
+    assert third['status_counts']['200'] == 4
+    assert third['page_text_count'] == 3
+    # characters, as in the default mode
+    assert third == generate_summary(outdir)
+
+    # a refetched page rewrites its text under the same name: replaced, not counted twice
+    save_page_text(outdir, 'c.txt', 'short')
+    fourth = generate_summary(outdir, incremental=True)
+    assert fourth['page_text_count'] == 3 and fourth == generate_summary(outdir)
+    # the shortest text grows: the min is rebuilt from the files
+    save_page_text(outdir, 'c.txt', 'refetched once more, and now the longest text of all three')
+    with open(os.path.join(outdir, 'texts', TEXT_LOG_NAME), 'a', encoding='utf-8') as f:
+        f.write('d.txt,1')  # row still being written
+    fifth = generate_summary(outdir, incremental=True)
+    assert fifth['min_text_len'] == 46 and fifth == generate_summary(outdir)
+    with pytest.raises(ValueError):
+        generate_summary(outdir, incremental=True, streaming=True)
+
+    # a rewritten manifest (new crawl) triggers a rebuild instead of double counting
+    make_sample_output(tmp_path / 'again')
+    shutil.copy(os.path.join(str(tmp_path / 'again'), 'data', 'urls', 'urls.csv'),
+                os.path.join(outdir, 'urls', 'urls.csv'))
+    with open(os.path.join(outdir, 'urls', 'urls.csv'), 'r+', encoding='utf-8') as f:
+        data = f.read().replace('page1', 'pageX')
+        f.seek(0)
+        f.write(data)
+        f.truncate()
+    rebuilt = generate_summary(outdir, incremental=True)
+    assert rebuilt['pages_total'] == 3
+
+
+def test_incremental_reads_each_gzip_segment_once_when_complete(tmp_path, monkeypatch):
+    outdir = make_sample_output(tmp_path)
+    os.remove(os.path.join(outdir, 'urls', 'urls.csv'))
+    mw = ManifestWriter(os.path.join(outdir, 'urls', 'urls.csv'), ['url', 'status', 'topic'],
+                        flush_interval=0, rotate_rows=2, compress=True)
+    for i in range(5):
+        mw.write_row([f'https://a.com/{i}', '200', 'news'])
+    mw.flush()  # segments 0 and 1 closed, segment 2 still open
+    assert generate_summary(outdir, incremental=True)['pages_total'] == 4
+
+    # finished segments are not decompressed again
+    reads = []
+    real_open = gzip.open
+    monkeypatch.setattr(gzip, 'open', lambda path, *a, **kw: reads.append(path) or real_open(path, *a, **kw))
+    mw.close()
+    assert generate_summary(outdir, incremental=True)['pages_total'] == 5
+    assert {os.path.basename(p) for p in reads} == {'urls-00002.csv.gz'}
+
+
+def test_incremental_rebuilds_a_rewrite_sharing_the_first_bytes(tmp_path):
+    outdir = make_sample_output(tmp_path)
+    urls_csv = os.path.join(outdir, 'urls', 'urls.csv')
+
+    def write_urls(n, status_of):
+        with open(urls_csv, 'w', encoding='utf-8', newline='') as f:
+            w = csv.writer(f)
+            w.writerow(['url', 'status', 'depth', 'parent', 'topic'])
+            for i in range(n):
+                w.writerow([f'https://a.com/articles/{i:04d}/' + 'x' * 40, status_of(i), '1', '', 'news'])
+
+    write_urls(100, lambda i: '200')
+    generate_summary(outdir, incremental=True)
+    # a new crawl rewrites the file: same first 4 KB, different rows before the old offset
+    write_urls(120, lambda i: '200' if i < 95 else '404')
+    incremental = generate_summary(outdir, incremental=True)
+    assert incremental['status_counts'] == {'200': 95, '404': 25}
+    assert incremental == generate_summary(outdir)
+
+
 # end of test file
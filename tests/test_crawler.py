@@ -0,0 +1,113 @@
+# -----------------------------
+# File: tests/test_crawler.py
+# -----------------------------
+import csv
+import threading
+import time
+
+import pytest
+
+from crawler import Crawler
+from limiter import DomainLimiter
+
+
+class DummyResp:
+    def __init__(self, url):
+        self.status_code = 200
+        self.headers = {'Content-Type': 'text/html'}
+        n = int(url.rsplit('/p', 1)[1]) if '/p' in url else 0
+        self.text = f'<html><body><p>page {n}</p><a href="/p{n + 1}">next</a><a href="/p{n + 2}">skip</a></body></html>'
+        self.content = self.text.encode('utf-8')
+
+
+class DummySession:
+    def __init__(self, delay=0.0):
+        self.headers = {}
+        self.delay = delay
+        self.gate = threading.Event()
+        self.gate.set()
+        self.fetched = []
+
+    def get(self, url, headers=None, timeout=None, stream=False):
+        self.gate.wait(10)
+        time.sleep(self.delay)
+        self.fetched.append(url)
+        return DummyResp(url)
+
+
+@pytest.fixture(autouse=True)
+def fast_limiter(monkeypatch):
+    monkeypatch.setattr(DomainLimiter, '_read_robots', lambda self: self._apply_robots(''))
+    monkeypatch.setattr(DomainLimiter, 'MIN_DELAY', 0.0)
+    monkeypatch.setattr('limiter.DEFAULT_PER_DOMAIN_DELAY', 0.0)
+
+
+def _urls(out):
+    with open(out / 'urls' / 'urls.csv', newline='', encoding='utf-8') as f:
+        return [row for row in csv.DictReader(f)]
+
+
+def test_crawler_runs_several_crawls_with_warm_components(tmp_path):
+    session = DummySession()
+    crawler = Crawler(session=session, max_pages=5, max_depth=10, max_workers=2, image_workers=1)
+    first = crawler.run('https://a.example/p0', str(tmp_path / 'one'))
+    limiter = crawler.limiters['a.example']
+    # per-crawl overrides; the session and the learned limiter carry over
+    second = crawler.run('https://a.example/p0', str(tmp_path / 'two'), max_pages=3)
+    crawler.close()
+
+    assert first['pages'] == 5 and second['pages'] == 3 and second['crawls'] == 2
+    assert crawler.limiters == {} and second['state'] == 'idle'
+    assert len(_urls(tmp_path / 'one')) == 5 and len(_urls(tmp_path / 'two')) == 3
+    assert limiter.request_count >= 8
+    with pytest.raises(TypeError):
+        crawler.run('https://a.example/p0', str(tmp_path / 'x'), max_pagez=1)
+
+
+def test_stop_is_per_instance_and_crawler_is_reusable(tmp_path):
+    slow = DummySession(delay=0.05)
+    a = Crawler(session=slow, max_pages=500, max_depth=1000, max_workers=1, image_workers=1).start(
+        'https://a.example/p0', str(tmp_path / 'a'))
+    b = Crawler(session=DummySession(), max_pages=4, max_depth=10, max_workers=1, image_workers=1)
+    with pytest.raises(RuntimeError):
+        a.run('https://a.example/p0', str(tmp_path / 'again'))
+    assert b.run('https://b.example/p0', str(tmp_path / 'b'))['pages'] == 4
+    assert a.stop(timeout=30) and a.stats()['pages'] < 500
+    # a stopped crawler starts cleanly again
+    assert a.run('https://a.example/p0', str(tmp_path / 'a2'), max_pages=3)['pages'] == 3
+    a.close()
+    b.close()
+
+
+def test_pause_holds_fetching_until_resume(tmp_path):
+    session = DummySession()
+    crawler = Crawler(session=session, max_pages=12, max_depth=100, max_workers=2, image_workers=1)
+    session.gate.clear()
+    crawler.start('https://a.example/p0', str(tmp_path / 'p'))
+    crawler.pause()
+    assert crawler.stats()['state'] == 'paused'
+    session.gate.set()
+    time.sleep(0.5)
+    held = len(session.fetched)
+    time.sleep(0.5)
+    assert len(session.fetched) == held <= 2  # only what was in flight at pause()
+    crawler.resume()
+    assert crawler.wait(timeout=30)
+    assert crawler.stats()['pages'] == 12
+    crawler.close()
+
+
+def test_pluggable_parser_and_classifier(tmp_path):
+    seen = []
+
+    def parser(html, url):
+        seen.append(url)
+        return 'text', set(), [], None
+
+    crawler = Crawler(session=DummySession(), page_parser=parser, classifier=lambda text: 'custom',
+                      max_pages=5, max_depth=10, max_workers=1, image_workers=1)
+    stats = crawler.run('https://a.example/p0', str(tmp_path / 'c'))
+    crawler.close()
+    # the parser returned no links, so the crawl ends after the start page
+    assert stats['pages'] == 1 and seen == ['https://a.example/p0']
+    assert [r['topic'] for r in _urls(tmp_path / 'c')] == ['custom']
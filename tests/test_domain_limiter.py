@@ -15,4 +15,106 @@ def test_wait_for_slot_enforces_delay():
     # immediate second call should wait approximately crawl_delay
     d.wait_for_slot()
     elapsed = time.time() - t0
-    assert elapsed >= 0.4
\ No newline at end of file
+    assert elapsed >= 0.4
+
+def test_concurrent_waiters_get_distinct_slots(monkeypatch):
+    import threading
+    monkeypatch.setattr(DomainLimiter, "_read_robots", lambda self: None)
+    d = DomainLimiter('herd.example')
+    d.crawl_delay = 0.1
+    starts = []
+    lock = threading.Lock()
+
+    def worker():
+        d.wait_for_slot()
+        with lock:
+            starts.append(time.time())
+        d.release_slot()
+
+    threads = [threading.Thread(target=worker) for _ in range(5)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(timeout=5.0)
+    starts.sort()
+    gaps = [b - a for a, b in zip(starts, starts[1:])]
+    # no thundering herd: every request is spaced by ~crawl_delay
+    assert min(gaps) >= 0.08
+
+
+def test_burst_and_max_in_flight(monkeypatch):
+    import threading
+    monkeypatch.setattr(DomainLimiter, "_read_robots", lambda self: None)
+    d = DomainLimiter('burst.example', burst=3, max_in_flight=2)
+    d.crawl_delay = 0.5
+    t0 = time.time()
+    d.wait_for_slot()
+    d.wait_for_slot()
+    assert time.time() - t0 < 0.1
+    assert d.in_flight == 2
+
+    # a third caller has a burst token but must wait for a free connection
+    entered = threading.Event()
+
+    def third():
+        d.wait_for_slot()
+        entered.set()
+
+    t = threading.Thread(target=third)
+    t.start()
+    assert not entered.wait(0.2)
+    d.release_slot()
+    assert entered.wait(1.0)
+    t.join()
+    assert time.time() - t0 < 0.5
+    assert d.get_health()['in_flight'] == 2
+
+
+def test_warm_start_from_saved_state(monkeypatch):
+    from autothrottle import AutoThrottle
+    fetched = []
+    monkeypatch.setattr(DomainLimiter, "_read_robots", lambda self: fetched.append(self.domain))
+    d = DomainLimiter('warm.example', throttle=AutoThrottle())
+    d._apply_robots("User-agent: *\nCrawl-delay: 1\nDisallow: /private\n")
+    d.robots_fetched = time.time()
+    d.crawl_delay = 2.5
+    d.record_response(0.2, 200)
+    d.throttle.concurrency = 3
+    state = d.export_state()
+
+    w = DomainLimiter('warm.example', throttle=AutoThrottle(), state=state)
+    # robots.txt reused from the state, not refetched
+    assert fetched == ['warm.example']
+    assert not w.can_fetch('https://warm.example/private/x')
+    assert w.can_fetch('https://warm.example/public')
+    assert w.robots_delay == 1.0
+    assert w.crawl_delay == d.crawl_delay
+    assert w.request_count == 1 and list(w.latency_samples) == [0.2]
+    assert w.max_in_flight == 3
+
+    # stale robots.txt is fetched again; learned delay is kept
+    state['robots_fetched'] = 0.0
+    DomainLimiter('warm.example', state=state)
+    assert fetched == ['warm.example', 'warm.example']
+
+
+def test_stop_interrupts_a_retry_after_wait(monkeypatch):
+    import threading
+    monkeypatch.setattr(DomainLimiter, "_read_robots", lambda self: None)
+    stop = threading.Event()
+    d = DomainLimiter('slow.example', max_in_flight=1, should_stop=stop.is_set)
+    d.defer(300)
+    results = []
+    waiter = threading.Thread(target=lambda: results.append(d.wait_for_slot()))
+    blocked = threading.Thread(target=lambda: results.append(d.wait_for_slot()))
+    waiter.start()
+    time.sleep(0.1)
+    blocked.start()  # waits for the in-flight permit the first caller holds
+    time.sleep(0.1)
+    t0 = time.time()
+    stop.set()
+    waiter.join(timeout=5.0)
+    blocked.join(timeout=5.0)
+    assert time.time() - t0 < 1.0
+    # neither may fetch, and no permit is left taken
+    assert results == [False, False] and d.in_flight == 0
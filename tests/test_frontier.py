@@ -0,0 +1,194 @@
+# -----------------------------
+# File: tests/test_frontier.py
+# -----------------------------
+import csv
+import threading
+
+import requests
+
+from db import CrawlDB
+from frontier import FrontierQueue, FrontierServer, FrontierState, LocalFrontier, RemoteFrontier
+from limiter import DomainLimiter
+from url_utils import domain_of
+
+
+class FakeClock:
+    def __init__(self):
+        self.t = 0.0
+
+    def __call__(self):
+        return self.t
+
+
+def _urls(n, domains=("a.example", "b.example", "c.example", "d.example")):
+    return [(f"https://{domains[i % len(domains)]}/p{i}", 1, "") for i in range(n)]
+
+
+def test_state_dedups_and_leases_each_url_once():
+    st = FrontierState()
+    st.sync("w1", push=_urls(8) + _urls(8))
+    assert st.get_stats()["seen"] == 8 and st.duplicates == 8
+    got = []
+    for w in ("w1", "w2") * 4:
+        got += [it[0] for it in st.sync(w, lease=3)["items"]]
+    assert sorted(got) == sorted(u for u, _, _ in _urls(8))
+    res = st.sync("w1", complete=got)
+    assert res["done"] and res["pending"] == 0 and res["leased"] == 0
+
+
+def test_domain_affinity_partitions_domains_between_workers():
+    st = FrontierState()
+    st.sync("w1")
+    st.sync("w2")
+    st.sync("w1", push=_urls(40))
+    owned = {}
+    for w in ("w1", "w2"):
+        for u, _, _ in st.sync(w, lease=100)["items"]:
+            owned.setdefault(domain_of(u), set()).add(w)
+    assert len(owned) == 4
+    assert all(len(ws) == 1 for ws in owned.values())
+    assert {w for ws in owned.values() for w in ws} == {"w1", "w2"}
+
+
+def test_leased_domain_stays_with_its_worker_until_released():
+    st = FrontierState()
+    st.sync("w1", push=_urls(4, domains=("a.example",)))
+    first = st.sync("w1", lease=1)["items"]
+    # a new worker joins; even if it would win the hash, a.example is busy on w1
+    for w in ("w2", "w3", "w4", "w5"):
+        assert st.sync(w, lease=10)["items"] == []
+    rest = st.sync("w1", lease=10)["items"]
+    assert len(first) + len(rest) == 4
+
+
+def test_expired_lease_is_handed_out_again():
+    clock = FakeClock()
+    st = FrontierState(lease_ttl=30, worker_ttl=1000, clock=clock)
+    st.sync("w1", push=_urls(1))
+    (item,) = st.sync("w1", lease=5)["items"]
+    assert st.sync("w1", lease=5)["items"] == []
+    clock.t = 31
+    res = st.sync("w1", lease=5)
+    assert [it[0] for it in res["items"]] == [item[0]] and st.expired == 1
+    # a late completion of the old lease still counts, and the URL is never queued again
+    st.sync("w1", complete=[item[0]])
+    assert st.sync("w1", lease=5)["done"]
+
+
+def test_leaving_worker_hands_its_domains_over_at_once():
+    clock = FakeClock()
+    st = FrontierState(lease_ttl=300, clock=clock)
+    st.sync("w1", push=_urls(40))
+    st.sync("w2")
+    held = st.sync("w1", lease=10)["items"]
+    assert held and st.sync("w2", lease=100)["items"] != []  # w2 owns some domains
+    left_over = st.get_stats()["pending"] + len(held)
+    # w1 stops (max pages / SIGINT) with one leased item unprocessed and the rest unreleased
+    st.sync("w1", complete=[held[0][0]], release=[held[1]], leave=True)
+    clock.t = 1
+    res = st.sync("w2", lease=100)
+    assert len(res["items"]) == left_over - 1 and st.get_stats()["workers"] == ["w2"]
+
+
+def test_release_requeues_and_max_pages_caps_leasing():
+    st = FrontierState(max_pages=3)
+    st.sync("w1", push=_urls(6))
+    items = st.sync("w1", lease=10)["items"]
+    assert len(items) == 3
+    st.sync("w1", release=items[1:], complete=[items[0][0]])
+    assert st.get_stats()["pending"] == 5
+    again = st.sync("w1", lease=10)["items"]
+    assert len(again) == 2
+    assert st.sync("w1", complete=[u for u, _, _ in again])["done"]
+
+
+def test_local_frontier_round_trips_through_crawldb(tmp_path):
+    db = CrawlDB(str(tmp_path / "c.db"))
+    f = LocalFrontier(db)
+    f.push("https://a.example/1", 1, "x")
+    f.push("https://a.example/2", 2, "y")
+    assert f.pop() == ("https://a.example/1", 1, "x")
+    assert f.close() == 1
+    g = LocalFrontier(db)
+    assert g.restore() == 1 and list(g) == [("https://a.example/2", 2, "y")]
+    db.close()
+
+
+def test_two_crawlers_share_one_remote_frontier(tmp_path, monkeypatch):
+    domains = ["a.example", "b.example", "c.example"]
+
+    class DummyResp:
+        def __init__(self, url):
+            self.status_code = 200
+            self.headers = {'Content-Type': 'text/html'}
+            n = int(url.rsplit('/p', 1)[1]) if '/p' in url else 0
+            links = ''.join(f'<a href="https://{d}/p{(n + 1) % 4}">x</a>' for d in domains)
+            self.text = f'<html><body><p>{url}</p>{links}</body></html>'
+            self.content = self.text.encode('utf-8')
+
+    class DummySession:
+        def __init__(self):
+            self.headers = {}
+
+        def get(self, url, headers=None, timeout=None, stream=False):
+            return DummyResp(url)
+
+    from crawler import threaded_crawl_enhanced
+
+    server = FrontierServer(FrontierState())
+    sessions = [requests.Session() for _ in range(2)]
+    monkeypatch.setattr('crawler.requests.Session', lambda: DummySession())
+    monkeypatch.setattr(DomainLimiter, '_read_robots', lambda self: self._apply_robots(''))
+    monkeypatch.setattr(DomainLimiter, 'MIN_DELAY', 0.01)
+    monkeypatch.setattr('limiter.DEFAULT_PER_DOMAIN_DELAY', 0.05)
+
+    def crawl(i):
+        backend = RemoteFrontier(server.url, worker_id=f"w{i}", poll_interval=0.05, session=sessions[i])
+        threaded_crawl_enhanced('https://a.example/p0', str(tmp_path / f"node{i}"), max_pages=100, max_depth=10,
+                                allow_external=True, max_workers=2, image_workers=1, frontier_backend=backend)
+
+    try:
+        threads = [threading.Thread(target=crawl, args=(i,)) for i in range(2)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join(timeout=60)
+        stats = server.state.get_stats()
+    finally:
+        server.close()
+
+    fetched = []
+    for i in range(2):
+        with open(tmp_path / f"node{i}" / "urls" / "urls.csv", newline="", encoding="utf-8") as f:
+            fetched += [row["url"] for row in csv.DictReader(f)]
+    expected = {f"https://{d}/p{n}" for d in domains for n in range(4)}
+    assert sorted(fetched) == sorted(expected)  # every page once, across both crawlers
+    assert stats["completed"] == len(expected) and stats["leased"] == 0
+
+
+def test_compact_queue_and_parent_ids(tmp_path, monkeypatch):
+    monkeypatch.setattr(FrontierQueue, "BLOCK", 3)
+    urls = [f"https://a.example/{i}/café" for i in range(8)]
+    for shared in (False, True):
+        q = FrontierQueue(shared_urls=shared)
+        for i, u in enumerate(urls):
+            q.append(u, i, -i)
+        assert [q.popleft() for _ in range(4)] == [(u, i, -i) for i, u in enumerate(urls[:4])]
+        q.appendleft("https://a.example/again", 9, 0)
+        assert len(q) == 5 and list(q)[:2] == [("https://a.example/again", 9, 0), (urls[4], 4, -4)]
+        assert [e[0] for e in iter(q.popleft, None)] == ["https://a.example/again"] + urls[4:]
+
+    # parent ids are link-graph node ids when the page is one; other parents never become nodes
+    db = CrawlDB(str(tmp_path / "c.db"))
+    page = "https://a.example/"
+    nid = db.node_id(page)
+    f = LocalFrontier(db)
+    for i in range(3):
+        f.push(f"https://a.example/{i}", 1, page)
+    f.push("https://a.example/s", 0, "sitemap")
+    f.push("https://a.example/", 0, None)
+    assert f.parents.id_of(page) == nid and f.parents.id_of("sitemap") < 0 and len(f.parents) == 2
+    assert list(f) == [(f"https://a.example/{i}", 1, page) for i in range(3)] + [
+        ("https://a.example/s", 0, "sitemap"), ("https://a.example/", 0, None)]
+    assert db.count_nodes() == 1
+    db.close()
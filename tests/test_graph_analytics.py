@@ -0,0 +1,81 @@
+# tests/test_graph_analytics.py
+import sqlite3
+
+import pytest
+
+import graph_analytics as ga
+from db import CrawlDB
+from link_graph_exporter import build_csr_from_db, iter_db_node_urls
+
+
+def make_db(tmp_path):
+    db = CrawlDB(str(tmp_path / 'crawl_state.db'))
+    # hub.com/ links to everything; everything links back to a.com/
+    db.add_page('https://a.com/', status='200', depth=0, parent='', visited=1)
+    db.add_page('https://hub.com/', status='200', depth=1, parent='', visited=1)
+    db.add_links('https://hub.com/', ['https://a.com/', 'https://a.com/b', 'https://c.com/'])
+    db.add_links('https://a.com/b', ['https://a.com/'])
+    db.add_links('https://c.com/', ['https://a.com/'])
+    db.add_links('https://a.com/', ['https://hub.com/'])
+    return db
+
+
+@pytest.mark.parametrize('use_numpy', [False, True])
+def test_pagerank_and_hits(tmp_path, monkeypatch, caplog, use_numpy):
+    if use_numpy:
+        pytest.importorskip('numpy')
+    else:
+        monkeypatch.setattr(ga, 'np', None)
+        monkeypatch.setattr(ga, '_warned_no_numpy', False)
+    db = make_db(tmp_path)
+    try:
+        graph = build_csr_from_db(db)
+        urls = list(iter_db_node_urls(db))
+    finally:
+        db.close()
+
+    pr, it, converged = ga.pagerank(graph, tol=1e-10, max_iter=200)
+    assert converged and it > 1
+    assert abs(sum(pr) - 1.0) < 1e-9
+    ranked = sorted(zip(pr, urls), reverse=True)
+    assert ranked[0][1] == 'https://a.com/'
+    # the slow fallback is not silent
+    assert ('pip install numpy' in caplog.text) != use_numpy
+
+    hub, auth, _, converged = ga.hits(graph, tol=1e-10, max_iter=200)
+    assert converged
+    assert urls[max(range(len(urls)), key=lambda i: hub[i])] == 'https://hub.com/'
+    assert urls[max(range(len(urls)), key=lambda i: auth[i])] == 'https://a.com/'
+
+    domains = ga.aggregate_by_domain(urls, pr)
+    assert domains[0]['domain'] == 'a.com' and domains[0]['pages'] == 2
+
+
+def test_numpy_matches_python(tmp_path, monkeypatch):
+    pytest.importorskip('numpy')
+    db = make_db(tmp_path)
+    try:
+        graph = build_csr_from_db(db)
+    finally:
+        db.close()
+    fast = ga.pagerank(graph, tol=1e-12)[0]
+    monkeypatch.setattr(ga, 'np', None)
+    slow = ga.pagerank(graph, tol=1e-12)[0]
+    assert max(abs(a - b) for a, b in zip(fast, slow)) < 1e-9
+
+
+def test_scores_written_back_to_pages(tmp_path):
+    db = make_db(tmp_path)
+    try:
+        graph = build_csr_from_db(db)
+        pr, hub, auth, info = ga.compute_scores(graph)
+        n = db.set_page_scores((u, p, h, a) for u, p, h, a in zip(iter_db_node_urls(db), pr, hub, auth))
+        assert n == graph.num_nodes
+    finally:
+        db.close()
+    conn = sqlite3.connect(str(tmp_path / 'crawl_state.db'))
+    rows = dict(conn.execute("SELECT url, pagerank FROM pages").fetchall())
+    conn.close()
+    # only pages rows are updated; link-only nodes have no pages row
+    assert set(rows) == {'https://a.com/', 'https://hub.com/'}
+    assert rows['https://a.com/'] > rows['https://hub.com/'] > 0
@@ -0,0 +1,89 @@
+# -----------------------------
+# File: tests/test_image_queue.py
+# -----------------------------
+import threading
+import time
+
+from db import CrawlDB
+from image_queue import ImageQueue
+
+
+class Handler:
+    """Records jobs; blocks until `gate` is set."""
+
+    def __init__(self):
+        self.gate = threading.Event()
+        self.done = []
+
+    def __call__(self, img_url, page_url):
+        self.gate.wait(10)
+        self.done.append(img_url)
+
+
+def _fill(q, n, depth=0):
+    for i in range(n):
+        q.submit(f'https://a.example/{depth}/{i}.png', 'https://a.example/', depth)
+
+
+def test_block_policy_applies_backpressure():
+    h = Handler()
+    q = ImageQueue(h, workers=1, maxsize=2, policy='block')
+    _fill(q, 3)  # one running, two queued
+    time.sleep(0.2)
+    t = threading.Thread(target=q.submit, args=('https://a.example/late.png', 'p'))
+    t.start()
+    t.join(0.3)
+    assert t.is_alive() and q.qsize() == 2
+    h.gate.set()
+    t.join(5)
+    assert q.join(timeout=5)
+    assert len(h.done) == 4 and q.get_stats()['blocked_s'] > 0
+    q.close()
+
+
+def test_drop_policy_keeps_images_of_shallower_pages():
+    h = Handler()
+    q = ImageQueue(h, workers=1, maxsize=3, policy='drop')
+    q.submit('https://a.example/first.png', 'p', 0)
+    time.sleep(0.2)  # taken by the worker, which waits on the gate
+    _fill(q, 3, depth=2)
+    assert q.submit('https://a.example/top.png', 'p', 0)  # evicts a depth-2 job
+    assert not q.submit('https://a.example/deep.png', 'p', 5)  # the least important itself
+    h.gate.set()
+    assert q.join(timeout=5)
+    q.close()
+    assert h.done[:2] == ['https://a.example/first.png', 'https://a.example/top.png']
+    assert len(h.done) == 4 and q.dropped == 2
+
+
+def test_spill_refills_from_db_and_saved_jobs_resume(tmp_path):
+    db = CrawlDB(str(tmp_path / 'crawl.db'))
+    h = Handler()
+    q = ImageQueue(h, workers=1, maxsize=4, policy='spill', db=db, spill_batch=3)
+    _fill(q, 20)
+    assert q.qsize() <= 4 and q.spilled >= 15 and q.backlog() == q.spilled
+    h.gate.set()
+    deadline = time.time() + 10
+    while len(h.done) < 20 and time.time() < deadline:
+        time.sleep(0.05)
+    assert sorted(h.done) == sorted(f'https://a.example/0/{i}.png' for i in range(20))
+    assert q.restored == q.spilled and db.count_image_jobs() == 0
+    q.close()
+
+    # jobs still queued at close() are saved and picked up by the next run
+    stuck = Handler()
+    q = ImageQueue(stuck, workers=1, maxsize=10, policy='block', db=db)
+    _fill(q, 6, depth=1)
+    time.sleep(0.2)
+    assert q.close(timeout=0.1) == 5 and db.count_image_jobs() == 5
+    again = Handler()
+    again.gate.set()
+    q = ImageQueue(again, workers=2, maxsize=10, policy='block', db=db)
+    assert q.load() == 5
+    deadline = time.time() + 10
+    while len(again.done) < 5 and time.time() < deadline:
+        time.sleep(0.05)
+    assert len(again.done) == 5 and db.count_image_jobs() == 0
+    stuck.gate.set()
+    q.close()
+    db.close()
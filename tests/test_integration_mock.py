@@ -5,6 +5,7 @@ import pytest
 import threading
 import os
 
+from crawl_summary import generate_summary
 from crawler import threaded_crawl_enhanced
 
 
@@ -38,3 +39,5 @@ def test_run_small_crawl(tmp_path, monkeypatch):
     assert (out / 'texts').exists()
     assert (out / 'urls' / 'urls.csv').exists()
     assert (out / 'images' / 'manifest.csv').exists()
+    # texts are logged for the incremental summary
+    assert generate_summary(str(out), incremental=True) == generate_summary(str(out))
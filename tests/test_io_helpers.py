@@ -0,0 +1,81 @@
+# tests/test_io_helpers.py
+import csv
+import threading
+
+from io_helpers import ManifestWriter, iter_manifest_rows, make_csv_writer, manifest_segments
+
+
+def test_concurrent_rows_are_not_interleaved(tmp_path):
+    path = str(tmp_path / 'urls.csv')
+    write_row, close = make_csv_writer(path, ['url', 'status', 'depth', 'parent', 'topic'], flush_rows=64)
+
+    def worker(t):
+        for i in range(200):
+            write_row([f'https://a.com/{t}/{i}', 200, 1, 'https://a.com/', 'news'])
+
+    threads = [threading.Thread(target=worker, args=(t,)) for t in range(8)]
+    for th in threads:
+        th.start()
+    for th in threads:
+        th.join()
+    close()
+
+    with open(path, newline='', encoding='utf-8') as f:
+        rows = list(csv.reader(f))
+    assert rows[0] == ['url', 'status', 'depth', 'parent', 'topic']
+    assert len(rows) == 1 + 8 * 200
+    assert all(len(r) == 5 for r in rows)
+    assert len({r[0] for r in rows[1:]}) == 8 * 200
+
+
+def test_interval_flush_without_close(tmp_path):
+    path = str(tmp_path / 'm.csv')
+    mw = ManifestWriter(path, ['a'], flush_rows=1000, flush_interval=0.05)
+    mw.write_row(['x'])
+    import time
+    time.sleep(0.3)
+    with open(path, encoding='utf-8') as f:
+        assert f.read().splitlines() == ['a', 'x']
+    mw.close()
+
+
+def test_rotated_compressed_segments_roundtrip(tmp_path):
+    path = str(tmp_path / 'manifest.csv')
+    mw = ManifestWriter(path, ['image_file', 'size_bytes'], flush_rows=3, flush_interval=0,
+                        rotate_rows=4, compress=True)
+    for i in range(10):
+        mw.write_row([f'{i}.jpg', i])
+    mw.close()
+
+    segs = manifest_segments(path)
+    assert [s.rsplit('/', 1)[1] for s in segs] == ['manifest.csv.gz', 'manifest-00001.csv.gz', 'manifest-00002.csv.gz']
+    rows = list(iter_manifest_rows(path))
+    assert [r['image_file'] for r in rows] == [f'{i}.jpg' for i in range(10)]
+
+
+def test_new_writer_drops_segments_of_an_earlier_run(tmp_path):
+    path = str(tmp_path / 'urls.csv')
+    old = ManifestWriter(path, ['url'], flush_interval=0, rotate_rows=2, compress=True)
+    for i in range(5):
+        old.write_row([f'old{i}'])
+    old.close()
+    assert len(manifest_segments(path)) == 3
+    new = ManifestWriter(path, ['url'], flush_interval=0, rotate_rows=2)
+    new.write_row(['new0'])
+    new.close()
+    assert manifest_segments(path) == [path]
+    assert [r['url'] for r in iter_manifest_rows(path)] == ['new0']
+
+
+def test_append_writer_continues_the_log(tmp_path):
+    path = str(tmp_path / 'index.csv')
+    first = ManifestWriter(path, ['file', 'chars'], flush_interval=0, append=True)
+    first.write_row(['a.txt', 1])
+    first.close()
+    with open(path, 'a', newline='') as f:
+        f.write('b.txt,')  # interrupted mid-row
+    second = ManifestWriter(path, ['file', 'chars'], flush_interval=0, append=True)
+    second.write_row(['c.txt', 3])
+    second.close()
+    rows = [(r['file'], r['chars']) for r in iter_manifest_rows(path)]
+    assert rows == [('a.txt', '1'), ('b.txt', ''), ('c.txt', '3')]
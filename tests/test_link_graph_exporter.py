@@ -58,3 +58,69 @@ def test_build_link_graph_and_write(tmp_path):
     assert loaded['nodes'] == graph['nodes']
     assert loaded['edges'] == graph['edges']
     assert loaded['domain_counts'] == graph['domain_counts']
+
+
+def test_csr_graph_from_db_outlinks(tmp_path):
+    from db import CrawlDB
+    import link_graph_exporter as exporter
+
+    db = CrawlDB(str(tmp_path / 'crawl_state.db'))
+    try:
+        db.add_links('https://a.com/', ['https://a.com/x', 'https://a.com/y', 'https://b.com/'])
+        db.add_links('https://a.com/x', ['https://a.com/', 'https://a.com/y', 'https://a.com/y'])
+        db.add_links('https://b.com/', [])
+        assert db.count_links() == 5
+        graph = exporter.build_csr_from_db(db)
+        urls = list(exporter.iter_db_node_urls(db))
+    finally:
+        db.close()
+
+    assert urls == ['https://a.com/', 'https://a.com/x', 'https://a.com/y', 'https://b.com/']
+    assert graph.num_nodes == 4 and graph.num_edges == 5
+    assert list(graph.neighbors(0)) == [1, 2, 3]
+    assert list(graph.neighbors(1)) == [0, 2]
+    assert graph.out_degree(3) == 0
+
+    prefix = str(tmp_path / 'link_graph')
+    exporter.write_csr(prefix, graph, urls)
+    loaded = exporter.read_csr(prefix)
+    assert loaded.offsets == graph.offsets and loaded.targets == graph.targets
+    assert exporter.read_csr_nodes(prefix) == urls
+
+    exporter.write_edge_list(prefix + '.edges.tsv', graph)
+    with open(prefix + '.edges.tsv') as f:
+        assert f.read().splitlines()[:3] == ['0\t1', '0\t2', '0\t3']
+
+    g = exporter.graph_from_csr(graph, urls)
+    assert ['https://a.com/x', 'https://a.com/'] in g['edges']
+    assert g['domain_counts'] == {'a.com': 3, 'b.com': 1}
+
+
+def test_streaming_writer_and_reader(tmp_path):
+    import link_graph_exporter as exporter
+    graph = {
+        'nodes': ['https://a.com/1', 'https://a.com/2', 'https://b.com/é'],
+        'edges': [['https://a.com/1', 'https://a.com/2'], ['https://a.com/2', 'https://b.com/é']],
+        'domain_counts': {'a.com': 2, 'b.com': 1},
+    }
+    for fmt, name in (('jsonl', 'g.jsonl'), ('jsonl', 'g.jsonl.gz'), ('json', 'g.json'), ('json', 'g.json.gz')):
+        path = str(tmp_path / name)
+        n, e = exporter.write_graph_stream(path, iter(graph['nodes']), iter(graph['edges']),
+                                           graph['domain_counts'], fmt=fmt)
+        assert (n, e) == (3, 2)
+        assert exporter.read_graph_stream(path) == graph
+
+    # the streamed JSON array is still plain JSON with the write_graph schema
+    with open(str(tmp_path / 'g.json'), encoding='utf-8') as f:
+        assert json.load(f) == graph
+
+
+def test_as_numpy_names_the_missing_dependency(monkeypatch):
+    import sys
+    from array import array
+    import pytest
+    from link_graph_exporter import CSRGraph
+
+    monkeypatch.setitem(sys.modules, 'numpy', None)  # import numpy raises ImportError
+    with pytest.raises(RuntimeError, match='pip install numpy'):
+        CSRGraph(array('q', [0]), array('i')).as_numpy()
@@ -0,0 +1,79 @@
+# -----------------------------
+# File: tests/test_metrics.py
+# -----------------------------
+import json
+import urllib.request
+
+import pytest
+
+from metrics import CrawlMetrics, MetricsRegistry, MetricsServer, SnapshotWriter, instrument_methods
+
+
+def test_counter_gauge_histogram_render():
+    reg = MetricsRegistry()
+    c = reg.counter('pages_total', 'Pages')
+    c.inc()
+    c.inc(2)
+    g = reg.gauge('queue', 'Queue depth', ('name',))
+    g.labels('img"q').set(4)
+    h = reg.histogram('lat', 'Latency', buckets=(0.1, 1.0))
+    for v in (0.05, 0.1, 0.5, 3.0):
+        h.observe(v)
+    text = reg.render_prometheus()
+    assert '# TYPE pages_total counter' in text
+    assert 'pages_total 3' in text
+    assert 'queue{name="img\\"q"} 4' in text
+    assert 'lat_bucket{le="0.1"} 2' in text
+    assert 'lat_bucket{le="1"} 3' in text
+    assert 'lat_bucket{le="+Inf"} 4' in text
+    assert 'lat_count 4' in text
+    with pytest.raises(ValueError):
+        g.labels()
+
+
+def test_callback_gauge_and_snapshot():
+    reg = MetricsRegistry()
+    state = {'a.com': 1.5, 'b.com': 0.2}
+    reg.gauge_callback('delay', 'Delay', lambda: dict(state), ('domain',))
+    reg.gauge_callback('broken', 'Raises', lambda: 1 / 0)
+    snap = reg.snapshot()
+    series = snap['metrics']['delay']['series']
+    assert {s['labels']['domain']: s['value'] for s in series} == state
+    assert snap['metrics']['broken']['series'] == []
+    assert 'delay{domain="a.com"} 1.5' in reg.render_prometheus()
+
+
+def test_crawl_metrics_and_instrument_methods():
+    m = CrawlMetrics()
+    m.observe_fetch('page', 0.2, 200, 1000)
+    m.observe_fetch('page', 0.3, 404, 0)
+
+    class FakeDB:
+        def add_page(self, url):
+            return url.upper()
+
+    db = FakeDB()
+    instrument_methods(db, ['add_page', 'missing'], m.db_write_seconds)
+    assert db.add_page('x') == 'X'
+    text = m.registry.render_prometheus()
+    assert 'crawler_fetch_bytes_total{kind="page"} 1000' in text
+    assert 'crawler_responses_total{kind="page",code="404"} 1' in text
+    assert 'crawler_db_write_seconds_count{op="add_page"} 1' in text
+
+
+def test_server_and_snapshot_writer(tmp_path):
+    reg = MetricsRegistry()
+    reg.counter('hits_total', 'Hits').inc(5)
+    server = MetricsServer(reg, port=0)
+    try:
+        with urllib.request.urlopen(f'http://127.0.0.1:{server.port}/metrics', timeout=5) as r:
+            assert r.headers['Content-Type'].startswith('text/plain')
+            assert b'hits_total 5' in r.read()
+        with urllib.request.urlopen(f'http://127.0.0.1:{server.port}/metrics.json', timeout=5) as r:
+            assert json.load(r)['metrics']['hits_total']['series'][0]['value'] == 5
+    finally:
+        server.close()
+    out = tmp_path / 'metrics.json'
+    w = SnapshotWriter(reg, str(out), interval=0)
+    w.close()
+    assert json.loads(out.read_text())['metrics']['hits_total']['type'] == 'counter'
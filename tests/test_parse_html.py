@@ -3,7 +3,7 @@
 # -----------------------------
 import pytest
 
-from crawler import parse_html_for_links_and_text
+from html_parsing import parse_html_for_links_and_text
 
 
 def test_parse_html_basic():
@@ -0,0 +1,87 @@
+# -----------------------------
+# File: tests/test_profiling.py
+# -----------------------------
+import json
+import os
+import time
+
+from limiter import DomainLimiter
+from metrics import MetricsRegistry
+from profiling import NULL_TIMER, PageProfiler, StageTimer
+
+
+def _busy(n=20000):
+    return sum(i * i for i in range(n))
+
+
+def test_stage_timer_report():
+    reg = MetricsRegistry()
+    t = StageTimer(reg)
+    for _ in range(3):
+        with t.stage('parse'):
+            time.sleep(0.002)
+    with t.stage('db'):
+        pass
+    rep = t.report()
+    assert list(rep) == ['parse', 'db']  # slowest total first
+    assert rep['parse']['count'] == 3
+    assert rep['parse']['total'] >= 0.006
+    assert rep['parse']['p50'] >= 0.001 and rep['parse']['max'] >= 0.002
+    assert 'crawler_stage_seconds_count{stage="parse"} 3' in reg.render_prometheus()
+
+
+def test_null_timer_is_noop():
+    with NULL_TIMER.stage('anything'):
+        pass
+    assert NULL_TIMER.report() == {} and not NULL_TIMER.enabled
+
+
+def test_cprofile_limited_to_n_pages(tmp_path):
+    p = PageProfiler(2, mode='cprofile')
+    for _ in range(5):
+        with p.page():
+            _busy()
+    assert p.profiled == 2
+    paths = p.write(str(tmp_path))
+    assert sorted(os.path.basename(x) for x in paths) == ['profile.pstats', 'profile.txt']
+    text = (tmp_path / 'profile.txt').read_text()
+    assert 'cProfile of 2 pages' in text and '_busy' in text
+
+
+def test_sampling_profiler_collects_stacks(tmp_path):
+    p = PageProfiler(1, mode='sample', interval=0.001)
+    with p.page():
+        end = time.time() + 0.2
+        while time.time() < end:
+            _busy(2000)
+    paths = p.write(str(tmp_path))
+    lines = (tmp_path / 'profile.collapsed').read_text().splitlines()
+    assert paths and lines
+    assert any('_busy' in ln for ln in lines)
+
+
+def test_crawl_writes_stage_report(tmp_path, monkeypatch):
+    class DummyResp:
+        status_code = 200
+        headers = {'Content-Type': 'text/html'}
+        text = '<html><body><p>Hi</p><a href="/next">next</a></body></html>'
+        content = text.encode('utf-8')
+
+    class DummySession:
+        def __init__(self):
+            self.headers = {}
+
+        def get(self, url, headers=None, timeout=None, stream=False):
+            return DummyResp()
+
+    from crawler import threaded_crawl_enhanced
+
+    monkeypatch.setattr('crawler.requests.Session', lambda: DummySession())
+    monkeypatch.setattr(DomainLimiter, '_read_robots', lambda self: self._apply_robots(''))
+    out = tmp_path / 'data'
+    threaded_crawl_enhanced('https://example.com', str(out), max_pages=2, max_depth=1, max_workers=1,
+                            image_workers=1, stage_timing=True, profile_pages=1)
+    rep = json.loads((out / 'stage_timings.json').read_text())
+    assert {'page', 'network', 'parse', 'classify', 'save_text'} <= set(rep['stages'])
+    assert rep['stages']['page']['count'] == rep['pages']
+    assert (out / 'profile.txt').exists()
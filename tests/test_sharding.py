@@ -0,0 +1,116 @@
+# -----------------------------
+# File: tests/test_sharding.py
+# -----------------------------
+import csv
+import json
+import multiprocessing
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from sharding import ShardRouter, shard_of, sharded_crawl
+from url_utils import domain_of
+
+
+def test_shard_of_is_stable_and_spreads_domains():
+    domains = [f"site{i}.example.com" for i in range(400)]
+    first = [shard_of(d, 4) for d in domains]
+    assert first == [shard_of(d.upper(), 4) for d in domains]
+    counts = [first.count(i) for i in range(4)]
+    assert min(counts) > 60
+    assert all(shard_of(d, 1) == 0 for d in domains)
+
+
+def _routers(n, max_pages=100):
+    ctx = multiprocessing.get_context("spawn")
+    inboxes = [ctx.Queue() for _ in range(n)]
+    active, pending, pages = ctx.Value("i", n), ctx.Value("i", 0), ctx.Value("i", 0)
+    return [ShardRouter(i, n, inboxes, active, pending, pages, max_pages) for i in range(n)]
+
+
+def _url_for_shard(shard, n):
+    i = 0
+    while shard_of(f"h{i}.example", n) != shard:
+        i += 1
+    return f"https://h{i}.example/page"
+
+
+def test_router_routes_foreign_links_and_detects_quiescence():
+    a, b = _routers(2)
+    mine, theirs = _url_for_shard(0, 2), _url_for_shard(1, 2)
+    local = a.route([(mine, 1, "p"), (theirs, 1, "p"), (theirs, 2, "q")])
+    assert local == [(mine, 1, "p")]
+    assert a.sent_pages == 1  # the same URL is sent once
+    # a goes idle with its batch in transit: not finished yet
+    assert a.wait_idle(timeout=0.01) is False
+    assert b.receive() == [("page", theirs, 1, "p")]
+    assert a.pending.value == 0 and a.active.value == 1  # b is still busy
+    b.send_image(_url_for_shard(0, 2) + ".png", theirs)
+    assert b.wait_idle(timeout=0.01) is False
+    a.wait_idle(timeout=0.5)  # takes the image job, becomes active again
+    assert a.receive()[0][0] == "image"
+    assert a.wait_idle(timeout=0.01) is True and b.wait_idle(timeout=0.01) is True
+
+
+def test_router_page_cap_is_shared():
+    a, b = _routers(2, max_pages=3)
+    a.page_done()
+    b.page_done()
+    assert not a.exhausted()
+    b.page_done()
+    assert a.exhausted() and a.wait_idle(timeout=0.01)
+
+
+def _serve_sites(n_sites, pages):
+    servers, ports = [], []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            site = ports.index(self.server.server_address[1])
+            if not self.path.startswith("/p"):
+                self.send_error(404)
+                return
+            i = int(self.path[2:] or 0)
+            links = [f"/p{(i + 1) % pages}", f"http://127.0.0.1:{ports[(site + 1) % n_sites]}/p{i}"]
+            body = ("<html><body><p>site %d page %d</p>%s</body></html>" % (
+                site, i, "".join(f'<a href="{h}">x</a>' for h in links))).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    for _ in range(n_sites):
+        srv = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        servers.append(srv)
+        ports.append(srv.server_address[1])
+        threading.Thread(target=srv.serve_forever, daemon=True).start()
+    return servers, ports
+
+
+def test_sharded_crawl_splits_domains_across_processes(tmp_path):
+    servers, ports = _serve_sites(3, 2)
+    try:
+        out = tmp_path / "data"
+        summary = sharded_crawl(f"http://127.0.0.1:{ports[0]}/p0", str(out), shards=2, max_pages=50, max_depth=10,
+                                allow_external=True, max_workers=2, image_workers=1)
+    finally:
+        for s in servers:
+            s.shutdown()
+            s.server_close()
+
+    assert summary["shards"] == 2 and [s["exitcode"] for s in summary["per_shard"]] == [0, 0]
+    assert json.loads((out / "shards.json").read_text())["pages"] == summary["pages"]
+    crawled = {}
+    for shard in range(2):
+        with open(out / f"shard-{shard}" / "urls" / "urls.csv", newline="", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                # every page was fetched by the shard owning its domain, exactly once
+                assert shard_of(domain_of(row["url"]), 2) == shard
+                assert row["url"] not in crawled
+                crawled[row["url"]] = row["status"]
+    expected = {f"http://127.0.0.1:{p}/p{i}" for p in ports for i in range(2)}
+    assert set(crawled) == expected and set(crawled.values()) == {"200"}
+    assert summary["pages"] == len(expected)
@@ -0,0 +1,119 @@
+# -----------------------------
+# File: tests/test_sitemaps.py
+# -----------------------------
+import gzip
+import io
+import queue
+
+from db import CrawlDB
+from limiter import DomainLimiter
+from sitemaps import SitemapLoader, iter_sitemap, open_sitemap_body
+
+NS = 'xmlns="http://www.sitemaps.org/schemas/sitemap/0.9"'
+
+
+def _urlset(urls, lastmod=None):
+    lm = f"<lastmod>{lastmod}</lastmod>" if lastmod else ""
+    return (f'<?xml version="1.0"?><urlset {NS}>'
+            + "".join(f"<url><loc>{u}</loc>{lm}</url>" for u in urls) + "</urlset>").encode()
+
+
+def _index(locs):
+    return (f'<sitemapindex {NS}>' + "".join(f"<sitemap><loc>{u}</loc></sitemap>" for u in locs)
+            + "</sitemapindex>").encode()
+
+
+class DummyResp:
+    def __init__(self, body, status=200):
+        self.status_code = status
+        self.content = body
+        self.raw = None
+
+
+class DummySession:
+    def __init__(self, files):
+        self.files = files
+        self.requested = []
+
+    def get(self, url, headers=None, timeout=None, stream=False):
+        self.requested.append(url)
+        body = self.files.get(url)
+        return DummyResp(body) if body is not None else DummyResp(b"", 404)
+
+
+def _limiter_for(monkeypatch, robots=""):
+    monkeypatch.setattr(DomainLimiter, "_read_robots", lambda self: self._apply_robots(robots))
+    monkeypatch.setattr(DomainLimiter, "MIN_DELAY", 0.0)
+    monkeypatch.setattr("limiter.DEFAULT_PER_DOMAIN_DELAY", 0.0)
+    dl = DomainLimiter("example.com")
+    return lambda u: dl
+
+
+def test_iter_sitemap_streams_urlset_and_index():
+    got = list(iter_sitemap(io.BytesIO(_urlset(["https://example.com/a", "https://example.com/b"], "2024-05-01"))))
+    assert got == [("url", "https://example.com/a", "2024-05-01"), ("url", "https://example.com/b", "2024-05-01")]
+    assert list(iter_sitemap(io.BytesIO(_index(["https://example.com/s1.xml"])))) == [
+        ("sitemap", "https://example.com/s1.xml", None)]
+    # entries before a syntax error are kept
+    broken = _urlset(["https://example.com/ok"])[:-len("</urlset>")] + b"<url><loc>oops"
+    assert [loc for _, loc, _ in iter_sitemap(io.BytesIO(broken))] == ["https://example.com/ok"]
+
+
+def test_gzip_body_is_detected_by_magic():
+    body = gzip.compress(_urlset(["https://example.com/z"]))
+    stream = open_sitemap_body(DummyResp(body))
+    assert [loc for _, loc, _ in iter_sitemap(stream)] == ["https://example.com/z"]
+
+
+def test_loader_follows_robots_and_nested_indexes_into_db(tmp_path, monkeypatch):
+    pages = [f"https://example.com/p{i}" for i in range(25)]
+    files = {
+        "https://example.com/sitemap.xml": _index(["https://example.com/sm-1.xml.gz", "https://example.com/idx2.xml"]),
+        "https://example.com/idx2.xml": _index(["https://example.com/sm-2.xml"]),
+        "https://example.com/sm-1.xml.gz": gzip.compress(_urlset(pages[:15], "2024-01-02")),
+        "https://example.com/sm-2.xml": _urlset(pages[15:]),
+        "https://example.com/extra.xml": _urlset(["https://example.com/p0", "https://example.com/extra"]),
+    }
+    session = DummySession(files)
+    db = CrawlDB(str(tmp_path / "c.db"))
+    db.add_page("https://example.com/p3", status=200, depth=0, parent=None, visited=1)
+    out = queue.Queue()
+    limiter_for = _limiter_for(monkeypatch, "User-agent: *\nSitemap: https://example.com/extra.xml\n")
+    loader = SitemapLoader(session, limiter_for, out, db=db, forward_limit=10, batch=4)
+    loader.start("https://example.com/").join(timeout=10)
+
+    forwarded = []
+    while not out.empty():
+        batch = out.get()
+        assert len(batch) <= 4
+        forwarded += batch
+    assert len(forwarded) == 10 and all(p == "sitemap" for _, _, p in forwarded)
+    stats = loader.get_stats()
+    assert stats["sitemaps"] == 5 and stats["indexes"] == 2 and stats["urls"] == 27
+    # everything beyond the forward limit waits in the DB frontier, visited pages excluded
+    queued = {u for u, _, _ in db.pop_frontier_batch(limit=100)}
+    assert queued == set(pages + ["https://example.com/extra"]) - {"https://example.com/p3"}
+    cur = db.conn.cursor()
+    cur.execute("SELECT lastmod FROM pages WHERE url=?", ("https://example.com/p1",))
+    assert cur.fetchone()[0] == "2024-01-02"
+    db.close()
+
+
+def test_loader_without_db_stops_at_forward_limit_and_respects_depth(monkeypatch):
+    files = {
+        "https://example.com/sitemap.xml": _index(["https://example.com/i1.xml"]),
+        "https://example.com/i1.xml": _index(["https://example.com/leaf.xml"]),
+        "https://example.com/leaf.xml": _urlset([f"https://example.com/q{i}" for i in range(50)]),
+    }
+    session = DummySession(files)
+    out = queue.Queue()
+    SitemapLoader(session, _limiter_for(monkeypatch), out, max_depth=1).start("https://example.com/").join(timeout=10)
+    assert out.empty() and "https://example.com/leaf.xml" not in session.requested
+
+    out = queue.Queue()
+    loader = SitemapLoader(DummySession(files), _limiter_for(monkeypatch), out, forward_limit=7, batch=5)
+    loader.start("https://example.com/").join(timeout=10)
+    items = []
+    while not out.empty():
+        items += out.get()
+    assert len(items) == 7 and loader.get_stats()["urls"] < 50
@@ -0,0 +1,64 @@
+# -----------------------------
+# File: tests/test_startup.py
+# -----------------------------
+import logging
+import os
+import subprocess
+import sys
+
+import pytest
+
+import crawler
+from utils import lazy_import
+
+SRC = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+
+def _run(code):
+    env = dict(os.environ, PYTHONPATH=SRC)
+    out = subprocess.run([sys.executable, '-c', code], cwd=SRC, env=env, capture_output=True, text=True, timeout=60)
+    assert out.returncode == 0, out.stderr
+    return out.stdout.split()
+
+
+def test_importing_crawler_defers_heavy_modules_and_signals():
+    loaded = _run(
+        "import sys, signal, types, crawler\n"
+        "for m in ('requests', 'bs4', 'sqlite3', 'logging.handlers', 'cProfile'):\n"
+        "    mod = sys.modules.get(m)\n"
+        "    if mod is not None and type(mod) is types.ModuleType: print(m)\n"
+        "print('sigterm', signal.getsignal(signal.SIGTERM) is crawler._signal_handler)\n"
+        "crawler.install_signal_handlers()\n"
+        "print('installed', signal.getsignal(signal.SIGTERM) is crawler._signal_handler)\n")
+    assert loaded == ['sigterm', 'False', 'installed', 'True']
+
+
+def test_lazy_import_loads_on_first_attribute_access():
+    out = _run(
+        "import sys, types\n"
+        "from utils import lazy_import\n"
+        "m = lazy_import('colorsys')\n"
+        "print(type(m) is types.ModuleType, m is sys.modules['colorsys'])\n"
+        "print(m.rgb_to_hsv(1, 0, 0)[0], type(m) is types.ModuleType)\n")
+    assert out == ['False', 'True', '0.0', 'True']
+    assert lazy_import('os') is os
+    with pytest.raises(ImportError):
+        lazy_import('no_such_module_for_turing')
+
+
+def test_setup_logging_is_idempotent(tmp_path):
+    root = logging.getLogger()
+    try:
+        for _ in range(3):
+            crawler.setup_logging(verbose=False, logfile=str(tmp_path / 'a.log'))
+        n = len(root.handlers)
+        crawler.setup_logging(verbose=False, logfile=str(tmp_path / 'a.log'))
+        assert len(root.handlers) == n
+        ours = list(crawler._log_handlers.values())
+        assert len(ours) == 2 and all(root.handlers.count(h) == 1 for h in ours)
+        crawler.setup_logging(verbose=True, logfile=str(tmp_path / 'b.log'))
+        assert len(root.handlers) == n and root.level == logging.DEBUG
+        files = [h.baseFilename for h in crawler._log_handlers.values() if hasattr(h, 'baseFilename')]
+        assert [os.path.basename(f) for f in files] == ['b.log']
+    finally:
+        crawler.setup_logging(verbose=False, logfile=None)
@@ -0,0 +1,70 @@
+# tests/test_url_canonical.py
+import json
+
+import pytest
+
+from html_parsing import parse_html_page
+from url_utils import UrlCanonicalizer, load_canonical_rules
+
+
+def test_default_rules_collapse_variants():
+    c = UrlCanonicalizer()
+    variants = [
+        'https://Example.com/docs/?b=2&a=1&utm_source=news',
+        'https://example.com/docs/index.html?a=1&b=2',
+        'https://example.com/docs?utm_medium=x&a=1&b=2&fbclid=abc',
+        'https://example.com/%64ocs?a=1&b=2',
+    ]
+    canon = {c.canonicalize(v) for v in variants}
+    assert canon == {'https://example.com/docs?a=1&b=2'}
+
+
+def test_percent_case_and_session_path_param():
+    c = UrlCanonicalizer()
+    assert c.canonicalize('https://a.com/x%2fy%7e') == 'https://a.com/x%2Fy~'
+    assert c.canonicalize('https://a.com/cart;jsessionid=ABC123?id=1') == 'https://a.com/cart?id=1'
+    # root path keeps its slash
+    assert c.canonicalize('https://a.com/') == 'https://a.com/'
+
+
+def test_per_domain_rules_and_loading(tmp_path):
+    cfg = {
+        'domains': {
+            'strict.com': ['lowercase_host'],
+            'shop.com': {'drop_params': ['ref']},
+        }
+    }
+    path = tmp_path / 'rules.json'
+    path.write_text(json.dumps(cfg))
+    c = load_canonical_rules(str(path))
+    # only host lowercasing for strict.com (and its subdomains)
+    assert c.canonicalize('https://WWW.strict.com/a/?b=1&a=2') == 'https://www.strict.com/a/?b=1&a=2'
+    assert c.canonicalize('https://shop.com/item?ref=home&id=3') == 'https://shop.com/item?id=3'
+    with pytest.raises(ValueError):
+        UrlCanonicalizer(rules=['no_such_rule'])
+
+
+def test_observe_counts_avoided_fetches():
+    c = UrlCanonicalizer()
+    for raw in ['https://a.com/p', 'https://a.com/p/', 'https://a.com/p?utm_source=x', 'https://a.com/p/']:
+        c.observe(raw, c.canonicalize(raw))
+    stats = c.get_stats()
+    assert stats['links_seen'] == 3
+    assert stats['links_rewritten'] == 2
+    assert stats['fetches_avoided'] == 2
+
+    # memory is bounded, and reset() starts a new crawl's counts
+    small = UrlCanonicalizer(max_seen=2)
+    for i in range(5):
+        small.observe(f'https://a.com/{i}', f'https://a.com/{i}')
+    assert len(small._raw_seen) <= 2 and small.get_stats()['links_seen'] == 5
+    small.reset()
+    assert small.get_stats() == {'links_seen': 0, 'links_rewritten': 0, 'fetches_avoided': 0}
+    assert not small._raw_seen and not small._canonical_seen
+
+
+def test_parse_html_page_returns_rel_canonical():
+    html = '<html><head><link rel="canonical" href="/real"></head><body><a href="/x">x</a></body></html>'
+    text, links, images, canonical = parse_html_page(html, 'https://example.com/alias')
+    assert canonical == 'https://example.com/real'
+    assert 'https://example.com/x' in links